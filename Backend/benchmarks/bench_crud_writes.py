@@ -0,0 +1,109 @@
+"""Compare CRUDBase writes against the old commit + refresh path.
+
+Runs N creates and N updates of users through both paths and reports the
+wall time and number of SQL statements per operation. Uses an in-memory
+SQLite database unless BENCH_DATABASE_URL is set (point it at a scratch
+Postgres database to see real network round trips).
+
+Usage (from Backend/):
+
+    python -m benchmarks.bench_crud_writes [iterations]
+"""
+import asyncio
+import os
+import sys
+import time
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", os.getenv("BENCH_DATABASE_URL", "sqlite+aiosqlite:///:memory:"))
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import crud
+import models
+import schema as schemas
+from db import Base, DATABASE_URL
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+
+def user_payload() -> dict:
+    suffix = uuid4().hex
+    return {"username": f"bench_{suffix}", "email": f"bench_{suffix}@example.com", "password_hash": "x"}
+
+
+async def legacy_create(db, obj_data):
+    db_obj = models.User(**obj_data)
+    db.add(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
+    return db_obj
+
+
+async def legacy_update(db, db_obj, obj_in):
+    for field, value in obj_in.model_dump(exclude_unset=True).items():
+        setattr(db_obj, field, value)
+    db.add(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
+    return db_obj
+
+
+async def returning_create(db, obj_data):
+    return await crud.crud_user.create(db, obj_in=obj_data)
+
+
+async def returning_update(db, db_obj, obj_in):
+    return await crud.crud_user.update(db, db_obj=db_obj, obj_in=obj_in)
+
+
+async def run_path(name, session_factory, counter, create, update_, iterations):
+    results = {}
+    async with session_factory() as db:
+        objs = []
+        counter.count = 0
+        start = time.perf_counter()
+        for _ in range(iterations):
+            objs.append(await create(db, user_payload()))
+        results["create"] = (time.perf_counter() - start, counter.count)
+
+        # Re-load the rows so both paths start the update from a persistent object
+        objs = [await crud.crud_user.get(db, id=obj.user_id) for obj in objs]
+        counter.count = 0
+        start = time.perf_counter()
+        for i, obj in enumerate(objs):
+            await update_(db, obj, schemas.UserUpdate(full_name=f"Bench {i}"))
+        results["update"] = (time.perf_counter() - start, counter.count)
+
+    for op, (elapsed, statements) in results.items():
+        print(
+            f"{name:<10} {op:<7} {elapsed / iterations * 1000:8.3f} ms/op "
+            f"{statements / iterations:5.1f} statements/op"
+        )
+
+
+async def main(iterations: int):
+    engine = create_async_engine(DATABASE_URL)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    counter = StatementCounter(engine)
+
+    if DATABASE_URL.startswith("sqlite"):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    print(f"{iterations} iterations against {engine.dialect.name}")
+    await run_path("legacy", session_factory, counter, legacy_create, legacy_update, iterations)
+    await run_path("returning", session_factory, counter, returning_create, returning_update, iterations)
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 500))
@@ -0,0 +1,414 @@
+"""Load benchmark: seed a realistic dataset, drive the app with concurrent clients.
+
+Seeds users, projects with members and pending invitations, deep directory trees
+and files with bulk inserts, then builds version chains through the app's own
+upload endpoint so they are stored the way production stores them. Concurrent
+clients then call the hot endpoints in-process through the real ASGI app for a
+fixed time, picking endpoints by weight:
+
+    tree               GET  /projects/{id}/tree
+    member_list        GET  /project-members/by-project/{id}
+    invitation_list    GET  /project-invitations/by-project/{id}
+    invitation_create  POST /project-invitations/
+    file_create        POST /files/
+    file_update        PUT  /files/{id}
+    version_append     PUT  /files/{id}/content
+
+The report is JSON: per endpoint and overall request counts, req/s, p50/p95/p99
+latency and database queries per request (from the Server-Timing header), along
+with the commit, database and dataset it was measured on. Runs with the same seed
+and arguments see the same dataset and the same sequence of choices per client.
+
+Uses a fresh SQLite file unless BENCH_DATABASE_URL is set; point that at an empty
+scratch Postgres database for production-like numbers. SQLite admits one writer at
+a time, so concurrent writes there show up as "database is locked" errors.
+
+Usage (from Backend/):
+
+    python -m benchmarks.bench_load --output before.json
+    python -m benchmarks.bench_load --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional
+
+_workdir = tempfile.mkdtemp(prefix="bench-load-")
+os.environ.setdefault(
+    "DATABASE_URL", os.getenv("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{_workdir}/bench.db")
+)
+os.environ.setdefault("BLOB_STORAGE_DIR", os.path.join(_workdir, "blobs"))
+# A bounded app-side pool, as when connecting straight to a local database
+os.environ.setdefault("DB_POOL_MODE", "direct")
+
+import httpx
+from sqlalchemy import func, insert, select
+
+import models
+from db import AsyncSessionLocal, Base, engine
+from main import app
+
+SCENARIO_WEIGHTS = {
+    "tree": 25,
+    "member_list": 15,
+    "invitation_list": 5,
+    "invitation_create": 5,
+    "file_create": 15,
+    "file_update": 15,
+    "version_append": 20,
+}
+INSERT_BATCH_SIZE = 1000
+SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+
+class Dataset:
+    """Ids of the seeded rows the scenarios pick from"""
+
+    def __init__(self):
+        self.projects: List[Dict[str, uuid.UUID]] = []
+        self.directories: Dict[uuid.UUID, List[uuid.UUID]] = {}
+        self.files: List[Dict[str, uuid.UUID]] = []
+        self.chains: List[Dict[str, object]] = []
+        self.role_id: Optional[uuid.UUID] = None
+        self.file_type_id: Optional[uuid.UUID] = None
+
+
+def _uuid(rng: random.Random) -> uuid.UUID:
+    return uuid.UUID(int=rng.getrandbits(128), version=4)
+
+
+def source(file_index: int, revision: int, lines: int = 200) -> bytes:
+    """Content of a chained file at a revision; each revision rewrites one line"""
+    body = [f"line {n} of file {file_index}" for n in range(lines)]
+    for r in range(1, revision + 1):
+        body[(r * 7) % lines] = f"line {(r * 7) % lines} edited in revision {r}"
+    return "\n".join(body).encode()
+
+
+async def _insert(db, model, rows: List[dict]) -> None:
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        await db.execute(insert(model), rows[start:start + INSERT_BATCH_SIZE])
+
+
+async def seed(args, rng: random.Random) -> Dataset:
+    data = Dataset()
+    now = datetime.now(timezone.utc)
+    async with AsyncSessionLocal() as db:
+        user_ids = [_uuid(rng) for _ in range(args.users)]
+        await _insert(db, models.User, [
+            {"user_id": user_id, "username": f"bench_{i}", "email": f"bench_{i}@example.com", "password_hash": "x"}
+            for i, user_id in enumerate(user_ids)
+        ])
+        data.role_id = _uuid(rng)
+        await _insert(db, models.Role, [{"role_id": data.role_id, "role_name": "bench_editor", "permissions": {"write": True}}])
+        data.file_type_id = _uuid(rng)
+        await _insert(db, models.FileType, [
+            {"file_type_id": data.file_type_id, "type_name": "bench_python", "extension": ".py", "mime_type": "text/x-python"}
+        ])
+
+        projects, members, invitations, directories = [], [], [], []
+        for p in range(args.projects):
+            project_id, owner_id = _uuid(rng), rng.choice(user_ids)
+            data.projects.append({"project_id": project_id, "owner_id": owner_id})
+            projects.append({"project_id": project_id, "project_name": f"Bench Project {p}", "owner_id": owner_id})
+            for user_id in {owner_id, *rng.sample(user_ids, min(args.members, len(user_ids)))}:
+                members.append({
+                    "project_member_id": _uuid(rng), "project_id": project_id, "user_id": user_id,
+                    "role_id": data.role_id, "invited_by": owner_id
+                })
+            for i in range(args.invitations):
+                invitations.append({
+                    "invitation_id": _uuid(rng), "project_id": project_id, "email": f"invitee_{p}_{i}@example.com",
+                    "role_id": data.role_id, "invited_by": owner_id, "token": uuid.UUID(int=rng.getrandbits(128)).hex,
+                    "status": "pending", "expires_at": now + timedelta(days=7)
+                })
+
+            # A full tree args.depth levels deep, args.fanout children per directory
+            level = [(None, "/")]
+            data.directories[project_id] = []
+            for depth in range(args.depth):
+                next_level = []
+                for parent_id, parent_path in level:
+                    for c in range(args.fanout):
+                        directory_id = _uuid(rng)
+                        path = f"{parent_path}{directory_id}/"
+                        directories.append({
+                            "directory_id": directory_id, "project_id": project_id, "directory_name": f"dir_{depth}_{c}",
+                            "parent_directory_id": parent_id, "materialized_path": path, "depth_level": depth,
+                            "created_by": owner_id
+                        })
+                        data.directories[project_id].append(directory_id)
+                        next_level.append((directory_id, path))
+                level = next_level
+
+        await _insert(db, models.Project, projects)
+        await _insert(db, models.ProjectMember, members)
+        await _insert(db, models.ProjectInvitation, invitations)
+        await _insert(db, models.Directory, directories)
+
+        files = []
+        for f in range(args.files):
+            project = rng.choice(data.projects)
+            file = {"file_id": _uuid(rng), **project}
+            data.files.append(file)
+            files.append({
+                "file_id": file["file_id"], "project_id": project["project_id"], "file_name": f"module_{f}.py",
+                "file_type_id": data.file_type_id, "directory_id": rng.choice(data.directories[project["project_id"]]),
+                "created_by": project["owner_id"], "last_modified_by": project["owner_id"]
+            })
+        await _insert(db, models.File, files)
+        await db.commit()
+    return data
+
+
+async def seed_chains(args, client: httpx.AsyncClient, rng: random.Random, data: Dataset) -> None:
+    """Version chains go through the upload endpoint so they are stored as deltas"""
+    for index, file in enumerate(rng.sample(data.files, min(args.chains, len(data.files)))):
+        for revision in range(args.chain_length):
+            response = await client.put(
+                f"/api/v1/files/{file['file_id']}/content",
+                params={"created_by": str(file["owner_id"])},
+                content=source(index, revision)
+            )
+            response.raise_for_status()
+        data.chains.append({**file, "index": index, "revision": args.chain_length - 1})
+
+
+async def tree(client, rng, data):
+    return await client.get(f"/api/v1/projects/{rng.choice(data.projects)['project_id']}/tree")
+
+
+async def member_list(client, rng, data):
+    return await client.get(f"/api/v1/project-members/by-project/{rng.choice(data.projects)['project_id']}")
+
+
+async def invitation_list(client, rng, data):
+    return await client.get(f"/api/v1/project-invitations/by-project/{rng.choice(data.projects)['project_id']}")
+
+
+async def invitation_create(client, rng, data):
+    project = rng.choice(data.projects)
+    return await client.post("/api/v1/project-invitations/", json={
+        "project_id": str(project["project_id"]),
+        "email": f"guest_{rng.getrandbits(48):x}@example.com",
+        "role_id": str(data.role_id),
+        "invited_by": str(project["owner_id"]),
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()
+    })
+
+
+async def file_create(client, rng, data):
+    project = rng.choice(data.projects)
+    return await client.post("/api/v1/files/", json={
+        "project_id": str(project["project_id"]),
+        "directory_id": str(rng.choice(data.directories[project["project_id"]])),
+        "file_type_id": str(data.file_type_id),
+        "file_name": f"new_{rng.getrandbits(48):x}.py",
+        "created_by": str(project["owner_id"]),
+        "last_modified_by": str(project["owner_id"])
+    })
+
+
+async def file_update(client, rng, data):
+    file = rng.choice(data.files)
+    return await client.put(f"/api/v1/files/{file['file_id']}", json={
+        "file_name": f"renamed_{rng.getrandbits(48):x}.py",
+        "last_modified_by": str(file["owner_id"])
+    })
+
+
+async def version_append(client, rng, data):
+    chain = rng.choice(data.chains)
+    chain["revision"] += 1
+    return await client.put(
+        f"/api/v1/files/{chain['file_id']}/content",
+        params={"created_by": str(chain["owner_id"])},
+        content=source(chain["index"], chain["revision"])
+    )
+
+
+SCENARIOS: Dict[str, Callable[..., Awaitable[httpx.Response]]] = {
+    "tree": tree,
+    "member_list": member_list,
+    "invitation_list": invitation_list,
+    "invitation_create": invitation_create,
+    "file_create": file_create,
+    "file_update": file_update,
+    "version_append": version_append,
+}
+
+
+class Samples:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.queries: List[int] = []
+        self.statuses: Dict[str, int] = {}
+
+    def add(self, elapsed: float, response: httpx.Response) -> None:
+        self.latencies.append(elapsed)
+        self.statuses[str(response.status_code)] = self.statuses.get(str(response.status_code), 0) + 1
+        match = SERVER_TIMING_QUERIES.search(response.headers.get("server-timing", ""))
+        if match:
+            self.queries.append(int(match.group(1)))
+
+    def merge(self, other: "Samples") -> None:
+        self.latencies += other.latencies
+        self.queries += other.queries
+        for code, count in other.statuses.items():
+            self.statuses[code] = self.statuses.get(code, 0) + count
+
+    def summary(self, duration: float) -> dict:
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> Optional[float]:
+            if not latencies:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))] * 1000, 3)
+
+        errors = sum(count for code, count in self.statuses.items() if int(code) >= 400)
+        return {
+            "requests": len(latencies),
+            "errors": errors,
+            "statuses": dict(sorted(self.statuses.items())),
+            "rps": round(len(latencies) / duration, 2),
+            "p50_ms": percentile(50),
+            "p95_ms": percentile(95),
+            "p99_ms": percentile(99),
+            "mean_ms": round(sum(latencies) / len(latencies) * 1000, 3) if latencies else None,
+            "queries_per_request": round(sum(self.queries) / len(self.queries), 2) if self.queries else None,
+        }
+
+
+async def client_loop(client, rng, data, weights: Dict[str, int], warmup_until: float, deadline: float) -> Dict[str, Samples]:
+    names, values = list(weights), list(weights.values())
+    samples = {name: Samples() for name in names}
+    while True:
+        name = rng.choices(names, weights=values)[0]
+        start = time.perf_counter()
+        if start >= deadline:
+            return samples
+        response = await SCENARIOS[name](client, rng, data)
+        end = time.perf_counter()
+        if start >= warmup_until:
+            samples[name].add(end - start, response)
+
+
+def git_commit() -> Dict[str, object]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain"], capture_output=True, text=True).stdout.strip())
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": None, "dirty": None}
+
+
+def compare(report: dict, baseline: dict) -> None:
+    print(f"{'endpoint':<18} {'rps':>17} {'p95 ms':>21}", file=sys.stderr)
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before or not before["rps"] or not before["p95_ms"] or current["p95_ms"] is None:
+            continue
+        print(
+            f"{name:<18} {before['rps']:>7} -> {current['rps']:<7} "
+            f"{before['p95_ms']:>8} -> {current['p95_ms']:<8} "
+            f"({(current['p95_ms'] / before['p95_ms'] - 1) * 100:+.1f}%)",
+            file=sys.stderr
+        )
+
+
+async def main(args) -> dict:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSessionLocal() as db:
+        if await db.scalar(select(func.count()).select_from(models.User)):
+            raise SystemExit("The benchmark database is not empty; point BENCH_DATABASE_URL at a scratch database")
+
+    rng = random.Random(args.seed)
+    seed_start = time.perf_counter()
+    data = await seed(args, rng)
+    # Failed requests are counted as 500s rather than ending the run
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await seed_chains(args, client, rng, data)
+        seed_seconds = time.perf_counter() - seed_start
+
+        weights = {name: weight for name, weight in SCENARIO_WEIGHTS.items() if name in args.scenarios}
+        start = time.perf_counter()
+        warmup_until = start + args.warmup
+        deadline = warmup_until + args.duration
+        results = await asyncio.gather(*(
+            client_loop(client, random.Random(f"{args.seed}:{worker}"), data, weights, warmup_until, deadline)
+            for worker in range(args.concurrency)
+        ))
+    await engine.dispose()
+
+    scenarios = {name: Samples() for name in weights}
+    total = Samples()
+    for samples in results:
+        for name, s in samples.items():
+            scenarios[name].merge(s)
+            total.merge(s)
+    return {
+        **git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "database": engine.dialect.name,
+        "dataset": {
+            "seed": args.seed, "users": args.users, "projects": args.projects, "files": args.files,
+            "depth": args.depth, "fanout": args.fanout, "members": args.members, "invitations": args.invitations,
+            "chains": args.chains, "chain_length": args.chain_length, "seed_seconds": round(seed_seconds, 2),
+        },
+        "load": {"concurrency": args.concurrency, "duration": args.duration, "warmup": args.warmup},
+        "scenarios": {name: s.summary(args.duration) for name, s in scenarios.items()},
+        "total": total.summary(args.duration),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--projects", type=int, default=200)
+    parser.add_argument("--files", type=int, default=100_000)
+    parser.add_argument("--depth", type=int, default=6, help="directory levels per project")
+    parser.add_argument("--fanout", type=int, default=2, help="subdirectories per directory")
+    parser.add_argument("--members", type=int, default=8, help="members per project besides the owner")
+    parser.add_argument("--invitations", type=int, default=4, help="pending invitations per project")
+    parser.add_argument("--chains", type=int, default=100, help="files given a version history")
+    parser.add_argument("--chain-length", type=int, default=20, help="versions per history")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before that")
+    parser.add_argument(
+        "--scenarios", type=lambda value: value.split(","), default=list(SCENARIO_WEIGHTS),
+        help="comma-separated endpoints to exercise (default: all)"
+    )
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report to print rps and p95 changes against")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
@@ -0,0 +1,227 @@
+"""Micro-benchmarks for CRUDBase reads and writes and the serialization around them.
+
+Each case runs in rounds of a fixed number of operations. The report gives the
+median and best time per operation across rounds, and two allocation figures for
+a traced round:
+- the peak memory above the starting point, per operation
+- the number of memory blocks allocated and still live when an operation returns
+
+Large list responses are dominated by ORM hydration and pydantic validation, so
+get_multi and PaginatedResponse[File] run with 1,000 rows.
+
+Cases:
+
+    crud_get            CRUDBase.get of one user
+    crud_get_multi      CRUDBase.get_multi of 1,000 files
+    crud_count          CRUDBase.count of a project's files
+    crud_create         CRUDBase.create of a user, committed
+    crud_update         CRUDBase.update of a user, committed
+    json_bind           JsonEncoded bind processing of a settings document
+    json_result         JsonEncoded result processing of the same document
+    paginated_validate  PaginatedResponse[File].model_validate of 1,000 ORM rows
+    paginated_dump      model_dump_json of that response
+
+Database cases expunge the session after every operation, so each one hydrates
+its rows as a fresh request would. They use an in-memory SQLite database unless
+BENCH_DATABASE_URL is set.
+
+Usage (from Backend/):
+
+    python -m benchmarks.bench_micro [--rounds 7] [--only crud_get_multi,paginated_validate] [--output micro.json]
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, List
+from uuid import uuid4
+
+os.environ.setdefault("DATABASE_URL", os.getenv("BENCH_DATABASE_URL", "sqlite+aiosqlite:///:memory:"))
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+import crud
+import models
+import schema as schemas
+from db import Base, DATABASE_URL, JsonEncoded
+
+LIST_SIZE = 1000
+SETTINGS_DOCUMENT = {
+    "editor": {"tab_size": 4, "word_wrap": True, "theme": "dark", "rulers": [80, 120]},
+    "run": {"command": "python main.py", "env": {f"VAR_{i}": f"value_{i}" for i in range(20)}},
+    "collaborators": [{"user_id": str(uuid4()), "cursor": [i, i * 3]} for i in range(10)],
+}
+
+
+class Case:
+    def __init__(self, name: str, operation: Callable[[], Awaitable[None]], iterations: int):
+        self.name = name
+        self.operation = operation
+        self.iterations = iterations
+
+
+async def _round(case: Case) -> float:
+    start = time.perf_counter()
+    for _ in range(case.iterations):
+        await case.operation()
+    return (time.perf_counter() - start) / case.iterations
+
+
+async def _allocations(case: Case) -> Dict[str, float]:
+    gc.collect()
+    tracemalloc.start()
+    try:
+        peak = 0
+        blocks_before = sys.getallocatedblocks()
+        for _ in range(case.iterations):
+            start, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            await case.operation()
+            _, op_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, op_peak - start)
+        blocks = sys.getallocatedblocks() - blocks_before
+    finally:
+        tracemalloc.stop()
+    return {"peak_bytes": peak, "live_blocks_per_op": round(blocks / case.iterations, 1)}
+
+
+async def measure(case: Case, rounds: int) -> dict:
+    await case.operation()  # warm caches and compiled statements
+    timings = [await _round(case) for _ in range(rounds)]
+    return {
+        "iterations": case.iterations,
+        "rounds": rounds,
+        "median_us": round(statistics.median(timings) * 1e6, 2),
+        "best_us": round(min(timings) * 1e6, 2),
+        **await _allocations(case),
+    }
+
+
+async def setup(session_factory) -> dict:
+    async with session_factory() as db:
+        user = await crud.crud_user.create(db, obj_in={
+            "username": f"bench_{uuid4().hex}", "email": f"bench_{uuid4().hex}@example.com", "password_hash": "x"
+        })
+        project = await crud.crud_project.create(db, obj_in={"project_name": "Bench", "owner_id": user.user_id})
+        directory = await crud.crud_directory.create(db, obj_in={
+            "project_id": project.project_id, "directory_name": "src", "created_by": user.user_id
+        })
+        await db.execute(insert(models.File), [
+            {
+                "project_id": project.project_id, "directory_id": directory.directory_id, "file_name": f"module_{i}.py",
+                "size_in_bytes": i * 10, "created_by": user.user_id, "last_modified_by": user.user_id
+            }
+            for i in range(LIST_SIZE)
+        ])
+        await db.commit()
+        return {"user_id": user.user_id, "project_id": project.project_id}
+
+
+async def build_cases(session_factory, dialect, fixtures: dict) -> List[Case]:
+    db = session_factory()
+    user_id, project_id = fixtures["user_id"], fixtures["project_id"]
+
+    async def crud_get():
+        await crud.crud_user.get(db, user_id)
+        db.expunge_all()
+
+    async def crud_get_multi():
+        await crud.crud_file.get_multi(db, limit=LIST_SIZE, project_id=project_id)
+        db.expunge_all()
+
+    async def crud_count():
+        await crud.crud_file.count(db, project_id=project_id)
+
+    async def crud_create():
+        suffix = uuid4().hex
+        await crud.crud_user.create(db, obj_in={
+            "username": f"bench_{suffix}", "email": f"bench_{suffix}@example.com", "password_hash": "x"
+        })
+        db.expunge_all()
+
+    counter = iter(range(sys.maxsize))
+    user = await crud.crud_user.get(db, user_id)
+
+    async def crud_update():
+        await crud.crud_user.update(db, db_obj=user, obj_in=schemas.UserUpdate(full_name=f"Bench {next(counter)}"))
+
+    json_type = JsonEncoded()
+    bind = json_type.bind_processor(dialect) or (lambda value: json_type.process_bind_param(value, dialect))
+    result = json_type.result_processor(dialect, None) or (lambda value: json_type.process_result_value(value, dialect))
+    encoded = bind(SETTINGS_DOCUMENT)
+
+    async def json_bind():
+        bind(SETTINGS_DOCUMENT)
+
+    async def json_result():
+        result(encoded)
+
+    files = await crud.crud_file.get_multi(db, limit=LIST_SIZE, project_id=project_id)
+    page_type = schemas.PaginatedResponse[schemas.File]
+    page = {"items": files, "total": len(files), "page": 1, "size": LIST_SIZE, "pages": 1}
+    validated = page_type.model_validate(page)
+
+    async def paginated_validate():
+        page_type.model_validate(page)
+
+    async def paginated_dump():
+        validated.model_dump_json()
+
+    return [
+        Case("crud_get", crud_get, 200),
+        Case("crud_get_multi", crud_get_multi, 5),
+        Case("crud_count", crud_count, 200),
+        Case("crud_create", crud_create, 100),
+        Case("crud_update", crud_update, 100),
+        Case("json_bind", json_bind, 2000),
+        Case("json_result", json_result, 2000),
+        Case("paginated_validate", paginated_validate, 5),
+        Case("paginated_dump", paginated_dump, 5),
+    ]
+
+
+async def main(args) -> dict:
+    engine = create_async_engine(DATABASE_URL)
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    if DATABASE_URL.startswith("sqlite"):
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    cases = await build_cases(session_factory, engine.dialect, await setup(session_factory))
+    results = {}
+    print(f"{'case':<20} {'median us/op':>13} {'best us/op':>11} {'peak KiB/op':>12} {'live blocks/op':>15}", file=sys.stderr)
+    for case in cases:
+        if args.only and case.name not in args.only:
+            continue
+        results[case.name] = result = await measure(case, args.rounds)
+        print(
+            f"{case.name:<20} {result['median_us']:>13} {result['best_us']:>11} "
+            f"{result['peak_bytes'] / 1024:>12.1f} {result['live_blocks_per_op']:>15}",
+            file=sys.stderr
+        )
+    await engine.dispose()
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "database": engine.dialect.name,
+        "list_size": LIST_SIZE,
+        "cases": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--rounds", type=int, default=7)
+    parser.add_argument("--only", type=lambda value: value.split(","), help="comma-separated cases to run")
+    parser.add_argument("--output", help="write the JSON report here")
+    args = parser.parse_args()
+    report = asyncio.run(main(args))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,269 @@
+"""Read-through caches for hot lookups.
+
+Roles and file types have a few dozen rows that almost never change but are
+looked up on most writes. Each cache is a bounded LRU whose entries also expire
+after a TTL. Writes through the owning CRUD object clear the cache of the
+process that made them; the TTL bounds how long other worker processes keep
+serving the old rows.
+
+Project memberships get their own cache keyed by (project_id, user_id), since
+the membership check runs on every file, directory and version write. It can be
+kept in process or shared between workers through Redis. Every eviction bumps a
+per-project generation; a membership read from the database is only cached if the
+generation taken before the read is still current, so a read that raced with a
+removal cannot put the removed member back.
+"""
+import os
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+from uuid import UUID
+
+REFERENCE_CACHE_TTL = float(os.getenv("REFERENCE_CACHE_TTL", "300"))
+REFERENCE_CACHE_SIZE = int(os.getenv("REFERENCE_CACHE_SIZE", "1024"))
+
+# Unread notification counts change often, so they are only cached briefly
+UNREAD_COUNT_CACHE_TTL = float(os.getenv("UNREAD_COUNT_CACHE_TTL", "5"))
+
+# "local" keeps memberships per process; "redis" shares them between workers
+MEMBERSHIP_CACHE_BACKEND = os.getenv("MEMBERSHIP_CACHE_BACKEND", "local")
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", "60"))
+MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", "10000"))
+MEMBERSHIP_CACHE_REDIS_URL = os.getenv("MEMBERSHIP_CACHE_REDIS_URL", "redis://localhost:6379/0")
+
+# Returned by TTLCache.get on a miss, since None is a legitimate cached value
+MISSING = object()
+
+
+class TTLCache:
+    """LRU mapping with per-entry expiry and hit/miss counters.
+
+    With maxbytes, values are sized with len() and the least recently used entries
+    are also evicted to keep their total within it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int = REFERENCE_CACHE_SIZE,
+        ttl: float = REFERENCE_CACHE_TTL,
+        maxbytes: Optional[int] = None
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable) -> Any:
+        entry = self._entries.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return MISSING
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def _size(self, value: Any) -> int:
+        return len(value) if self.maxbytes is not None else 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= self._size(entry[1])
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = self._size(value)
+        if self.maxbytes is not None and size > self.maxbytes:
+            return
+        self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self.bytes += size
+        while len(self._entries) > self.maxsize or (self.maxbytes is not None and self.bytes > self.maxbytes):
+            self._remove(next(iter(self._entries)))
+
+    def discard(self, key: Hashable) -> None:
+        self._remove(key)
+        self.invalidations += 1
+
+    def discard_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        for key in [key for key in self._entries if predicate(key)]:
+            self._remove(key)
+        self.invalidations += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.bytes = 0
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            **({"bytes": self.bytes, "maxbytes": self.maxbytes} if self.maxbytes is not None else {}),
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+_caches: Dict[str, TTLCache] = {}
+
+
+def register_cache(
+    name: str, maxsize: Optional[int] = None, ttl: Optional[float] = None, maxbytes: Optional[int] = None
+) -> TTLCache:
+    cache = TTLCache(
+        name,
+        maxsize=REFERENCE_CACHE_SIZE if maxsize is None else maxsize,
+        ttl=REFERENCE_CACHE_TTL if ttl is None else ttl,
+        maxbytes=maxbytes,
+    )
+    _caches[name] = cache
+    return cache
+
+
+def get_cache_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: cache.stats() for name, cache in _caches.items()}
+
+
+class LocalMembershipBackend:
+    """Memberships in a per-process TTLCache"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache("project_members", maxsize=maxsize, ttl=ttl)
+        self._epoch = 0
+        self._generations: Dict[UUID, int] = {}
+
+    async def get(self, project_id: UUID, user_id: UUID) -> Optional[Dict[str, Any]]:
+        value = self.cache.get((project_id, user_id))
+        return None if value is MISSING else value
+
+    async def generation(self, project_id: UUID) -> Tuple[int, int]:
+        """Take before reading a membership from the database; pass to set"""
+        return self._epoch, self._generations.get(project_id, 0)
+
+    async def set(self, project_id: UUID, user_id: UUID, membership: Dict[str, Any], generation: Tuple[int, int]) -> None:
+        if generation == await self.generation(project_id):
+            self.cache.set((project_id, user_id), membership)
+
+    async def delete(self, project_id: UUID, user_id: Optional[UUID] = None) -> None:
+        self._generations[project_id] = self._generations.get(project_id, 0) + 1
+        if user_id is not None:
+            self.cache.discard((project_id, user_id))
+        else:
+            self.cache.discard_where(lambda key: key[0] == project_id)
+
+    async def clear(self) -> None:
+        self._epoch += 1
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "local", **self.cache.stats()}
+
+
+class RedisMembershipBackend:
+    """Memberships in one Redis hash per project, shared by every worker.
+
+    Generations live in their own keys, outside the membership:* pattern that clear()
+    removes, and set() compares them and writes in one script.
+    """
+
+    _SET_IF_CURRENT = """
+    local current = (redis.call('GET', KEYS[2]) or '0') .. ':' .. (redis.call('GET', KEYS[3]) or '0')
+    if current ~= ARGV[1] then
+        return 0
+    end
+    redis.call('HSET', KEYS[1], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', KEYS[1], ARGV[4])
+    return 1
+    """
+
+    def __init__(self, url: str, ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError as exc:
+            raise RuntimeError("MEMBERSHIP_CACHE_BACKEND=redis requires the redis package") from exc
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self._set_if_current = self.client.register_script(self._SET_IF_CURRENT)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def _key(self, project_id: UUID) -> str:
+        return f"membership:{project_id}"
+
+    def _generation_key(self, project_id: UUID) -> str:
+        return f"membership-generation:{project_id}"
+
+    _EPOCH_KEY = "membership-generation"
+
+    async def get(self, project_id: UUID, user_id: UUID) -> Optional[Dict[str, Any]]:
+        raw = await self.client.hget(self._key(project_id), str(user_id))
+        entry = json.loads(raw) if raw else None
+        # The hash expires as a whole, so each field carries its own deadline too
+        if entry is None or entry["expires_at"] <= time.time():
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["membership"]
+
+    async def generation(self, project_id: UUID) -> str:
+        """Take before reading a membership from the database; pass to set"""
+        epoch, generation = await self.client.mget(self._EPOCH_KEY, self._generation_key(project_id))
+        return f"{int(epoch or 0)}:{int(generation or 0)}"
+
+    async def set(self, project_id: UUID, user_id: UUID, membership: Dict[str, Any], generation: str) -> None:
+        entry = {"expires_at": time.time() + self.ttl, "membership": membership}
+        await self._set_if_current(
+            keys=[self._key(project_id), self._EPOCH_KEY, self._generation_key(project_id)],
+            args=[generation, str(user_id), json.dumps(entry), int(self.ttl) + 1],
+        )
+
+    async def delete(self, project_id: UUID, user_id: Optional[UUID] = None) -> None:
+        await self.client.incr(self._generation_key(project_id))
+        if user_id is not None:
+            await self.client.hdel(self._key(project_id), str(user_id))
+        else:
+            await self.client.delete(self._key(project_id))
+        self.invalidations += 1
+
+    async def clear(self) -> None:
+        await self.client.incr(self._EPOCH_KEY)
+        async for key in self.client.scan_iter(match="membership:*"):
+            await self.client.delete(key)
+        self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "backend": "redis",
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+def _membership_backend():
+    if MEMBERSHIP_CACHE_BACKEND == "redis":
+        return RedisMembershipBackend(MEMBERSHIP_CACHE_REDIS_URL, MEMBERSHIP_CACHE_TTL)
+    return LocalMembershipBackend(MEMBERSHIP_CACHE_SIZE, MEMBERSHIP_CACHE_TTL)
+
+
+# Only members are cached: a user added to a project must be admitted at once,
+# while a removed member is evicted explicitly by the write that removed them
+membership_cache = _membership_backend()
+_caches["project_members"] = membership_cache
@@ -0,0 +1,165 @@
+"""WebSocket connections watching projects.
+
+Each socket gets one ProjectConnection. Its subscription to the event hub is
+also its send queue: project channels are added and removed on it as the client
+subscribes, and a single sender task drains it. Messages that arrive close
+together go out as one frame, so a bulk write reaches a client as one send
+rather than hundreds.
+
+The queue is bounded. A client that cannot keep up is closed with 1013 (try
+again later) instead of buffering without limit; it reconnects and catches up
+through GET /projects/{project_id}/tree/changes using the last revision it saw.
+
+Connections hold no database session. The endpoint opens a short one for the
+few messages that need it (membership checks, connection bookkeeping).
+"""
+import os
+import time
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set
+from uuid import UUID, uuid4
+
+from fastapi import WebSocket, status
+
+import events
+from presence import presence
+
+logger = logging.getLogger(__name__)
+
+# Events buffered per connection before it is closed as too slow
+WS_SEND_QUEUE_SIZE = int(os.getenv("WS_SEND_QUEUE_SIZE", "256"))
+# Most events sent in one frame
+WS_BATCH_SIZE = int(os.getenv("WS_BATCH_SIZE", "100"))
+# Seconds to wait for more events after the first one of a frame
+WS_BATCH_WINDOW = float(os.getenv("WS_BATCH_WINDOW", "0.02"))
+# Seconds a single send may block before the client is considered gone
+WS_SEND_TIMEOUT = float(os.getenv("WS_SEND_TIMEOUT", "10"))
+
+
+class ProjectConnection:
+    def __init__(self, websocket: WebSocket, user_id: UUID, hub: events.EventHub, connection_id: Optional[UUID] = None):
+        self.id = connection_id or uuid4()
+        self.websocket = websocket
+        self.user_id = user_id
+        self.hub = hub
+        self.subscription = events.Subscription(WS_SEND_QUEUE_SIZE)
+        self.projects: Set[UUID] = set()
+        # Replies from the receive loop and frames from the sender share the socket
+        self._send_lock = asyncio.Lock()
+        self.connected_at = time.monotonic()
+        self.frames_sent = 0
+        self.events_sent = 0
+
+    async def subscribe(self, project_id: UUID) -> None:
+        await self.hub.subscribe(events.project_channel(project_id), self.subscription)
+        self.projects.add(project_id)
+        presence.join(self.id, project_id)
+
+    def unsubscribe(self, project_id: UUID) -> None:
+        self.hub.unsubscribe(self.subscription, events.project_channel(project_id))
+        self.projects.discard(project_id)
+        presence.leave(self.id, project_id)
+
+    async def send(self, message: Dict[str, Any]) -> None:
+        async with self._send_lock:
+            await asyncio.wait_for(self.websocket.send_json(message), WS_SEND_TIMEOUT)
+
+    async def next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        """Wait for an event, then collect whatever else arrives within the batch window.
+
+        None means the queue overflowed and the connection must be closed.
+        """
+        first = await self.subscription.get()
+        if first is None:
+            return None
+        batch = [first]
+        if WS_BATCH_WINDOW > 0:
+            await asyncio.sleep(WS_BATCH_WINDOW)
+        queue = self.subscription.queue
+        while len(batch) < WS_BATCH_SIZE and not queue.empty():
+            message = queue.get_nowait()
+            if message is None:
+                # Deliver what was collected; the marker is seen again on the next call
+                queue.put_nowait(None)
+                break
+            batch.append(message)
+        return batch
+
+    def _deliverable(self, batch: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """The events of batch this user may still see, in order.
+
+        A project is dropped as soon as the user's own member.deleted goes by, so nothing
+        after it in the batch, or still waiting in the queue, reaches them.
+        """
+        user_id = str(self.user_id)
+        deliverable = []
+        for message in batch:
+            project_id = message.get("project_id")
+            if project_id is not None and UUID(project_id) not in self.projects:
+                continue
+            deliverable.append(message)
+            if message.get("type") == "member.deleted" and user_id in message.get("user_ids", ()):
+                self.unsubscribe(UUID(project_id))
+        return deliverable
+
+    async def run_sender(self) -> None:
+        """Forward subscribed events until the client falls behind or goes away"""
+        while True:
+            batch = await self.next_batch()
+            if batch is None:
+                logger.info("Closing slow WebSocket connection %s", self.id)
+                await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER, reason="Too far behind; resync")
+                return
+            batch = self._deliverable(batch)
+            if not batch:
+                continue
+            await self.send({"type": "events", "events": batch})
+            self.frames_sent += 1
+            self.events_sent += len(batch)
+
+
+class ConnectionManager:
+    """Tracks this worker's project connections and registers them for presence"""
+
+    def __init__(self, hub: events.EventHub):
+        self.hub = hub
+        self.connections: Dict[UUID, ProjectConnection] = {}
+        self.total_connections = 0
+
+    def connect(self, websocket: WebSocket, user_id: UUID, connection_id: Optional[UUID] = None) -> ProjectConnection:
+        connection = ProjectConnection(websocket, user_id, self.hub, connection_id)
+        self.connections[connection.id] = connection
+        self.total_connections += 1
+        presence.register(connection.id, user_id)
+        return connection
+
+    def disconnect(self, connection: ProjectConnection) -> None:
+        self.hub.unsubscribe(connection.subscription)
+        connection.projects.clear()
+        self.connections.pop(connection.id, None)
+        presence.unregister(connection.id)
+
+    async def close_stale(self, connection_id: UUID) -> None:
+        """Close a socket the presence reaper found silent; its endpoint then disconnects it"""
+        connection = self.connections.get(connection_id)
+        if connection is not None:
+            try:
+                await connection.websocket.close(code=status.WS_1001_GOING_AWAY, reason="Heartbeat timeout")
+            except Exception:
+                logger.debug("Stale WebSocket %s was already closed", connection_id)
+
+    def project_connections(self, project_id: UUID) -> List[ProjectConnection]:
+        return [connection for connection in self.connections.values() if project_id in connection.projects]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connections": len(self.connections),
+            "total_connections": self.total_connections,
+            "project_subscriptions": sum(len(connection.projects) for connection in self.connections.values()),
+            "frames_sent": sum(connection.frames_sent for connection in self.connections.values()),
+            "events_sent": sum(connection.events_sent for connection in self.connections.values()),
+        }
+
+
+manager = ConnectionManager(events.hub)
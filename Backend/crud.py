@@ -1,16 +1,50 @@
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, update, delete
-from sqlalchemy.orm import selectinload
-from typing import Optional, List, Type, TypeVar, Generic, Dict, Any, Union
-from uuid import UUID
+from sqlalchemy import select, func, insert, update, delete, cast, case, bindparam, BigInteger, String, table, column, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, make_transient_to_detached, aliased
+from typing import Optional, List, Type, TypeVar, Generic, Dict, Any, Union, Tuple, Iterable, Set
+from uuid import UUID, uuid4
+from datetime import datetime, timedelta, timezone
+from collections import Counter
 from pydantic import BaseModel
+import asyncio
+import base64
+import binascii
+import logging
 import models
+import events
 import schema as schemas
+import storage
+from cache import MISSING, register_cache, membership_cache, UNREAD_COUNT_CACHE_TTL
+from delta import apply_delta, make_delta
 
 ModelType = TypeVar("ModelType", bound=models.Base)
 CreateSchemaType = TypeVar("CreateSchemaType", bound=BaseModel)
 UpdateSchemaType = TypeVar("UpdateSchemaType", bound=BaseModel)
 
+logger = logging.getLogger(__name__)
+
+# Keeps IN lists and multi-row statements well below driver bind parameter limits
+BULK_CHUNK_SIZE = 5000
+# First key of the Postgres advisory locks taken per blob digest
+BLOB_LOCK_CLASS = 0x626C6F62
+
+class InvalidCursorError(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+class InvalidMoveError(ValueError):
+    """Raised when a directory would be moved into its own subtree"""
+
+class MissingBlobError(LookupError):
+    """Raised when a version points at a blob that has not been uploaded"""
+
+class VersionConflictError(ValueError):
+    """Raised when an explicit version number is already taken for the file"""
+
+def is_unique_violation(error: IntegrityError) -> bool:
+    """Whether error is a unique constraint violation rather than a foreign key, NOT NULL or CHECK failure"""
+    return getattr(error.orig, "sqlstate", None) == "23505" or "UNIQUE constraint failed" in str(error.orig)
+
 class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
     def __init__(self, model: Type[ModelType]):
         self.model = model
@@ -27,6 +61,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             'Directory': 'directory_id',
             'File': 'file_id',
             'FileVersion': 'version_id',
+            'Blob': 'digest',
             'ExecutionEnvironment': 'environment_id',
             'TerminalEnvironment': 'terminal_id',
             'Notification': 'notification_id',
@@ -35,6 +70,39 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         }
         return id_mapping.get(self.model.__name__, 'id')
 
+    def _get_id_column(self):
+        """Get the primary key column, used as the stable sort key for pagination"""
+        return getattr(self.model, self._get_id_field())
+
+    def exists_clause(self, id: UUID):
+        """EXISTS expression for a row with this primary key, for batching lookups into one query"""
+        id_column = self._get_id_column()
+        return select(id_column).where(id_column == id).exists()
+
+    def _apply_filters(self, query, filters: Dict[str, Any]):
+        for key, value in filters.items():
+            if hasattr(self.model, key) and value is not None:
+                query = query.where(getattr(self.model, key) == value)
+        return query
+
+    def encode_cursor(self, obj: ModelType) -> str:
+        """Build an opaque cursor that resumes listing right after obj"""
+        raw = str(getattr(obj, self._get_id_field())).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> UUID:
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            return UUID(base64.urlsafe_b64decode(padded).decode())
+        except (ValueError, binascii.Error) as e:
+            raise InvalidCursorError("Invalid cursor") from e
+
+    def next_cursor(self, items: List[ModelType], limit: int) -> Optional[str]:
+        """Cursor for the page after items, or None when this was the last page"""
+        if not items or len(items) < limit:
+            return None
+        return self.encode_cursor(items[-1])
+
     async def get(self, db: AsyncSession, id: UUID) -> Optional[ModelType]:
         id_field = self._get_id_field()
         result = await db.execute(
@@ -51,69 +119,217 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         )
         return result.scalar_one_or_none()
 
+    def _paginate(self, query, *, skip: int, limit: int, cursor: Optional[str]):
+        id_column = self._get_id_column()
+        query = query.order_by(id_column)
+        
+        if cursor:
+            # Keyset mode: seek past the previous page on the primary key index
+            # instead of scanning and discarding `skip` rows
+            query = query.where(id_column > self.decode_cursor(cursor))
+        else:
+            query = query.offset(skip)
+        
+        return query.limit(limit)
+
+    def _total_subquery(self, db: AsyncSession, filters: Dict[str, Any], estimate_total: bool):
+        active_filters = {key: value for key, value in filters.items() if hasattr(self.model, key) and value is not None}
+        
+        if estimate_total and not active_filters and db.bind.dialect.name == "postgresql":
+            # Planner statistics instead of a full scan; only as fresh as the last ANALYZE
+            pg_class = table("pg_class", column("oid"), column("reltuples"))
+            return (
+                select(cast(func.greatest(pg_class.c.reltuples, 0), BigInteger))
+                .where(pg_class.c.oid == func.to_regclass(self.model.__tablename__))
+                .scalar_subquery()
+            )
+        
+        return self._apply_filters(select(func.count()).select_from(self.model), active_filters).scalar_subquery()
+
     async def get_multi(
         self, 
         db: AsyncSession, 
         *, 
         skip: int = 0, 
         limit: int = 100,
+        cursor: Optional[str] = None,
         **filters
     ) -> List[ModelType]:
-        query = select(self.model)
-        
-        # Apply filters
-        for key, value in filters.items():
-            if hasattr(self.model, key) and value is not None:
-                query = query.where(getattr(self.model, key) == value)
-        
-        query = query.offset(skip).limit(limit)
+        query = self._paginate(self._apply_filters(select(self.model), filters), skip=skip, limit=limit, cursor=cursor)
         result = await db.execute(query)
         return result.scalars().all()
 
+    async def get_page(
+        self,
+        db: AsyncSession,
+        *,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        include_total: bool = True,
+        estimate_total: bool = False,
+        **filters
+    ) -> Tuple[List[ModelType], Optional[int]]:
+        """Fetch a page of rows and the filtered total in a single statement.
+        
+        The total rides along as a scalar subquery column, so list routes need one
+        round trip instead of get_multi + count. With include_total=False no total
+        is computed; with estimate_total=True an unfiltered Postgres count comes
+        from planner statistics instead of a scan.
+        """
+        query = self._apply_filters(select(self.model), filters)
+        
+        if not include_total:
+            result = await db.execute(self._paginate(query, skip=skip, limit=limit, cursor=cursor))
+            return result.scalars().all(), None
+        
+        total_subquery = self._total_subquery(db, filters, estimate_total)
+        query = query.add_columns(total_subquery.label("total"))
+        result = await db.execute(self._paginate(query, skip=skip, limit=limit, cursor=cursor))
+        rows = result.all()
+        
+        if rows:
+            return [row[0] for row in rows], rows[0].total
+        if not skip and not cursor:
+            return [], 0
+        
+        # Paged past the end: no row carried the total, so ask for it directly
+        return [], await db.scalar(select(total_subquery))
+
+    async def _commit_returned(self, db: AsyncSession, db_obj: ModelType) -> ModelType:
+        # The RETURNING row already holds every column, so detach it before committing
+        # instead of letting the commit expire it and paying for a refresh afterwards
+        db.expunge(db_obj)
+        await db.commit()
+        return db_obj
+
     async def create(self, db: AsyncSession, *, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> ModelType:
         if isinstance(obj_in, dict):
             obj_data = obj_in
         else:
             obj_data = obj_in.model_dump()
-        db_obj = self.model(**obj_data)
-        db.add(db_obj)
-        await db.commit()
         
-        # Try to refresh the object, but if it fails, reload it from the database
-        try:
-            await db.refresh(db_obj)
-            return db_obj
-        except Exception:
-            # If refresh fails, reload the object from the database
-            id_field = self._get_id_field()
-            obj_id = getattr(db_obj, id_field)
-            refreshed_obj = await self.get(db, id=obj_id)
-            return refreshed_obj if refreshed_obj else db_obj
+        # INSERT ... RETURNING brings server defaults such as created_at back with the write
+        result = await db.execute(
+            insert(self.model).values(**obj_data).returning(self.model)
+        )
+        return await self._commit_returned(db, result.scalar_one())
 
     async def update(
         self, 
         db: AsyncSession, 
         *, 
         db_obj: ModelType, 
-        obj_in: UpdateSchemaType
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
     ) -> ModelType:
-        obj_data = obj_in.model_dump(exclude_unset=True)
-        for field, value in obj_data.items():
-            setattr(db_obj, field, value)
-        
-        db.add(db_obj)
-        await db.commit()
+        if isinstance(obj_in, dict):
+            obj_data = obj_in
+        else:
+            obj_data = obj_in.model_dump(exclude_unset=True)
         
-        # Try to refresh the object, but if it fails, reload it from the database
-        try:
-            await db.refresh(db_obj)
+        # Fields the table doesn't have are ignored, as they were when set as plain attributes
+        columns = self.model.__table__.columns
+        obj_data = {field: value for field, value in obj_data.items() if field in columns}
+        if not obj_data:
             return db_obj
-        except Exception:
-            # If refresh fails, reload the object from the database
-            id_field = self._get_id_field()
-            obj_id = getattr(db_obj, id_field)
-            refreshed_obj = await self.get(db, id=obj_id)
-            return refreshed_obj if refreshed_obj else db_obj
+        
+        # UPDATE ... RETURNING brings onupdate values such as modified_at back with the write;
+        # populate_existing also picks up columns changed by earlier statements, e.g. a move
+        id_column = self._get_id_column()
+        result = await db.execute(
+            update(self.model)
+            .where(id_column == getattr(db_obj, self._get_id_field()))
+            .values(**obj_data)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        return await self._commit_returned(db, result.scalar_one())
+
+    async def existing_ids(self, db: AsyncSession, ids: Iterable[Optional[UUID]]) -> Set[UUID]:
+        """Return which of the given primary keys exist, in one query per chunk"""
+        wanted = list({id for id in ids if id is not None})
+        id_column = self._get_id_column()
+        found = set()
+        for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+            result = await db.execute(select(id_column).where(id_column.in_(wanted[start:start + BULK_CHUNK_SIZE])))
+            found.update(result.scalars().all())
+        return found
+
+    async def get_many(self, db: AsyncSession, *, ids: Iterable[UUID]) -> Dict[UUID, ModelType]:
+        """Load rows by primary key with one IN query per chunk, keyed by id"""
+        wanted = list(set(ids))
+        id_field = self._get_id_field()
+        id_column = self._get_id_column()
+        found = {}
+        for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(self.model)
+                .where(id_column.in_(wanted[start:start + BULK_CHUNK_SIZE]))
+                .execution_options(populate_existing=True)
+            )
+            found.update((getattr(db_obj, id_field), db_obj) for db_obj in result.scalars().all())
+        return found
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[CreateSchemaType, Dict[str, Any]]],
+        commit: bool = True
+    ) -> List[ModelType]:
+        """Insert all rows with multi-row INSERT ... RETURNING in a single transaction"""
+        rows = [obj_in if isinstance(obj_in, dict) else obj_in.model_dump() for obj_in in objs_in]
+        if not rows:
+            return []
+        
+        result = await db.execute(
+            insert(self.model).returning(self.model, sort_by_parameter_order=True),
+            rows
+        )
+        db_objs = result.scalars().all()
+        for db_obj in db_objs:
+            db.expunge(db_obj)
+        if commit:
+            await db.commit()
+        return db_objs
+
+    async def update_many(self, db: AsyncSession, *, objs_in: List[Dict[str, Any]], commit: bool = True) -> List[ModelType]:
+        """Apply per-row changes keyed by primary key as one executemany UPDATE.
+        
+        Each dict must carry the primary key field; the updated rows are read back
+        with a single IN query.
+        """
+        id_field = self._get_id_field()
+        columns = self.model.__table__.columns
+        rows = [{field: value for field, value in obj_in.items() if field in columns} for obj_in in objs_in]
+        if not rows:
+            return []
+        
+        changed = [row for row in rows if len(row) > 1]
+        if changed:
+            await db.execute(update(self.model), changed)
+        if commit:
+            await db.commit()
+        
+        ids = [row[id_field] for row in rows]
+        by_id = await self.get_many(db, ids=ids)
+        return [by_id[id] for id in ids if id in by_id]
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        """Delete all rows with one DELETE ... RETURNING per chunk and return the ids actually removed"""
+        id_column = self._get_id_column()
+        removed = []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                delete(self.model)
+                .where(id_column.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                .returning(id_column)
+                .execution_options(synchronize_session=False)
+            )
+            removed.extend(result.scalars().all())
+        if commit:
+            await db.commit()
+        return removed
 
     async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[ModelType]:
         obj = await self.get(db, id)
@@ -123,13 +339,7 @@ class CRUDBase(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         return obj
 
     async def count(self, db: AsyncSession, **filters) -> int:
-        query = select(func.count()).select_from(self.model)
-        
-        # Apply filters
-        for key, value in filters.items():
-            if hasattr(self.model, key) and value is not None:
-                query = query.where(getattr(self.model, key) == value)
-        
+        query = self._apply_filters(select(func.count()).select_from(self.model), filters)
         result = await db.execute(query)
         return result.scalar()
 
@@ -143,6 +353,18 @@ class CRUDUser(CRUDBase[models.User, schemas.UserCreate, schemas.UserUpdate]):
         result = await db.execute(select(self.model).where(self.model.username == username))
         return result.scalar_one_or_none()
 
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.User]:
+        # Owned projects go with the user, and their versions with them through ON DELETE CASCADE,
+        # so drop the blob references those versions hold first
+        owned = select(models.Project.project_id).where(models.Project.owner_id == id)
+        project_ids = (await db.execute(owned)).scalars().all()
+        await crud_blob.release_for_files(db, select(models.File.file_id).where(models.File.project_id.in_(owned)))
+        obj = await super().remove(db, id=id)
+        if obj:
+            for project_id in project_ids:
+                await membership_cache.delete(project_id)
+        return obj
+
 class CRUDProject(CRUDBase[models.Project, schemas.ProjectCreate, schemas.ProjectUpdate]):
     async def get_by_owner(self, db: AsyncSession, *, owner_id: UUID) -> List[models.Project]:
         result = await db.execute(
@@ -152,20 +374,1075 @@ class CRUDProject(CRUDBase[models.Project, schemas.ProjectCreate, schemas.Projec
         )
         return result.scalars().all()
 
-class CRUDRole(CRUDBase[models.Role, schemas.RoleCreate, schemas.RoleUpdate]):
-    async def get_by_name(self, db: AsyncSession, *, role_name: str) -> Optional[models.Role]:
-        result = await db.execute(select(self.model).where(self.model.role_name == role_name))
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.Project]:
+        # Versions go with the project's files through ON DELETE CASCADE, so drop their blob references first
+        await crud_blob.release_for_files(db, select(models.File.file_id).where(models.File.project_id == id))
+        obj = await super().remove(db, id=id)
+        if obj:
+            await membership_cache.delete(id)
+        return obj
+
+    async def get_tree_revision(self, db: AsyncSession, *, project_id: UUID) -> Optional[int]:
+        result = await db.execute(select(self.model.tree_revision).where(self.model.project_id == project_id))
         return result.scalar_one_or_none()
 
-class CRUDFileType(CRUDBase[models.FileType, schemas.FileTypeCreate, schemas.FileTypeUpdate]):
+class CRUDCachedBase(CRUDBase[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """Read-through cache for small, near-static reference tables.
+    
+    Lookups by id or name are served from a per-process TTL/LRU cache holding
+    detached copies of the rows; every write through this object clears it.
+    """
+    name_field: str
+
+    def __init__(self, model: Type[ModelType]):
+        super().__init__(model)
+        self.cache = register_cache(model.__tablename__)
+
+    def _detached_copy(self, db_obj: ModelType) -> ModelType:
+        # A copy, so the caller's instance stays attached to its session
+        copy = self.model(**{attr.key: getattr(db_obj, attr.key) for attr in self.model.__mapper__.column_attrs})
+        make_transient_to_detached(copy)
+        return copy
+
+    def _store(self, db_obj: ModelType) -> None:
+        copy = self._detached_copy(db_obj)
+        self.cache.set(("id", getattr(copy, self._get_id_field())), copy)
+        self.cache.set(("name", getattr(copy, self.name_field)), copy)
+
+    async def invalidate(self) -> None:
+        self.cache.clear()
+
+    def is_cached(self, id: Optional[UUID]) -> bool:
+        return self.cache.get(("id", id)) is not MISSING
+
+    async def get(self, db: AsyncSession, id: UUID) -> Optional[ModelType]:
+        cached = self.cache.get(("id", id))
+        if cached is not MISSING:
+            return cached
+        db_obj = await super().get(db, id)
+        if db_obj is not None:
+            self._store(db_obj)
+        return db_obj
+
+    async def get_by_name(self, db: AsyncSession, name: str) -> Optional[ModelType]:
+        cached = self.cache.get(("name", name))
+        if cached is not MISSING:
+            return cached
+        result = await db.execute(select(self.model).where(getattr(self.model, self.name_field) == name))
+        db_obj = result.scalar_one_or_none()
+        if db_obj is not None:
+            self._store(db_obj)
+        return db_obj
+
+    async def existing_ids(self, db: AsyncSession, ids: Iterable[Optional[UUID]]) -> Set[UUID]:
+        wanted = {id for id in ids if id is not None}
+        found = {id for id in wanted if self.cache.get(("id", id)) is not MISSING}
+        loaded = await self.get_many(db, ids=wanted - found)
+        for db_obj in loaded.values():
+            self._store(db_obj)
+        return found | set(loaded)
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> ModelType:
+        db_obj = await super().create(db, obj_in=obj_in)
+        await self.invalidate()
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> ModelType:
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        await self.invalidate()
+        return db_obj
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[ModelType]:
+        # Deleting needs the session's own instance, not a cached copy
+        self.cache.clear()
+        obj = await super().remove(db, id=id)
+        await self.invalidate()
+        return obj
+
+    async def create_many(self, db: AsyncSession, *, objs_in: List[Union[CreateSchemaType, Dict[str, Any]]], commit: bool = True) -> List[ModelType]:
+        db_objs = await super().create_many(db, objs_in=objs_in, commit=commit)
+        await self.invalidate()
+        return db_objs
+
+    async def update_many(self, db: AsyncSession, *, objs_in: List[Dict[str, Any]], commit: bool = True) -> List[ModelType]:
+        db_objs = await super().update_many(db, objs_in=objs_in, commit=commit)
+        await self.invalidate()
+        return db_objs
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        removed = await super().remove_many(db, ids=ids, commit=commit)
+        await self.invalidate()
+        return removed
+
+class CRUDRole(CRUDCachedBase[models.Role, schemas.RoleCreate, schemas.RoleUpdate]):
+    name_field = "role_name"
+
+    async def invalidate(self) -> None:
+        # Cached memberships carry their role's permissions
+        await super().invalidate()
+        await membership_cache.clear()
+
+    async def get_by_name(self, db: AsyncSession, *, role_name: str) -> Optional[models.Role]:
+        return await super().get_by_name(db, role_name)
+
+class CRUDFileType(CRUDCachedBase[models.FileType, schemas.FileTypeCreate, schemas.FileTypeUpdate]):
+    name_field = "type_name"
+
     async def get_by_name(self, db: AsyncSession, *, type_name: str) -> Optional[models.FileType]:
-        result = await db.execute(select(self.model).where(self.model.type_name == type_name))
+        return await super().get_by_name(db, type_name)
+
+class CRUDTreeNode(CRUDBase[ModelType, CreateSchemaType, UpdateSchemaType]):
+    """Directories and files stamp every write with the next tree_revision of their project
+    and leave a tombstone when deleted, so a client can fetch only what changed since the
+    revision it holds. Bumping the project row also orders concurrent tree writes per project.
+    """
+
+    @property
+    def entity_type(self) -> str:
+        return self.model.__name__.lower()
+
+    async def next_revisions(self, db: AsyncSession, project_ids: Iterable[UUID]) -> Dict[UUID, int]:
+        """Increment tree_revision once for each project and return the new values"""
+        wanted = list(set(project_ids))
+        if not wanted:
+            return {}
+        result = await db.execute(
+            update(models.Project)
+            .where(models.Project.project_id.in_(wanted))
+            .values(tree_revision=models.Project.tree_revision + 1)
+            .returning(models.Project.project_id, models.Project.tree_revision)
+            .execution_options(synchronize_session=False)
+        )
+        return {row.project_id: row.tree_revision for row in result}
+
+    async def project_ids(self, db: AsyncSession, ids: Iterable[UUID]) -> Dict[UUID, UUID]:
+        """Map each existing id to its project_id, in one query per chunk"""
+        wanted = list(set(ids))
+        id_column = self._get_id_column()
+        found = {}
+        for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(id_column, self.model.project_id).where(id_column.in_(wanted[start:start + BULK_CHUNK_SIZE]))
+            )
+            found.update((row[0], row[1]) for row in result)
+        return found
+
+    async def record_deletions(self, db: AsyncSession, projects_by_id: Dict[UUID, UUID]) -> Dict[UUID, int]:
+        """Write tombstones for rows about to be deleted, keyed id -> project_id"""
+        revisions = await self.next_revisions(db, projects_by_id.values())
+        rows = [
+            {"entity_id": id, "project_id": project_id, "entity_type": self.entity_type, "revision": revisions[project_id]}
+            for id, project_id in projects_by_id.items()
+        ]
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            await db.execute(insert(models.TreeTombstone), rows[start:start + BULK_CHUNK_SIZE])
+        return revisions
+
+    async def announce(self, action: str, projects_by_id: Dict[UUID, UUID], revisions: Dict[UUID, int]) -> None:
+        """Publish one "<entity>.<action>" event per project for committed writes, keyed id -> project_id.
+        
+        Events carry ids and the new revision only; subscribers fetch rows through tree/changes.
+        """
+        ids_by_project: Dict[UUID, List[str]] = {}
+        for id, project_id in projects_by_id.items():
+            ids_by_project.setdefault(project_id, []).append(str(id))
+        for project_id, ids in ids_by_project.items():
+            # The write is committed either way; watchers catch up through tree/changes
+            try:
+                await events.publish_project_event(
+                    project_id, f"{self.entity_type}.{action}", ids=ids, revision=revisions.get(project_id)
+                )
+            except Exception:
+                logger.exception("Publishing %s.%s for project %s failed", self.entity_type, action, project_id)
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[CreateSchemaType, Dict[str, Any]]) -> ModelType:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+        revisions = await self.next_revisions(db, [obj_data["project_id"]])
+        obj_data["revision"] = revisions[obj_data["project_id"]]
+        db_obj = await super().create(db, obj_in=obj_data)
+        await self.announce("created", {getattr(db_obj, self._get_id_field()): db_obj.project_id}, revisions)
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: ModelType,
+        obj_in: Union[UpdateSchemaType, Dict[str, Any]]
+    ) -> ModelType:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump(exclude_unset=True)
+        if not any(field in self.model.__table__.columns for field in obj_data):
+            return await super().update(db, db_obj=db_obj, obj_in=obj_data)
+        changed = {getattr(db_obj, self._get_id_field()): db_obj.project_id}
+        revisions = await self.next_revisions(db, changed.values())
+        obj_data["revision"] = revisions[db_obj.project_id]
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_data)
+        await self.announce("updated", changed, revisions)
+        return db_obj
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[CreateSchemaType, Dict[str, Any]]],
+        commit: bool = True
+    ) -> List[ModelType]:
+        rows = [dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump() for obj_in in objs_in]
+        revisions = await self.next_revisions(db, (row["project_id"] for row in rows))
+        for row in rows:
+            row["revision"] = revisions[row["project_id"]]
+        db_objs = await super().create_many(db, objs_in=rows, commit=commit)
+        if commit:
+            id_field = self._get_id_field()
+            await self.announce("created", {getattr(db_obj, id_field): db_obj.project_id for db_obj in db_objs}, revisions)
+        return db_objs
+
+    async def update_many(self, db: AsyncSession, *, objs_in: List[Dict[str, Any]], commit: bool = True) -> List[ModelType]:
+        id_field = self._get_id_field()
+        columns = self.model.__table__.columns
+        changed = [obj_in for obj_in in objs_in if any(field in columns and field != id_field for field in obj_in)]
+        projects_by_id = await self.project_ids(db, (obj_in[id_field] for obj_in in changed))
+        revisions = await self.next_revisions(db, projects_by_id.values())
+        objs_in = [
+            obj_in | {"revision": revisions[projects_by_id[obj_in[id_field]]]} if obj_in[id_field] in projects_by_id else obj_in
+            for obj_in in objs_in
+        ]
+        db_objs = await super().update_many(db, objs_in=objs_in, commit=commit)
+        if commit:
+            await self.announce("updated", projects_by_id, revisions)
+        return db_objs
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        projects_by_id = await self.project_ids(db, ids)
+        revisions = await self.record_deletions(db, projects_by_id)
+        removed = await super().remove_many(db, ids=ids, commit=commit)
+        if commit:
+            await self.announce("deleted", {id: projects_by_id[id] for id in removed if id in projects_by_id}, revisions)
+        return removed
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[ModelType]:
+        obj = await self.get(db, id)
+        if obj:
+            deleted = {id: obj.project_id}
+            revisions = await self.record_deletions(db, deleted)
+            await db.delete(obj)
+            await db.commit()
+            await self.announce("deleted", deleted, revisions)
+        return obj
+
+    async def get_changes(
+        self,
+        db: AsyncSession,
+        *,
+        project_id: UUID,
+        columns: List[str],
+        since: Optional[int] = None
+    ) -> Tuple[List[Any], List[UUID]]:
+        """Rows of a project (only the given columns) written after since, plus ids deleted after since.
+        
+        Without since this is the full listing and no tombstones are read.
+        """
+        query = (
+            select(*(getattr(self.model, name) for name in columns))
+            .where(self.model.project_id == project_id)
+            .order_by(self._get_id_column())
+        )
+        if since is None:
+            rows = await db.execute(query)
+            return rows.all(), []
+        
+        rows = await db.execute(query.where(self.model.revision > since))
+        deleted = await db.execute(
+            select(models.TreeTombstone.entity_id)
+            .where(models.TreeTombstone.project_id == project_id)
+            .where(models.TreeTombstone.entity_type == self.entity_type)
+            .where(models.TreeTombstone.revision > since)
+        )
+        return rows.all(), deleted.scalars().all()
+
+class CRUDDirectory(CRUDTreeNode[models.Directory, schemas.DirectoryCreate, schemas.DirectoryUpdate]):
+    """Directories keep materialized_path ("/<root id>/.../<own id>/") and depth_level
+    up to date, so a whole subtree is one prefix-range query on idx_directory_path.
+    Paths are built from ids, so renames never touch them; only moves do.
+    """
+
+    def _in_subtree(self, path: str):
+        return self.model.materialized_path.startswith(path, autoescape=True)
+
+    def _path_values(self, directory_id: UUID, parent_directory_id: Optional[UUID]) -> Dict[str, Any]:
+        if parent_directory_id is None:
+            return {"materialized_path": f"/{directory_id}/", "depth_level": 0}
+        
+        # Derive path and depth from the parent inside the INSERT itself. A parent without a
+        # path gives its child none either (NULL || text), for rebuild_paths to backfill
+        parent = self.model.__table__.alias("parent")
+        parent_row = select(parent).where(parent.c.directory_id == parent_directory_id)
+        return {
+            "materialized_path": parent_row.with_only_columns(parent.c.materialized_path)
+            .scalar_subquery()
+            .concat(f"{directory_id}/"),
+            "depth_level": func.coalesce(
+                parent_row.with_only_columns(parent.c.depth_level + 1).scalar_subquery(), 0
+            ),
+        }
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[schemas.DirectoryCreate, Dict[str, Any]]) -> models.Directory:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+        obj_data["directory_id"] = obj_data.get("directory_id") or uuid4()
+        obj_data.update(self._path_values(obj_data["directory_id"], obj_data.get("parent_directory_id")))
+        return await super().create(db, obj_in=obj_data)
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[schemas.DirectoryCreate, Dict[str, Any]]],
+        commit: bool = True
+    ) -> List[models.Directory]:
+        rows = [dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump() for obj_in in objs_in]
+        parents = await self.get_many(db, ids=(row["parent_directory_id"] for row in rows if row.get("parent_directory_id")))
+        for row in rows:
+            row["directory_id"] = row.get("directory_id") or uuid4()
+            parent = parents.get(row.get("parent_directory_id"))
+            if parent and parent.materialized_path is None:
+                row["materialized_path"] = None
+            else:
+                row["materialized_path"] = f"{parent.materialized_path if parent else '/'}{row['directory_id']}/"
+            row["depth_level"] = parent.depth_level + 1 if parent else 0
+        return await super().create_many(db, objs_in=rows, commit=commit)
+
+    async def _move_subtree(self, db: AsyncSession, *, db_obj: models.Directory, new_parent_id: Optional[UUID]) -> None:
+        """Rewrite the path prefix and depth of db_obj and all its descendants in one UPDATE"""
+        new_parent = None
+        if new_parent_id is not None:
+            result = await db.execute(
+                select(self.model.materialized_path, self.model.depth_level)
+                .where(self.model.directory_id == new_parent_id)
+            )
+            new_parent = result.one_or_none()
+        
+        old_prefix = db_obj.materialized_path
+        if old_prefix is None:
+            # Rows created before paths were maintained; rebuild_paths backfills them
+            return
+        if new_parent and new_parent.materialized_path is None:
+            # Likewise under such a parent: the subtree loses its paths until they are rebuilt
+            await db.execute(
+                update(self.model)
+                .where(self._in_subtree(old_prefix))
+                .values(materialized_path=None)
+                .execution_options(synchronize_session=False)
+            )
+            return
+        new_prefix = f"{new_parent.materialized_path if new_parent else '/'}{db_obj.directory_id}/"
+        if new_parent and new_parent.materialized_path.startswith(old_prefix):
+            raise InvalidMoveError("Cannot move a directory into its own subtree")
+        
+        depth_delta = (new_parent.depth_level + 1 if new_parent else 0) - (db_obj.depth_level or 0)
+        await db.execute(
+            update(self.model)
+            .where(self._in_subtree(old_prefix))
+            .values(
+                materialized_path=literal(new_prefix, String).concat(
+                    func.substr(self.model.materialized_path, len(old_prefix) + 1)
+                ),
+                depth_level=self.model.depth_level + depth_delta,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: models.Directory,
+        obj_in: Union[schemas.DirectoryUpdate, Dict[str, Any]]
+    ) -> models.Directory:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump(exclude_unset=True)
+        if "parent_directory_id" in obj_data and obj_data["parent_directory_id"] != db_obj.parent_directory_id:
+            await self._move_subtree(db, db_obj=db_obj, new_parent_id=obj_data["parent_directory_id"])
+        return await super().update(db, db_obj=db_obj, obj_in=obj_data)
+
+    async def update_many(self, db: AsyncSession, *, objs_in: List[Dict[str, Any]], commit: bool = True) -> List[models.Directory]:
+        moves = [obj_in for obj_in in objs_in if "parent_directory_id" in obj_in]
+        current = await self.get_many(db, ids=(obj_in["directory_id"] for obj_in in moves))
+        for obj_in in moves:
+            db_obj = current.get(obj_in["directory_id"])
+            if db_obj and obj_in["parent_directory_id"] != db_obj.parent_directory_id:
+                # Re-read the path: an earlier move in this batch may have rewritten it
+                await db.refresh(db_obj, ["materialized_path", "depth_level"])
+                await self._move_subtree(db, db_obj=db_obj, new_parent_id=obj_in["parent_directory_id"])
+        return await super().update_many(db, objs_in=objs_in, commit=commit)
+
+    async def get_subtree(self, db: AsyncSession, *, db_obj: models.Directory) -> Tuple[List[models.Directory], List[models.File]]:
+        """All descendant directories and the files under db_obj, one prefix-range query each"""
+        in_subtree = self._in_subtree(db_obj.materialized_path)
+        directories = await db.execute(
+            select(self.model).where(in_subtree).order_by(self.model.materialized_path)
+        )
+        files = await db.execute(
+            select(models.File)
+            .join(self.model, models.File.directory_id == self.model.directory_id)
+            .where(in_subtree)
+        )
+        return directories.scalars().all(), files.scalars().all()
+
+    async def remove_subtree(self, db: AsyncSession, *, db_obj: models.Directory) -> int:
+        """Delete db_obj, its descendants and their files; returns the number of directories removed"""
+        subtree_ids = select(self.model.directory_id).where(self._in_subtree(db_obj.materialized_path))
+        revision = (await self.next_revisions(db, [db_obj.project_id]))[db_obj.project_id]
+        for model, id_column, parent_column, entity_type in (
+            (models.File, models.File.file_id, models.File.directory_id, "file"),
+            (self.model, self.model.directory_id, self.model.directory_id, "directory"),
+        ):
+            await db.execute(
+                insert(models.TreeTombstone).from_select(
+                    ["entity_id", "project_id", "entity_type", "revision"],
+                    select(id_column, model.project_id, literal(entity_type), literal(revision, BigInteger))
+                    .where(parent_column.in_(subtree_ids))
+                )
+            )
+        await crud_blob.release_for_files(db, select(models.File.file_id).where(models.File.directory_id.in_(subtree_ids)))
+        await db.execute(
+            delete(models.File)
+            .where(models.File.directory_id.in_(subtree_ids))
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(
+            delete(self.model)
+            .where(self._in_subtree(db_obj.materialized_path))
+            .execution_options(synchronize_session=False)
+        )
+        db.expunge(db_obj)
+        await db.commit()
+        await self.announce("deleted", {db_obj.directory_id: db_obj.project_id}, {db_obj.project_id: revision})
+        return result.rowcount
+
+    async def rebuild_paths(self, db: AsyncSession, *, project_id: UUID) -> int:
+        """Recompute materialized_path/depth_level for every directory in a project from parent links"""
+        result = await db.execute(
+            select(self.model.directory_id, self.model.parent_directory_id)
+            .where(self.model.project_id == project_id)
+        )
+        children: Dict[Optional[UUID], List[UUID]] = {}
+        for row in result:
+            children.setdefault(row.parent_directory_id, []).append(row.directory_id)
+        
+        rows = []
+        pending = [(directory_id, f"/{directory_id}/", 0) for directory_id in children.get(None, [])]
+        while pending:
+            directory_id, path, depth = pending.pop()
+            rows.append({"directory_id": directory_id, "materialized_path": path, "depth_level": depth})
+            pending.extend((child, f"{path}{child}/", depth + 1) for child in children.get(directory_id, []))
+        
+        if rows:
+            await db.execute(update(self.model), rows)
+        await db.commit()
+        return len(rows)
+
+    async def parents_with_children_outside(self, db: AsyncSession, *, ids: Set[UUID]) -> Set[UUID]:
+        """Return the directories in ids that have a subdirectory not in ids"""
+        wanted = list(ids)
+        blocked = set()
+        for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(self.model.parent_directory_id, self.model.directory_id)
+                .where(self.model.parent_directory_id.in_(wanted[start:start + BULK_CHUNK_SIZE]))
+            )
+            blocked.update(row.parent_directory_id for row in result if row.directory_id not in ids)
+        return blocked
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.Directory]:
+        # The directory's files and their versions go with it through the ORM cascade
+        await crud_blob.release_for_files(db, select(models.File.file_id).where(models.File.directory_id == id))
+        return await super().remove(db, id=id)
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        """Delete directories together with the files they contain, in one transaction"""
+        file_ids = []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(models.File.file_id).where(models.File.directory_id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+            )
+            file_ids.extend(result.scalars().all())
+        await crud_file.remove_many(db, ids=file_ids, commit=False)
+        return await super().remove_many(db, ids=ids, commit=commit)
+
+class CRUDFile(CRUDTreeNode[models.File, schemas.FileCreate, schemas.FileUpdate]):
+    """Deleting files cascades to their versions in the database, so the blob
+    references those versions hold are released in the same transaction.
+    """
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            await crud_blob.release_for_files(db, ids[start:start + BULK_CHUNK_SIZE])
+        return await super().remove_many(db, ids=ids, commit=commit)
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.File]:
+        await crud_blob.release_for_files(db, [id])
+        return await super().remove(db, id=id)
+
+class CRUDBlob(CRUDBase[models.Blob, schemas.BlobCreate, schemas.BlobCreate]):
+    """Blob rows count the versions that point at each digest. Reference changes are not
+    committed here; they ride along with the version writes that cause them.
+
+    Writing a digest's object and recording its row happen under lock(), as does garbage
+    collection from deleting the row through deleting the object, so the two never interleave.
+    """
+
+    async def lock(self, db: AsyncSession, digest: str) -> None:
+        """Hold digest until the transaction ends (Postgres; SQLite serialises writers already)"""
+        if db.get_bind().dialect.name == "postgresql":
+            await db.execute(select(func.pg_advisory_xact_lock(BLOB_LOCK_CLASS, func.hashtext(digest))))
+
+    async def register(self, db: AsyncSession, *, digest: str, size_in_bytes: int, commit: bool = True) -> models.Blob:
+        """Record an uploaded blob with no references yet; an existing row is returned, its
+        grace period restarted if it is unreferenced.
+
+        With commit=False the row joins the caller's transaction, and a concurrent insert
+        of the same digest fails that transaction instead of being absorbed.
+        """
+        blob = await self.get(db, digest)
+        if blob and blob.ref_count > 0:
+            return blob
+        if blob:
+            blob = await self.touch(db, digest, commit=commit)
+            # None if garbage collection removed the row meanwhile; record it afresh
+            if blob:
+                return blob
+        if not commit:
+            await db.execute(insert(self.model).values(digest=digest, size_in_bytes=size_in_bytes, ref_count=0))
+            return await self.get(db, digest)
+        try:
+            return await self.create(db, obj_in={"digest": digest, "size_in_bytes": size_in_bytes, "ref_count": 0})
+        except IntegrityError:
+            # Uploaded concurrently by someone else
+            await db.rollback()
+            return await self.get(db, digest)
+
+    async def touch(self, db: AsyncSession, digest: str, commit: bool = True) -> Optional[models.Blob]:
+        """Restart the grace period of a blob uploaded again, so it is not collected before
+        the version it was uploaded for references it; None if the row is gone
+        """
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.digest == digest)
+            .values(released_at=func.now())
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        blob = result.scalar_one_or_none()
+        if blob is not None and commit:
+            return await self._commit_returned(db, blob)
+        if commit:
+            await db.commit()
+        return blob
+
+    async def acquire(self, db: AsyncSession, digest: str) -> Optional[int]:
+        """Add a reference and return the blob size, or None if the digest is unknown"""
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.digest == digest)
+            .values(ref_count=self.model.ref_count + 1)
+            .returning(self.model.size_in_bytes)
+            .execution_options(synchronize_session=False)
+        )
         return result.scalar_one_or_none()
 
+    async def release(self, db: AsyncSession, digests: Iterable[Optional[str]]) -> None:
+        """Drop one reference per occurrence, with one executemany UPDATE"""
+        counts = Counter(digest for digest in digests if digest)
+        if not counts:
+            return
+        blobs = self.model.__table__
+        await db.execute(
+            update(blobs)
+            .where(blobs.c.digest == bindparam("b_digest"))
+            .values(ref_count=blobs.c.ref_count - bindparam("b_count"), released_at=func.now()),
+            [{"b_digest": digest, "b_count": count} for digest, count in counts.items()]
+        )
+
+    async def release_for_files(self, db: AsyncSession, file_ids) -> None:
+        """Drop the references held by every version of file_ids (a list or a select of ids)"""
+        result = await db.execute(
+            select(models.FileVersion.storage_digest, func.count())
+            .where(models.FileVersion.file_id.in_(file_ids))
+            .where(models.FileVersion.storage_digest.isnot(None))
+            .group_by(models.FileVersion.storage_digest)
+        )
+        await self.release(db, Counter(dict(result.all())).elements())
+
+    async def collect_garbage(
+        self,
+        db: AsyncSession,
+        *,
+        grace_seconds: int = storage.BLOB_GC_GRACE_SECONDS,
+        limit: int = 1000
+    ) -> Tuple[int, int]:
+        """Delete up to limit blobs unreferenced for longer than the grace period, rows and then
+        objects in one transaction; returns (blobs deleted, bytes reclaimed)
+
+        Each digest is locked first, so an upload of the same content waits until both the row
+        and the object are gone and then writes them afresh.
+        """
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=grace_seconds)
+        # The reference check guards against counts left behind by deletes outside this module
+        referenced = select(models.FileVersion.version_id).where(models.FileVersion.storage_digest == self.model.digest).exists()
+        candidates = (
+            select(self.model.digest)
+            .where(self.model.ref_count <= 0)
+            .where(self.model.released_at < cutoff)
+            .where(~referenced)
+            .limit(limit)
+        )
+        digests = sorted((await db.execute(candidates)).scalars())
+        for digest in digests:
+            await self.lock(db, digest)
+        result = await db.execute(
+            delete(self.model)
+            .where(self.model.digest.in_(digests))
+            # Re-checked under the locks, in case it was re-uploaded or referenced meanwhile
+            .where(self.model.ref_count <= 0)
+            .where(self.model.released_at < cutoff)
+            .where(~referenced)
+            .returning(self.model.digest, self.model.size_in_bytes)
+            .execution_options(synchronize_session=False)
+        )
+        deleted = result.all()
+        for digest, _ in deleted:
+            await storage.blob_store.delete(storage.blob_key(digest))
+        await db.commit()
+        return len(deleted), sum(size for _, size in deleted)
+
 class CRUDFileVersion(CRUDBase[models.FileVersion, schemas.FileVersionCreate, schemas.FileVersionUpdate]):
-    pass
+    """Versions with content are stored as a delta against their parent version when that is
+    small enough, and whole (a keyframe) otherwise or every VERSION_KEYFRAME_INTERVAL deltas.
+    Each version holds a reference on its storage blob; content_digest names the full content.
+
+    A delta's parent must keep serving as its base. Before a version is deleted, the deltas
+    built on it are re-encoded against its nearest surviving ancestor; before one is moved
+    to another file or re-parented, it is stored whole.
+    """
+
+    def __init__(self, model: Type[models.FileVersion]):
+        super().__init__(model)
+        # Keyed by content digest, so identical contents share an entry
+        self.contents = register_cache(
+            "file_version_contents", maxsize=storage.VERSION_CACHE_SIZE, ttl=storage.VERSION_CACHE_TTL,
+            maxbytes=storage.VERSION_CACHE_TOTAL_BYTES
+        )
+
+    def _cache_content(self, digest: str, content: bytes) -> None:
+        if len(content) <= storage.VERSION_CACHE_MAX_BYTES:
+            self.contents.set(digest, content)
+
+    async def _read_blob(self, digest: str) -> bytes:
+        data = await storage.blob_store.get(storage.blob_key(digest))
+        if data is None:
+            raise MissingBlobError("File version content not found")
+        return data
+
+    async def _chain(self, db: AsyncSession, version_id: UUID) -> List[Any]:
+        """The version and its ancestors back to the nearest keyframe, keyframe first"""
+        fv = self.model
+        chain = (
+            select(fv.version_id, fv.parent_version_id, fv.content_digest, fv.storage_digest, fv.chain_length)
+            .where(fv.version_id == version_id)
+            .cte("version_chain", recursive=True)
+        )
+        parent = aliased(fv)
+        chain = chain.union_all(
+            select(parent.version_id, parent.parent_version_id, parent.content_digest, parent.storage_digest, parent.chain_length)
+            .join(chain, parent.version_id == chain.c.parent_version_id)
+            .where(chain.c.chain_length > 0)
+        )
+        # chain_length strictly decreases towards the keyframe
+        result = await db.execute(select(chain).order_by(chain.c.chain_length))
+        return result.all()
+
+    async def materialize(self, db: AsyncSession, version: models.FileVersion) -> Optional[bytes]:
+        """Full content of a version, replaying deltas from the nearest keyframe or cached
+        ancestor; None for versions that only link to external content
+        """
+        if not version.content_digest:
+            return None
+        cached = self.contents.get(version.content_digest)
+        if cached is not MISSING:
+            return cached
+        if not version.chain_length:
+            content = await self._read_blob(version.storage_digest)
+        else:
+            chain = await self._chain(db, version.version_id)
+            # Start from the newest ancestor whose content is already cached
+            start, content = 0, None
+            for index in range(len(chain) - 2, 0, -1):
+                cached = self.contents.get(chain[index].content_digest)
+                if cached is not MISSING:
+                    start, content = index, cached
+                    break
+            if content is None:
+                content = await self._read_blob(chain[0].storage_digest)
+            for row in chain[start + 1:]:
+                content = await asyncio.to_thread(apply_delta, content, await self._read_blob(row.storage_digest))
+        if storage.digest_of(content) != version.content_digest:
+            raise MissingBlobError("File version content is corrupt")
+        self._cache_content(version.content_digest, content)
+        return content
+
+    async def _store_content(self, db: AsyncSession, obj_data: Dict[str, Any]) -> None:
+        """Fill in storage_digest, chain_length and size_in_bytes for a new version"""
+        digest = obj_data["content_digest"]
+        blob = await crud_blob.get(db, digest)
+        if blob is None:
+            await db.rollback()
+            raise MissingBlobError("Blob not found")
+        size, already_stored = blob.size_in_bytes, blob.ref_count > 0
+        obj_data.update(storage_digest=digest, chain_length=0, size_in_bytes=size)
+
+        parent = await self.get(db, obj_data["parent_version_id"]) if obj_data.get("parent_version_id") else None
+        # A blob some version already keeps whole costs nothing more to reference
+        if (
+            parent is None or not parent.content_digest or already_stored
+            or parent.file_id != obj_data["file_id"]
+            or parent.chain_length + 1 >= storage.VERSION_KEYFRAME_INTERVAL
+            or size > storage.VERSION_DELTA_MAX_BYTES
+        ):
+            return
+        chain_length = parent.chain_length + 1
+        content = await self._read_blob(digest)
+        patch = await self._delta_against(db, parent, content)
+        # The next version will most likely be diffed against this one
+        self._cache_content(digest, content)
+        if patch is None:
+            return
+        patch_digest = storage.digest_of(patch)
+        await crud_blob.lock(db, patch_digest)
+        await storage.blob_store.put(storage.blob_key(patch_digest), patch)
+        await crud_blob.register(db, digest=patch_digest, size_in_bytes=len(patch), commit=False)
+        obj_data.update(storage_digest=patch_digest, chain_length=chain_length)
+
+    async def _delta_against(self, db: AsyncSession, base, content: bytes) -> Optional[bytes]:
+        """A delta turning base's content into content, or None when storing it whole is better"""
+        if len(content) > storage.VERSION_DELTA_MAX_BYTES:
+            return None
+        # Diffing is CPU-bound; keep it off the event loop
+        patch = await asyncio.to_thread(
+            make_delta, await self.materialize(db, base), content, 1 - storage.VERSION_DELTA_MAX_RATIO
+        )
+        if patch is None or len(patch) >= len(content) * storage.VERSION_DELTA_MAX_RATIO:
+            return None
+        return patch
+
+    async def _rebase(self, db: AsyncSession, version: models.FileVersion, base_id: Optional[UUID] = None) -> None:
+        """Store a delta version whole, or as a delta against base_id, so it no longer depends
+        on its parent. The new delta is only used if it does not lengthen the chain, since
+        chain_length must keep decreasing towards the keyframe for versions built on this one.
+        """
+        content = await self.materialize(db, version)
+        data, digest, chain_length = content, version.content_digest, 0
+        fv = self.model
+        base = None
+        if base_id is not None:
+            result = await db.execute(
+                select(fv.version_id, fv.file_id, fv.content_digest, fv.storage_digest, fv.chain_length)
+                .where(fv.version_id == base_id)
+            )
+            base = result.one_or_none()
+        if (
+            base is not None and base.content_digest and base.file_id == version.file_id
+            and base.chain_length < version.chain_length
+            and base.chain_length + 1 < storage.VERSION_KEYFRAME_INTERVAL
+        ):
+            patch = await self._delta_against(db, base, content)
+            if patch is not None:
+                data, digest, chain_length = patch, storage.digest_of(patch), base.chain_length + 1
+        await crud_blob.lock(db, digest)
+        await storage.blob_store.put(storage.blob_key(digest), data)
+        await crud_blob.register(db, digest=digest, size_in_bytes=len(data), commit=False)
+        await crud_blob.acquire(db, digest)
+        await crud_blob.release(db, [version.storage_digest])
+        await db.execute(
+            update(fv)
+            .where(fv.version_id == version.version_id)
+            .values(storage_digest=digest, chain_length=chain_length)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def _detach_dependents(self, db: AsyncSession, ids: List[UUID]) -> None:
+        """Prepare for deleting ids: surviving children are re-parented to their nearest
+        surviving ancestor, and deltas among them are re-encoded against it or stored whole
+        """
+        removed = set(ids)
+        parents, children = {}, []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            chunk = ids[start:start + BULK_CHUNK_SIZE]
+            result = await db.execute(
+                select(self.model.version_id, self.model.parent_version_id).where(self.model.version_id.in_(chunk))
+            )
+            parents.update(result.all())
+            # Lock the children, so a concurrent rebase or re-parent cannot interleave with ours
+            result = await db.execute(
+                select(self.model)
+                .where(self.model.parent_version_id.in_(chunk))
+                .with_for_update()
+                .execution_options(populate_existing=True)
+            )
+            children.extend(child for child in result.scalars() if child.version_id not in removed)
+        if not children:
+            return
+
+        rows = []
+        for child in children:
+            ancestor = child.parent_version_id
+            while ancestor in removed:
+                ancestor = parents.get(ancestor)
+            if child.chain_length:
+                await self._rebase(db, child, ancestor)
+            rows.append({"b_version_id": child.version_id, "b_parent_version_id": ancestor})
+        versions = self.model.__table__
+        await db.execute(
+            update(versions)
+            .where(versions.c.version_id == bindparam("b_version_id"))
+            .values(parent_version_id=bindparam("b_parent_version_id")),
+            rows
+        )
+
+    async def _append(self, db: AsyncSession, obj_data: Dict[str, Any]) -> Tuple[UUID, Dict[UUID, int]]:
+        """Take the file's next version number and record the new size and checksum on the file row.
+
+        A version given an explicit number below the file's latest fills a gap in its history:
+        the file row keeps describing its latest version.
+
+        Bumping the project's tree_revision and then the file row locks both until commit, in
+        the order tree writes use, so concurrent appends to a file queue up instead of colliding.
+        Returns the project_id and its new revision.
+        """
+        files = models.File
+        file_id = obj_data["file_id"]
+        result = await db.execute(
+            update(models.Project)
+            .where(models.Project.project_id == select(files.project_id).where(files.file_id == file_id).scalar_subquery())
+            .values(tree_revision=models.Project.tree_revision + 1)
+            .returning(models.Project.project_id, models.Project.tree_revision)
+            .execution_options(synchronize_session=False)
+        )
+        project_id, revision = result.one()
+
+        number = obj_data.get("version_number")
+        counter = files.last_version_number
+        latest = {
+            "last_version_number": counter + 1 if number is None else number,
+            "size_in_bytes": obj_data["size_in_bytes"],
+            "content_digest": obj_data.get("content_digest"),
+            "last_modified_by": obj_data["created_by"],
+        }
+        if number is not None:
+            latest = {name: case((counter < number, value), else_=getattr(files, name)) for name, value in latest.items()}
+        result = await db.execute(
+            update(files)
+            .where(files.file_id == file_id)
+            .values(**latest, revision=revision)
+            .returning(files.last_version_number)
+            .execution_options(synchronize_session=False)
+        )
+        if number is None:
+            obj_data["version_number"] = result.scalar_one()
+        return project_id, {project_id: revision}
+
+    async def get_latest(self, db: AsyncSession, file_id: UUID) -> Optional[models.FileVersion]:
+        result = await db.execute(
+            select(self.model)
+            .where(self.model.file_id == file_id)
+            .order_by(self.model.version_number.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[schemas.FileVersionCreate, Dict[str, Any]]) -> models.FileVersion:
+        """Append a version: its number, blob reference and the file's size and modified_at
+        are written in one transaction
+        """
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+        if obj_data.get("content_digest"):
+            await self._store_content(db, obj_data)
+            if await crud_blob.acquire(db, obj_data["storage_digest"]) is None:
+                await db.rollback()
+                raise MissingBlobError("Blob not found")
+        project_id, revisions = await self._append(db, obj_data)
+        try:
+            db_obj = await super().create(db, obj_in=obj_data)
+        except IntegrityError as e:
+            await db.rollback()
+            # Only uq_version_per_file can be violated by a new version's own values
+            if is_unique_violation(e):
+                raise VersionConflictError("Version number already exists for this file")
+            raise
+        await crud_file.announce("updated", {db_obj.file_id: project_id}, revisions)
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: models.FileVersion,
+        obj_in: Union[schemas.FileVersionUpdate, Dict[str, Any]]
+    ) -> models.FileVersion:
+        obj_data = obj_in if isinstance(obj_in, dict) else obj_in.model_dump(exclude_unset=True)
+        rebased = any(
+            field in obj_data and obj_data[field] != getattr(db_obj, field)
+            for field in ("file_id", "parent_version_id")
+        )
+        if rebased and db_obj.chain_length:
+            await self._rebase(db, db_obj)
+        return await super().update(db, db_obj=db_obj, obj_in=obj_data)
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        await self._detach_dependents(db, ids)
+        removed = []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                delete(self.model)
+                .where(self.model.version_id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+                .returning(self.model.version_id, self.model.storage_digest)
+                .execution_options(synchronize_session=False)
+            )
+            removed.extend(result.all())
+        await crud_blob.release(db, (digest for _, digest in removed))
+        if commit:
+            await db.commit()
+        return [version_id for version_id, _ in removed]
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.FileVersion]:
+        obj = await self.get(db, id)
+        if obj:
+            await self._detach_dependents(db, [id])
+            await crud_blob.release(db, [obj.storage_digest])
+            await db.delete(obj)
+            await db.commit()
+        return obj
 
 class CRUDProjectMember(CRUDBase[models.ProjectMember, schemas.ProjectMemberCreate, schemas.ProjectMemberUpdate]):
+    """Member writes evict the affected (project_id, user_id) entries from the membership cache
+    once committed, so a removed member or changed role is seen on the next check.
+    """
+
+    async def get_membership(self, db: AsyncSession, *, project_id: UUID, user_id: UUID) -> Optional[Dict[str, Any]]:
+        """Role and permissions of a user in a project, read through the membership cache"""
+        membership = await membership_cache.get(project_id, user_id)
+        if membership is not None:
+            return membership
+        generation = await membership_cache.generation(project_id)
+        result = await db.execute(
+            select(self.model.role_id)
+            .where(self.model.project_id == project_id)
+            .where(self.model.user_id == user_id)
+            .limit(1)
+        )
+        role_id = result.scalar_one_or_none()
+        if role_id is None:
+            return None
+        return await self.cache_membership(db, project_id=project_id, user_id=user_id, role_id=role_id, generation=generation)
+
+    async def cache_membership(
+        self, db: AsyncSession, *, project_id: UUID, user_id: UUID, role_id: UUID, generation: Any
+    ) -> Dict[str, Any]:
+        """Cache a membership read after generation was taken; skipped if it was evicted since"""
+        role = await crud_role.get(db, role_id)
+        membership = {"role_id": str(role_id), "permissions": role.permissions if role else {}}
+        await membership_cache.set(project_id, user_id, membership, generation)
+        return membership
+
+    async def _evict(self, pairs: Iterable[Tuple[UUID, UUID]]) -> None:
+        for project_id, user_id in set(pairs):
+            await membership_cache.delete(project_id, user_id)
+
+    async def _announce(self, action: str, pairs: Iterable[Tuple[UUID, UUID]]) -> None:
+        """Publish one "member.<action>" event per project for committed writes"""
+        users_by_project: Dict[UUID, Set[str]] = {}
+        for project_id, user_id in pairs:
+            users_by_project.setdefault(project_id, set()).add(str(user_id))
+        for project_id, user_ids in users_by_project.items():
+            try:
+                await events.publish_project_event(project_id, f"member.{action}", user_ids=sorted(user_ids))
+            except Exception:
+                logger.exception("Publishing member.%s for project %s failed", action, project_id)
+
+    async def _member_pairs(self, db: AsyncSession, ids: List[UUID]) -> List[Tuple[UUID, UUID]]:
+        pairs = []
+        for start in range(0, len(ids), BULK_CHUNK_SIZE):
+            result = await db.execute(
+                select(self.model.project_id, self.model.user_id)
+                .where(self.model.project_member_id.in_(ids[start:start + BULK_CHUNK_SIZE]))
+            )
+            pairs.extend((row.project_id, row.user_id) for row in result)
+        return pairs
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[schemas.ProjectMemberCreate, Dict[str, Any]]) -> models.ProjectMember:
+        db_obj = await super().create(db, obj_in=obj_in)
+        await self._evict([(db_obj.project_id, db_obj.user_id)])
+        await self._announce("created", [(db_obj.project_id, db_obj.user_id)])
+        return db_obj
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: models.ProjectMember,
+        obj_in: Union[schemas.ProjectMemberUpdate, Dict[str, Any]]
+    ) -> models.ProjectMember:
+        old_pair = (db_obj.project_id, db_obj.user_id)
+        db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_in)
+        await self._evict([old_pair, (db_obj.project_id, db_obj.user_id)])
+        await self._announce("updated", [(db_obj.project_id, db_obj.user_id)])
+        return db_obj
+
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.ProjectMember]:
+        obj = await self.get(db, id)
+        if obj:
+            pair = (obj.project_id, obj.user_id)
+            await db.delete(obj)
+            await db.commit()
+            await self._evict([pair])
+            await self._announce("deleted", [pair])
+        return obj
+
+    async def create_many(
+        self,
+        db: AsyncSession,
+        *,
+        objs_in: List[Union[schemas.ProjectMemberCreate, Dict[str, Any]]],
+        commit: bool = True
+    ) -> List[models.ProjectMember]:
+        db_objs = await super().create_many(db, objs_in=objs_in, commit=commit)
+        pairs = [(db_obj.project_id, db_obj.user_id) for db_obj in db_objs]
+        await self._evict(pairs)
+        if commit:
+            await self._announce("created", pairs)
+        return db_objs
+
+    async def update_many(self, db: AsyncSession, *, objs_in: List[Dict[str, Any]], commit: bool = True) -> List[models.ProjectMember]:
+        old_pairs = await self._member_pairs(db, [obj_in["project_member_id"] for obj_in in objs_in])
+        db_objs = await super().update_many(db, objs_in=objs_in, commit=commit)
+        new_pairs = [(db_obj.project_id, db_obj.user_id) for db_obj in db_objs]
+        await self._evict(old_pairs + new_pairs)
+        if commit:
+            await self._announce("updated", new_pairs)
+        return db_objs
+
+    async def remove_many(self, db: AsyncSession, *, ids: List[UUID], commit: bool = True) -> List[UUID]:
+        pairs = await self._member_pairs(db, ids)
+        removed = await super().remove_many(db, ids=ids, commit=commit)
+        await self._evict(pairs)
+        if commit:
+            await self._announce("deleted", pairs)
+        return removed
+
     async def get_by_user(self, db: AsyncSession, *, user_id: UUID) -> List[models.ProjectMember]:
         result = await db.execute(
             select(self.model)
@@ -251,23 +1528,196 @@ class CRUDProjectInvitation(CRUDBase[models.ProjectInvitation, schemas.ProjectIn
             token = ''.join(secrets.choice(string.ascii_letters + string.digits) for _ in range(32))
             obj_data['token'] = token
         
-        db_obj = self.model(**obj_data)
-        db.add(db_obj)
+        return await self.create(db, obj_in=obj_data)
+
+class CRUDNotification(CRUDBase[models.Notification, schemas.NotificationCreate, schemas.NotificationUpdate]):
+    """Every write that changes how many unread notifications a user has also adjusts
+    users.unread_notifications in the same transaction, so the badge count is a single-row read.
+    """
+
+    def __init__(self, model: Type[models.Notification]):
+        super().__init__(model)
+        self.unread_counts = register_cache("unread_counts", ttl=UNREAD_COUNT_CACHE_TTL)
+
+    async def _adjust_unread(self, db: AsyncSession, user_id: UUID, delta: int) -> int:
+        result = await db.execute(
+            update(models.User)
+            .where(models.User.user_id == user_id)
+            .values(unread_notifications=models.User.unread_notifications + delta)
+            .returning(models.User.unread_notifications)
+            .execution_options(synchronize_session=False)
+        )
+        return result.scalar_one()
+
+    async def get_unread_count(self, db: AsyncSession, *, user_id: UUID) -> Optional[int]:
+        """Unread count from the per-user counter, or None if the user does not exist"""
+        cached = self.unread_counts.get(user_id)
+        if cached is not MISSING:
+            return cached
+        result = await db.execute(
+            select(models.User.unread_notifications).where(models.User.user_id == user_id)
+        )
+        unread = result.scalar_one_or_none()
+        if unread is not None:
+            self.unread_counts.set(user_id, unread)
+        return unread
+
+    async def recount_unread(self, db: AsyncSession, *, user_id: UUID) -> int:
+        """Rebuild a user's counter from the notifications table, e.g. after rows were written outside the API"""
+        unread = (
+            select(func.count())
+            .select_from(self.model)
+            .where(self.model.user_id == user_id)
+            .where(self.model.is_read == False)
+            .scalar_subquery()
+        )
+        await db.execute(
+            update(models.User)
+            .where(models.User.user_id == user_id)
+            .values(unread_notifications=unread)
+            .execution_options(synchronize_session=False)
+        )
         await db.commit()
-        await db.refresh(db_obj)
+        self.unread_counts.discard(user_id)
+        return await self.get_unread_count(db, user_id=user_id)
+
+    async def create(self, db: AsyncSession, *, obj_in: Union[schemas.NotificationCreate, Dict[str, Any]]) -> models.Notification:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+        # One statement bumps the unread counter and hands out the next per-user sequence number
+        result = await db.execute(
+            update(models.User)
+            .where(models.User.user_id == obj_data["user_id"])
+            .values(
+                unread_notifications=models.User.unread_notifications + (0 if obj_data.get("is_read") else 1),
+                notification_seq=models.User.notification_seq + 1,
+            )
+            .returning(models.User.unread_notifications, models.User.notification_seq)
+            .execution_options(synchronize_session=False)
+        )
+        counters = result.one()
+        obj_data["seq"] = counters.notification_seq
+        db_obj = await super().create(db, obj_in=obj_data)
+        self.unread_counts.set(db_obj.user_id, counters.unread_notifications)
+        return db_obj
+
+    async def get_since(self, db: AsyncSession, *, user_id: UUID, seq: int, limit: int) -> List[models.Notification]:
+        """A user's notifications after sequence number seq, oldest first"""
+        result = await db.execute(
+            select(self.model)
+            .where(self.model.user_id == user_id)
+            .where(self.model.seq > seq)
+            .order_by(self.model.seq)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+    async def _set_read_state(
+        self, db: AsyncSession, *, db_obj: models.Notification, is_read: bool
+    ) -> Tuple[models.Notification, Optional[int]]:
+        # Conditional on the current state, so concurrent mark-reads adjust the counter once
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.notification_id == db_obj.notification_id)
+            .where(self.model.is_read != is_read)
+            .values(is_read=is_read, read_at=func.now() if is_read else None)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        updated = result.scalar_one_or_none()
+        if updated is None:
+            return db_obj, None
+        return updated, await self._adjust_unread(db, updated.user_id, -1 if is_read else 1)
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: models.Notification,
+        obj_in: Union[schemas.NotificationUpdate, Dict[str, Any]]
+    ) -> models.Notification:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump(exclude_unset=True)
+        is_read = obj_data.pop("is_read", None)
+        
+        unread = None
+        if is_read is not None:
+            db_obj, unread = await self._set_read_state(db, db_obj=db_obj, is_read=is_read)
+        if obj_data:
+            db_obj = await super().update(db, db_obj=db_obj, obj_in=obj_data)
+        elif unread is not None:
+            db_obj = await self._commit_returned(db, db_obj)
+        
+        if unread is not None:
+            self.unread_counts.set(db_obj.user_id, unread)
         return db_obj
 
+    async def remove(self, db: AsyncSession, *, id: UUID) -> Optional[models.Notification]:
+        result = await db.execute(
+            delete(self.model)
+            .where(self.model.notification_id == id)
+            .returning(self.model)
+            .execution_options(synchronize_session=False)
+        )
+        db_obj = result.scalar_one_or_none()
+        if db_obj is None:
+            return None
+        unread = await self._adjust_unread(db, db_obj.user_id, 0 if db_obj.is_read else -1)
+        db_obj = await self._commit_returned(db, db_obj)
+        self.unread_counts.set(db_obj.user_id, unread)
+        return db_obj
+
+    async def mark_read(self, db: AsyncSession, *, db_obj: models.Notification) -> models.Notification:
+        return await self.update(db, db_obj=db_obj, obj_in={"is_read": True})
+
+    async def mark_all_read(self, db: AsyncSession, *, user_id: UUID) -> List[UUID]:
+        """Mark every unread notification of a user read with one UPDATE ... RETURNING; returns their ids"""
+        result = await db.execute(
+            update(self.model)
+            .where(self.model.user_id == user_id)
+            .where(self.model.is_read == False)
+            .values(is_read=True, read_at=func.now())
+            .returning(self.model.notification_id)
+            .execution_options(synchronize_session=False)
+        )
+        notification_ids = result.scalars().all()
+        unread = await self._adjust_unread(db, user_id, -len(notification_ids))
+        await db.commit()
+        self.unread_counts.set(user_id, unread)
+        return notification_ids
+
+class CRUDWebSocketConnection(CRUDBase[models.WebSocketConnection, schemas.WebSocketConnectionCreate, schemas.WebSocketConnectionUpdate]):
+    async def create(self, db: AsyncSession, *, obj_in: Union[schemas.WebSocketConnectionCreate, Dict[str, Any]]) -> models.WebSocketConnection:
+        obj_data = dict(obj_in) if isinstance(obj_in, dict) else obj_in.model_dump()
+        obj_data["websocket_id"] = obj_data.get("websocket_id") or uuid4().hex
+        return await super().create(db, obj_in=obj_data)
+
+    async def record_presence(self, db: AsyncSession, *, rows: List[Dict[str, Any]], stale_before: datetime) -> None:
+        """Write batched last_ping/is_active values by primary key, then deactivate every
+        connection whose last ping (or connect time, if it never pinged) is older than stale_before
+        """
+        for start in range(0, len(rows), BULK_CHUNK_SIZE):
+            await db.execute(update(self.model), rows[start:start + BULK_CHUNK_SIZE])
+        await db.execute(
+            update(self.model)
+            .where(self.model.is_active == True)
+            .where(func.coalesce(self.model.last_ping, self.model.connected_at) < stale_before)
+            .values(is_active=False)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
 # Create CRUD instances
 crud_user = CRUDUser(models.User)
 crud_project = CRUDProject(models.Project)
 crud_role = CRUDRole(models.Role)
 crud_project_member = CRUDProjectMember(models.ProjectMember)
 crud_file_type = CRUDFileType(models.FileType)
-crud_directory = CRUDBase[models.Directory, schemas.DirectoryCreate, schemas.DirectoryUpdate](models.Directory)
-crud_file = CRUDBase[models.File, schemas.FileCreate, schemas.FileUpdate](models.File)
+crud_directory = CRUDDirectory(models.Directory)
+crud_file = CRUDFile(models.File)
+crud_blob = CRUDBlob(models.Blob)
 crud_file_version = CRUDFileVersion(models.FileVersion)
 crud_project_invitation = CRUDProjectInvitation(models.ProjectInvitation)
-crud_notification = CRUDBase[models.Notification, schemas.NotificationCreate, schemas.NotificationUpdate](models.Notification)
+crud_notification = CRUDNotification(models.Notification)
+crud_websocket_connection = CRUDWebSocketConnection(models.WebSocketConnection)
 
 # User CRUD functions
 async def create_user(db: AsyncSession, user_in: schemas.UserCreate) -> models.User:
@@ -282,8 +1732,8 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[models.Use
 async def get_user_by_username(db: AsyncSession, username: str) -> Optional[models.User]:
     return await crud_user.get_by_username(db, username=username)
 
-async def get_multi_users(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.User]:
-    return await crud_user.get_multi(db, skip=skip, limit=limit)
+async def get_multi_users(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.User]:
+    return await crud_user.get_multi(db, skip=skip, limit=limit, cursor=cursor)
 
 async def update_user(db: AsyncSession, user_id: UUID, user_in: schemas.UserUpdate) -> Optional[models.User]:
     user = await get_user(db, user_id)
@@ -304,8 +1754,8 @@ async def create_project(db: AsyncSession, project_in: schemas.ProjectCreate) ->
 async def get_project(db: AsyncSession, project_id: UUID) -> Optional[models.Project]:
     return await crud_project.get(db, id=project_id)
 
-async def get_multi_projects(db: AsyncSession, skip: int = 0, limit: int = 100) -> List[models.Project]:
-    return await crud_project.get_multi(db, skip=skip, limit=limit)
+async def get_multi_projects(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> List[models.Project]:
+    return await crud_project.get_multi(db, skip=skip, limit=limit, cursor=cursor)
 
 async def update_project(db: AsyncSession, project_id: UUID, project_in: schemas.ProjectUpdate) -> Optional[models.Project]:
     project = await get_project(db, project_id)
@@ -338,8 +1788,14 @@ async def get_invitations_by_email(db: AsyncSession, email: str) -> List[models.
 async def get_pending_invitations_for_email(db: AsyncSession, email: str) -> List[models.ProjectInvitation]:
     return await crud_project_invitation.get_pending_for_email(db, email=email)
 
-async def get_multi_project_invitations(db: AsyncSession, skip: int = 0, limit: int = 100, **filters) -> List[models.ProjectInvitation]:
-    return await crud_project_invitation.get_multi(db, skip=skip, limit=limit, **filters)
+async def get_multi_project_invitations(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, **filters) -> List[models.ProjectInvitation]:
+    return await crud_project_invitation.get_multi(db, skip=skip, limit=limit, cursor=cursor, **filters)
+
+async def get_project_invitations_page(db: AsyncSession, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, include_total: bool = True, estimate_total: bool = False, **filters) -> Tuple[List[models.ProjectInvitation], Optional[int]]:
+    return await crud_project_invitation.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
 
 async def update_project_invitation(db: AsyncSession, invitation_id: UUID, invitation_in: schemas.ProjectInvitationUpdate) -> Optional[models.ProjectInvitation]:
     invitation = await get_project_invitation(db, invitation_id)
@@ -1,10 +1,12 @@
 import os
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import declarative_base
-from sqlalchemy.pool import NullPool
+from sqlalchemy.pool import NullPool, AsyncAdaptedQueuePool
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from typing import AsyncGenerator
 import asyncio
 import json
+import time
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy import event
 from sqlalchemy.engine import Engine
@@ -55,21 +57,118 @@ else:
     from sqlalchemy import JSON as JSONVariant
 
 
-# Create async engine configured for PgBouncer (avoid app-level pooling)
-# - Disable asyncpg statement cache to avoid prepared statements under PgBouncer transaction/statement modes
-# - Provide unique prepared statement names as an additional safeguard when prepared statements are used internally
-connect_args = {}
-if "postgresql+asyncpg" in DATABASE_URL:
-    connect_args = {
-        "statement_cache_size": 0,
-        "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
-    }
+# Connection profile, selected with DB_POOL_MODE:
+# - "pgbouncer" (default): no app-level pooling; the transaction-mode pooler owns connections,
+#   so every checkout opens a fresh connection and prepared statements must stay disabled
+# - "direct": bounded app-side AsyncAdaptedQueuePool with pre-ping/recycle and asyncpg
+#   prepared statement caching, for connecting straight to Postgres
+DB_POOL_MODE = os.getenv("DB_POOL_MODE", "pgbouncer")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
 
-engine = create_async_engine(
-    DATABASE_URL,
-    poolclass=NullPool,
-    connect_args=connect_args,
-)
+
+class PoolMetrics:
+    """Connection checkout counters shared by both pool profiles"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.connects = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record_checkout(self, wait_seconds: float):
+        self.checkouts += 1
+        self.wait_seconds_total += wait_seconds
+        self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+
+pool_metrics = PoolMetrics()
+
+
+class _MeteredPoolMixin:
+    """Times every checkout, including the connection setup when the pool has to open one"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_metrics.timeouts += 1
+            raise
+        finally:
+            pool_metrics.record_checkout(time.perf_counter() - start)
+
+
+class MeteredNullPool(_MeteredPoolMixin, NullPool):
+    pass
+
+
+class MeteredQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def _engine_options() -> dict:
+    if DB_POOL_MODE == "direct":
+        connect_args = {}
+        if "postgresql+asyncpg" in DATABASE_URL:
+            connect_args = {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        return {
+            "poolclass": MeteredQueuePool,
+            "pool_size": DB_POOL_SIZE,
+            "max_overflow": DB_MAX_OVERFLOW,
+            "pool_timeout": DB_POOL_TIMEOUT,
+            "pool_recycle": DB_POOL_RECYCLE,
+            "pool_pre_ping": DB_POOL_PRE_PING,
+            "connect_args": connect_args,
+        }
+
+    # PgBouncer profile
+    # - Disable asyncpg statement cache to avoid prepared statements under PgBouncer transaction/statement modes
+    # - Provide unique prepared statement names as an additional safeguard when prepared statements are used internally
+    connect_args = {}
+    if "postgresql+asyncpg" in DATABASE_URL:
+        connect_args = {
+            "statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    return {"poolclass": MeteredNullPool, "connect_args": connect_args}
+
+
+engine = create_async_engine(DATABASE_URL, **_engine_options())
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def count_new_connection(dbapi_connection, connection_record):
+    pool_metrics.connects += 1
+
+
+def get_pool_stats() -> dict:
+    """Snapshot of pool occupancy and checkout timings for the active profile"""
+    pool = engine.pool
+    stats = {
+        "mode": DB_POOL_MODE,
+        "checkouts": pool_metrics.checkouts,
+        "connects": pool_metrics.connects,
+        "timeouts": pool_metrics.timeouts,
+        "wait_seconds_total": pool_metrics.wait_seconds_total,
+        "wait_seconds_max": pool_metrics.wait_seconds_max,
+        "wait_seconds_avg": (
+            pool_metrics.wait_seconds_total / pool_metrics.checkouts if pool_metrics.checkouts else 0.0
+        ),
+    }
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+        )
+    return stats
 
 # Create async session factory
 AsyncSessionLocal = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
@@ -0,0 +1,148 @@
+"""Binary deltas between file version contents.
+
+A delta is a list of instructions that rebuilds the target from the base:
+COPY a byte range of the base, or INSERT literal bytes. Matching works on
+lines (runs ending in a newline), which suits source files; content without
+newlines degrades to one big INSERT, and the caller stores such versions whole.
+The instruction stream is zlib-compressed.
+
+Copies are found greedily, as git's delta encoder does: each target line is looked
+up among the base positions holding the same line, preferring the position right
+after the previous copy, and the longest extension wins. Only the first
+DELTA_MAX_CANDIDATES positions of a line are tried, so the work stays linear in the
+number of lines however often lines repeat, where a longest-common-subsequence diff
+goes quadratic.
+
+Layout before compression:
+    header   b"VD1" + target length (u64)
+    COPY     b"C" + base offset (u64) + length (u32)
+    INSERT   b"I" + length (u32) + bytes
+"""
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, List, Optional
+
+MAGIC = b"VD1"
+_HEADER = struct.Struct(">Q")
+_COPY = struct.Struct(">QI")
+_INSERT = struct.Struct(">I")
+
+# Longer contents are stored whole
+DELTA_MAX_LINES = 50_000
+# Base positions tried per target line
+DELTA_MAX_CANDIDATES = 16
+
+
+class DeltaError(ValueError):
+    """Raised when a delta cannot be applied to the given base"""
+
+
+def _lines(data: bytes) -> List[bytes]:
+    return data.splitlines(keepends=True)
+
+
+def similarity(base_lines: List[bytes], target_lines: List[bytes]) -> float:
+    """Upper bound on the fraction of lines the two sides share, like SequenceMatcher.quick_ratio"""
+    total = len(base_lines) + len(target_lines)
+    if not total:
+        return 1.0
+    shared = Counter(base_lines) & Counter(target_lines)
+    return 2 * sum(shared.values()) / total
+
+
+def make_delta(base: bytes, target: bytes, min_ratio: float = 0.0) -> Optional[bytes]:
+    """A delta rebuilding target from base, or None when either side has more than
+    DELTA_MAX_LINES lines or the sides share less than min_ratio of their lines
+    """
+    base_lines, target_lines = _lines(base), _lines(target)
+    if max(len(base_lines), len(target_lines)) > DELTA_MAX_LINES:
+        return None
+    if min_ratio and similarity(base_lines, target_lines) < min_ratio:
+        return None
+    offsets = [0]
+    positions: Dict[bytes, List[int]] = {}
+    for index, line in enumerate(base_lines):
+        offsets.append(offsets[-1] + len(line))
+        candidates = positions.setdefault(line, [])
+        if len(candidates) < DELTA_MAX_CANDIDATES:
+            candidates.append(index)
+
+    out = [MAGIC, _HEADER.pack(len(target))]
+    literal: List[bytes] = []
+    copy_start = copy_end = 0  # base lines of the copy being extended
+
+    def flush_copy():
+        if copy_end > copy_start:
+            out.extend([b"C", _COPY.pack(offsets[copy_start], offsets[copy_end] - offsets[copy_start])])
+
+    def flush_literal():
+        if literal:
+            data = b"".join(literal)
+            out.extend([b"I", _INSERT.pack(len(data)), data])
+            literal.clear()
+
+    j = 0
+    while j < len(target_lines):
+        line = target_lines[j]
+        best, best_length = 0, 0
+        candidates = positions.get(line, [])
+        if copy_end < len(base_lines) and base_lines[copy_end] == line:
+            candidates = [copy_end] + candidates
+        for position in candidates:
+            length = 1
+            while (
+                position + length < len(base_lines) and j + length < len(target_lines)
+                and base_lines[position + length] == target_lines[j + length]
+            ):
+                length += 1
+            if length > best_length:
+                best, best_length = position, length
+        # A copy instruction costs more than a few literal bytes
+        if best_length and offsets[best + best_length] - offsets[best] > _COPY.size + 1:
+            if best != copy_end or literal:
+                flush_copy()
+                flush_literal()
+                copy_start = best
+            copy_end = best + best_length
+            j += best_length
+        else:
+            literal.append(line)
+            j += 1
+    flush_copy()
+    flush_literal()
+    return zlib.compress(b"".join(out))
+
+
+def apply_delta(base: bytes, delta: bytes) -> bytes:
+    try:
+        raw = zlib.decompress(delta)
+    except zlib.error as exc:
+        raise DeltaError("Corrupt delta") from exc
+    if raw[:3] != MAGIC:
+        raise DeltaError("Not a version delta")
+    (target_length,) = _HEADER.unpack_from(raw, 3)
+
+    parts = []
+    position = 3 + _HEADER.size
+    while position < len(raw):
+        op = raw[position:position + 1]
+        position += 1
+        if op == b"C":
+            offset, length = _COPY.unpack_from(raw, position)
+            position += _COPY.size
+            if offset + length > len(base):
+                raise DeltaError("Delta does not match its base")
+            parts.append(base[offset:offset + length])
+        elif op == b"I":
+            (length,) = _INSERT.unpack_from(raw, position)
+            position += _INSERT.size
+            parts.append(raw[position:position + length])
+            position += length
+        else:
+            raise DeltaError("Unknown delta instruction")
+
+    target = b"".join(parts)
+    if len(target) != target_length:
+        raise DeltaError("Delta produced the wrong length")
+    return target
@@ -0,0 +1,219 @@
+"""Server-push fan-out.
+
+Routes and CRUD writes publish small JSON messages to named channels (e.g.
+"user:<id>", "project:<id>"). Each worker runs one EventHub that keeps the
+channel subscriptions of its own connected clients and fans messages out to
+their queues. The hub never talks
+to other workers itself: every publish goes through a Broker, which delivers it
+to the hub of every worker.
+
+- LocalBroker delivers straight back to this process. It is enough for a
+  single worker and for tests.
+- PostgresBroker uses LISTEN/NOTIFY on one Postgres channel, so every worker
+  sees every publish. LISTEN needs a session-level connection, so it connects
+  to DIRECT_URL rather than the transaction-mode pooler.
+
+Delivery is best effort. Consumers that need every message resume from the
+database after reconnecting (see the notification stream).
+"""
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Optional, Set
+
+from db import DIRECT_URL
+
+logger = logging.getLogger(__name__)
+
+# "local" (single worker) or "postgres" (LISTEN/NOTIFY across workers)
+EVENTS_BROKER = os.getenv("EVENTS_BROKER", "local")
+EVENTS_DATABASE_URL = os.getenv("EVENTS_DATABASE_URL", DIRECT_URL)
+EVENTS_PG_CHANNEL = os.getenv("EVENTS_PG_CHANNEL", "app_events")
+# Messages buffered per subscriber before it is considered too slow and dropped
+EVENTS_QUEUE_SIZE = int(os.getenv("EVENTS_QUEUE_SIZE", "256"))
+
+# NOTIFY payloads must stay below 8000 bytes
+PG_NOTIFY_MAX_BYTES = 7900
+
+Deliver = Callable[[str, Dict[str, Any]], None]
+
+
+class LocalBroker:
+    """Delivers publishes to this process only"""
+
+    def __init__(self):
+        self._deliver: Optional[Deliver] = None
+
+    async def start(self, deliver: Deliver) -> None:
+        self._deliver = deliver
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        self._deliver(channel, message)
+
+    async def stop(self) -> None:
+        self._deliver = None
+
+
+class PostgresBroker:
+    """Delivers publishes to every worker listening on the same Postgres channel"""
+
+    def __init__(self, dsn: str, pg_channel: str):
+        # asyncpg takes plain postgresql:// DSNs, not SQLAlchemy driver URLs
+        self.dsn = dsn.replace("postgresql+asyncpg://", "postgresql://")
+        self.pg_channel = pg_channel
+        self._conn = None
+        self._lock = asyncio.Lock()
+
+    async def start(self, deliver: Deliver) -> None:
+        import asyncpg
+
+        def on_notify(connection, pid, pg_channel, payload):
+            try:
+                envelope = json.loads(payload)
+            except ValueError:
+                logger.warning("Ignoring malformed event payload")
+                return
+            deliver(envelope["channel"], envelope["message"])
+
+        self._conn = await asyncpg.connect(self.dsn, statement_cache_size=0)
+        await self._conn.add_listener(self.pg_channel, on_notify)
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        payload = json.dumps({"channel": channel, "message": message}, default=str)
+        if len(payload.encode()) > PG_NOTIFY_MAX_BYTES:
+            # Receivers fetch the full row themselves when the body does not fit
+            payload = json.dumps({"channel": channel, "message": {**_slim(message), "truncated": True}}, default=str)
+        # One connection both listens and notifies; asyncpg runs one query at a time
+        async with self._lock:
+            await self._conn.execute("SELECT pg_notify($1, $2)", self.pg_channel, payload)
+
+    async def stop(self) -> None:
+        if self._conn is not None:
+            await self._conn.close()
+            self._conn = None
+
+
+def _slim(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop nested objects, keeping the ids and counters a receiver needs to refetch"""
+    return {key: value for key, value in message.items() if not isinstance(value, (dict, list))}
+
+
+class Subscription:
+    """A bounded queue fed by one or more channels"""
+
+    def __init__(self, maxsize: int = EVENTS_QUEUE_SIZE):
+        self.channels: Set[str] = set()
+        self.queue: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next message, or None once the subscriber fell too far behind and must resync"""
+        return await self.queue.get()
+
+    def _offer(self, message: Dict[str, Any]) -> None:
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(message)
+        except asyncio.QueueFull:
+            # Make room for the end-of-stream marker; the client resumes from storage
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait(None)
+
+
+class EventHub:
+    """Per-process fan-out from broker messages to subscriber queues"""
+
+    def __init__(self, broker, queue_size: int = EVENTS_QUEUE_SIZE):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+        self._started = False
+        self._start_lock = asyncio.Lock()
+        self.published = 0
+        self.delivered = 0
+        self.dropped_subscribers = 0
+
+    async def start(self) -> None:
+        async with self._start_lock:
+            if not self._started:
+                await self.broker.start(self._deliver)
+                self._started = True
+
+    async def stop(self) -> None:
+        if self._started:
+            await self.broker.stop()
+            self._started = False
+
+    async def publish(self, channel: str, message: Dict[str, Any]) -> None:
+        await self.start()
+        self.published += 1
+        await self.broker.publish(channel, message)
+
+    async def subscribe(self, channel: str, subscription: Optional[Subscription] = None) -> Subscription:
+        """Subscribe to channel, adding it to an existing subscription if one is given"""
+        await self.start()
+        if subscription is None:
+            subscription = Subscription(self.queue_size)
+        subscription.channels.add(channel)
+        self._subscriptions.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription, channel: Optional[str] = None) -> None:
+        """Remove the subscription from one channel, or from all of them"""
+        for name in [channel] if channel is not None else list(subscription.channels):
+            subscription.channels.discard(name)
+            subscribers = self._subscriptions.get(name)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[name]
+
+    def subscriber_count(self, channel: Optional[str] = None) -> int:
+        if channel is not None:
+            return len(self._subscriptions.get(channel, ()))
+        return len(set().union(*self._subscriptions.values()))
+
+    def _deliver(self, channel: str, message: Dict[str, Any]) -> None:
+        for subscription in list(self._subscriptions.get(channel, ())):
+            subscription._offer(message)
+            if subscription.overflowed:
+                self.dropped_subscribers += 1
+                self.unsubscribe(subscription)
+            else:
+                self.delivered += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "broker": type(self.broker).__name__,
+            "channels": len(self._subscriptions),
+            "subscribers": self.subscriber_count(),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_subscribers": self.dropped_subscribers,
+        }
+
+
+def _broker():
+    if EVENTS_BROKER == "postgres":
+        return PostgresBroker(EVENTS_DATABASE_URL, EVENTS_PG_CHANNEL)
+    return LocalBroker()
+
+
+hub = EventHub(_broker())
+
+
+def user_channel(user_id) -> str:
+    return f"user:{user_id}"
+
+
+def project_channel(project_id) -> str:
+    return f"project:{project_id}"
+
+
+async def publish_project_event(project_id, event: str, **data: Any) -> None:
+    """Announce a committed change to everyone watching the project"""
+    await hub.publish(project_channel(project_id), {"type": event, "project_id": str(project_id), **data})
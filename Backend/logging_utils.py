@@ -1 +1,156 @@
- 
\ No newline at end of file
+"""Slow query log.
+
+Every statement slower than SLOW_QUERY_THRESHOLD_MS is recorded with its SQL, the
+shape of its bound parameters (types only, never values), and the method and route
+of the request that issued it. Records go to a ring buffer of the last
+SLOW_QUERY_LOG_SIZE statements, served at /health/slow-queries, and to the log as
+one JSON object per line.
+
+A sample of slow SELECTs (SLOW_QUERY_EXPLAIN_SAMPLE_RATE) is re-run under
+EXPLAIN (ANALYZE, BUFFERS) on Postgres, or EXPLAIN QUERY PLAN on SQLite, in a
+background task on a separate connection that is rolled back afterwards. The plan
+is attached to the record once it arrives. Statements that write, including
+SELECT ... FOR UPDATE, are never explained, since ANALYZE executes them.
+"""
+import os
+import re
+import json
+import random
+import asyncio
+import logging
+from collections import deque
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from metrics import current_request, on_query, route_label
+
+logger = logging.getLogger("slow_query")
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv("SLOW_QUERY_THRESHOLD_MS", "200"))
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_SAMPLE_RATE", "0"))
+# EXPLAINs allowed in flight at once; slow queries beyond that are recorded without a plan
+SLOW_QUERY_EXPLAIN_CONCURRENCY = int(os.getenv("SLOW_QUERY_EXPLAIN_CONCURRENCY", "2"))
+# Longer statements (large IN lists) are cut short in records
+SLOW_QUERY_MAX_STATEMENT_LENGTH = 4000
+
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE)\b", re.IGNORECASE)
+_EXPLAIN_PREFIX = {
+    "postgresql": "EXPLAIN (ANALYZE, BUFFERS) ",
+    "sqlite": "EXPLAIN QUERY PLAN ",
+}
+
+# Set while an EXPLAIN runs, so its own statement is not recorded
+_explaining: ContextVar[bool] = ContextVar("explaining", default=False)
+
+
+def _shape(parameters: Any) -> Any:
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    return [type(value).__name__ for value in parameters]
+
+
+def parameter_shape(parameters: Any, executemany: bool = False) -> Any:
+    """Parameter types without their values; for executemany, the row count and first row's types"""
+    if executemany:
+        return {"rows": len(parameters), "row": _shape(parameters[0]) if parameters else None}
+    return _shape(parameters)
+
+
+class SlowQueryLog:
+    def __init__(
+        self,
+        threshold_ms: float = SLOW_QUERY_THRESHOLD_MS,
+        size: int = SLOW_QUERY_LOG_SIZE,
+        explain_sample_rate: float = SLOW_QUERY_EXPLAIN_SAMPLE_RATE,
+        explain_concurrency: int = SLOW_QUERY_EXPLAIN_CONCURRENCY
+    ):
+        self.threshold_ms = threshold_ms
+        self.explain_sample_rate = explain_sample_rate
+        self.explain_concurrency = explain_concurrency
+        self.records: deque = deque(maxlen=size)
+        self.recorded = 0
+        self.explained = 0
+        self._pending: Set[asyncio.Task] = set()
+
+    def record(self, conn, statement: str, parameters: Any, executemany: bool, duration_ms: float) -> None:
+        stats = current_request()
+        scope = stats.scope if stats is not None else None
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "duration_ms": round(duration_ms, 3),
+            "statement": statement[:SLOW_QUERY_MAX_STATEMENT_LENGTH],
+            "parameters": parameter_shape(parameters, executemany),
+            "method": scope["method"] if scope else None,
+            "route": route_label(scope) if scope else None,
+            "explain": None,
+        }
+        self.records.append(entry)
+        self.recorded += 1
+        logger.warning(json.dumps({"event": "slow_query", **entry}))
+        if not executemany and self._should_explain(conn, statement):
+            self._schedule_explain(conn, entry, statement, parameters)
+
+    def _should_explain(self, conn, statement: str) -> bool:
+        return (
+            conn.dialect.name in _EXPLAIN_PREFIX
+            and len(self._pending) < self.explain_concurrency
+            and _READ_ONLY.match(statement) is not None
+            and _WRITES.search(statement) is None
+            and random.random() < self.explain_sample_rate
+        )
+
+    def _schedule_explain(self, conn, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # Synchronous use (scripts, migrations) has no loop to run the EXPLAIN on
+            return
+        parameters = dict(parameters) if isinstance(parameters, dict) else tuple(parameters or ())
+        task = loop.create_task(self._explain(AsyncEngine(conn.engine), entry, statement, parameters))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _explain(self, engine: AsyncEngine, entry: Dict[str, Any], statement: str, parameters: Any) -> None:
+        _explaining.set(True)
+        try:
+            async with engine.connect() as conn:
+                result = await conn.exec_driver_sql(_EXPLAIN_PREFIX[engine.dialect.name] + statement, parameters)
+                plan = "\n".join(" ".join(str(column) for column in row) for row in result)
+                await conn.rollback()
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        entry["explain"] = plan
+        self.explained += 1
+        logger.warning(json.dumps({"event": "slow_query_plan", "at": entry["at"], "route": entry["route"], "plan": plan}))
+
+    async def drain(self) -> None:
+        """Wait for EXPLAINs in flight"""
+        while self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    def stats(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        records: List[Dict[str, Any]] = list(reversed(self.records))
+        return {
+            "threshold_ms": self.threshold_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "recorded": self.recorded,
+            "explained": self.explained,
+            "queries": records[:limit] if limit is not None else records,
+        }
+
+
+slow_query_log = SlowQueryLog()
+
+
+@on_query
+def _check_slow_query(conn, statement, parameters, executemany, seconds):
+    duration_ms = seconds * 1000
+    if duration_ms >= slow_query_log.threshold_ms and not _explaining.get():
+        slow_query_log.record(conn, statement, parameters, executemany, duration_ms)
@@ -1,15 +1,26 @@
-from fastapi import FastAPI, Request
+from fastapi import FastAPI, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 import time
+import asyncio
 import logging
 import traceback
-from db import engine, Base
+from db import engine, Base, get_pool_stats, AsyncSessionLocal
+from crud import InvalidCursorError, InvalidMoveError, MissingBlobError, VersionConflictError
+from cache import get_cache_stats
+from events import hub
+from connections import manager
+from presence import presence
+from metrics import MetricsMiddleware, registry as metrics_registry
+from query_guard import QueryGuardMiddleware
+from logging_utils import slow_query_log
+from retention import compactor, VERSION_RETENTION_ENABLED
+from storage import BLOB_GC_INTERVAL
 from sqlalchemy import text
 
 # Import routers
-from routers import users, projects, roles, project_members, project_invitations, directories, file_types, files, file_versions, notifications
+from routers import users, projects, roles, project_members, project_invitations, directories, file_types, files, file_versions, notifications, websocket_connections, blobs
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -32,13 +43,28 @@ async def lifespan(app: FastAPI):
             
             # Commit the transaction
             await conn.commit()
+        await hub.start()
     except Exception as e:
         logger.error(f"Error during startup: {str(e)}")
         logger.error(traceback.format_exc())
         raise
+    presence_task = asyncio.create_task(presence.run(AsyncSessionLocal, manager.close_stale))
+    compaction_task = asyncio.create_task(compactor.run(AsyncSessionLocal)) if VERSION_RETENTION_ENABLED else None
+    gc_task = asyncio.create_task(compactor.run_garbage_collection(AsyncSessionLocal)) if BLOB_GC_INTERVAL > 0 else None
     yield
     # Shutdown
     logger.info("Shutting down...")
+    tasks = [task for task in (presence_task, compaction_task, gc_task) if task]
+    for task in tasks:
+        task.cancel()
+    # Let them unwind before the final flush and before the engine goes away
+    await asyncio.gather(*tasks, return_exceptions=True)
+    try:
+        async with AsyncSessionLocal() as db:
+            await presence.flush(db)
+    except Exception as e:
+        logger.error(f"Final presence flush failed: {str(e)}")
+    await hub.stop()
     await engine.dispose()
 
 # Create FastAPI app
@@ -58,14 +84,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Request timing middleware
-@app.middleware("http")
-async def add_process_time_header(request: Request, call_next):
-    start_time = time.time()
-    response = await call_next(request)
-    process_time = time.time() - start_time
-    response.headers["X-Process-Time"] = str(process_time)
-    return response
+# Per-route latency, response size and database query metrics, served at /metrics
+app.add_middleware(MetricsMiddleware)
+# Repeated statements and routes over their @query_budget, per QUERY_GUARD_MODE
+app.add_middleware(QueryGuardMiddleware)
+
+# Malformed pagination cursors are a client error, not a server failure
+@app.exception_handler(InvalidCursorError)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursorError):
+    return JSONResponse(
+        status_code=400,
+        content={"detail": str(exc)}
+    )
+
+@app.exception_handler(InvalidMoveError)
+async def invalid_move_handler(request: Request, exc: InvalidMoveError):
+    return JSONResponse(
+        status_code=400,
+        content={"detail": str(exc)}
+    )
+
+@app.exception_handler(MissingBlobError)
+async def missing_blob_handler(request: Request, exc: MissingBlobError):
+    return JSONResponse(
+        status_code=404,
+        content={"detail": str(exc)}
+    )
+
+@app.exception_handler(VersionConflictError)
+async def version_conflict_handler(request: Request, exc: VersionConflictError):
+    return JSONResponse(
+        status_code=409,
+        content={"detail": str(exc)}
+    )
 
 # Global exception handler
 @app.exception_handler(Exception)
@@ -84,11 +135,46 @@ async def global_exception_handler(request: Request, exc: Exception):
         }
     )
 
+# Prometheus metrics for this worker
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type="text/plain; version=0.0.4")
+
 # Health check endpoint
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": time.time()}
 
+# Connection pool checkout/wait metrics
+@app.get("/health/db-pool")
+async def db_pool_stats():
+    return get_pool_stats()
+
+# Reference table cache hit/miss counters
+@app.get("/health/cache")
+async def cache_stats():
+    return get_cache_stats()
+
+# Server-push subscribers and fan-out counters for this worker
+@app.get("/health/events")
+async def event_stats():
+    return hub.stats()
+
+# Open project WebSocket connections on this worker
+@app.get("/health/websockets")
+async def websocket_stats():
+    return {**manager.stats(), "presence": presence.stats()}
+
+# Versions pruned and blob bytes reclaimed by the retention job
+@app.get("/health/retention")
+async def retention_stats():
+    return compactor.stats()
+
+# Most recent statements over SLOW_QUERY_THRESHOLD_MS, newest first, with sampled plans
+@app.get("/health/slow-queries")
+async def slow_query_stats(limit: int = Query(50, ge=1, le=1000)):
+    return slow_query_log.stats(limit)
+
 
 # Include routers
 app.include_router(users.router, prefix="/api/v1")
@@ -100,7 +186,9 @@ app.include_router(directories.router, prefix="/api/v1")
 app.include_router(file_types.router, prefix="/api/v1")
 app.include_router(files.router, prefix="/api/v1")
 app.include_router(file_versions.router, prefix="/api/v1")
+app.include_router(blobs.router, prefix="/api/v1")
 app.include_router(notifications.router, prefix="/api/v1")
+app.include_router(websocket_connections.router, prefix="/api/v1")
 
 # Root endpoint
 @app.get("/")
@@ -0,0 +1,217 @@
+"""Request and database metrics, exposed in the Prometheus text format at /metrics.
+
+MetricsMiddleware times each HTTP request with a monotonic clock and records, per
+method and route template (so /api/v1/files/{file_id} is one series whatever ids it
+sees), the latency, the response size and the database queries the request made.
+Queries are counted through cursor events on every Engine, so the per-request count
+shows N+1 routes directly. The same numbers go out in a Server-Timing header.
+Statements are timed here only; other modules get each timing through on_query.
+
+Metrics live in this process only; each worker exposes its own and Prometheus sums them.
+"""
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+QUERY_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1) -> None:
+        self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for label_values, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> cumulative bucket counts, then sum and count
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *label_values: str) -> None:
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_values, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets + ("+Inf",), series[:len(self.buckets)] + [series[-1]]):
+                labels = _labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {series[-2]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+ROUTE_LABELS = ("method", "route")
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests handled", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "Time from request start to the end of the response body", ROUTE_LABELS
+))
+http_response_size = registry.register(Histogram(
+    "http_response_size_bytes", "Response body size", ROUTE_LABELS, SIZE_BUCKETS
+))
+db_queries_per_request = registry.register(Histogram(
+    "http_request_db_queries", "Database queries executed per request", ROUTE_LABELS, QUERY_COUNT_BUCKETS
+))
+db_time_per_request = registry.register(Histogram(
+    "http_request_db_seconds", "Time spent in database queries per request", ROUTE_LABELS
+))
+db_query_duration = registry.register(Histogram(
+    "db_query_duration_seconds", "Duration of individual database queries", (), QUERY_LATENCY_BUCKETS
+))
+
+
+class RequestStats:
+    """Database work done on behalf of the current request"""
+
+    __slots__ = ("scope", "queries", "query_seconds")
+
+    def __init__(self, scope: Optional[Scope] = None):
+        self.scope = scope
+        self.queries = 0
+        self.query_seconds = 0.0
+
+
+_current_request: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_request() -> Optional[RequestStats]:
+    return _current_request.get()
+
+
+QueryObserver = Callable[[Any, str, Any, bool, float], None]
+_query_observers: List[QueryObserver] = []
+
+
+def on_query(observer: QueryObserver) -> QueryObserver:
+    """Call observer(conn, statement, parameters, executemany, seconds) after every statement"""
+    _query_observers.append(observer)
+    return observer
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append((context, time.perf_counter()))
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _record_query(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()[1]
+    db_query_duration.observe(elapsed)
+    stats = _current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.query_seconds += elapsed
+    for observer in _query_observers:
+        observer(conn, statement, parameters, executemany, elapsed)
+
+
+@event.listens_for(Engine, "handle_error")
+def _drop_query_timer(context):
+    # A failed statement never reaches after_cursor_execute; errors raised after it have been popped already
+    stack = context.connection.info.get("query_start_time") if context.connection is not None else None
+    if stack and stack[-1][0] is context.execution_context:
+        stack.pop()
+
+
+def route_label(scope: Scope) -> str:
+    """The matched route's path template; unmatched paths share one label to bound cardinality"""
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current_request.set(stats)
+        start = time.perf_counter()
+        status_code = 500
+        size = 0
+
+        async def send_with_metrics(message: Message) -> None:
+            nonlocal status_code, size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f"app;dur={(time.perf_counter() - start) * 1000:.1f}, "
+                    f"db;dur={stats.query_seconds * 1000:.1f};desc=\"{stats.queries} queries\""
+                )
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            _current_request.reset(token)
+            labels = (scope["method"], route_label(scope))
+            http_requests.inc(*labels, str(status_code))
+            http_request_duration.observe(time.perf_counter() - start, *labels)
+            http_response_size.observe(size, *labels)
+            db_queries_per_request.observe(stats.queries, *labels)
+            db_time_per_request.observe(stats.query_seconds, *labels)
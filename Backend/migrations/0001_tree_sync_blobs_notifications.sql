@@ -0,0 +1,73 @@
+-- Schema changes for tree sync, content-addressed versions and notification streams.
+-- Postgres; safe to run more than once. Run before deploying the code that uses them.
+
+BEGIN;
+
+-- Incremental tree sync
+ALTER TABLE projects ADD COLUMN IF NOT EXISTS tree_revision BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE directories ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE files ADD COLUMN IF NOT EXISTS revision BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_directory_revision ON directories (project_id, revision);
+CREATE INDEX IF NOT EXISTS idx_file_revision ON files (project_id, revision);
+
+CREATE TABLE IF NOT EXISTS tree_tombstones (
+    entity_id UUID NOT NULL,
+    project_id UUID NOT NULL,
+    entity_type VARCHAR(20) NOT NULL,
+    revision BIGINT NOT NULL,
+    deleted_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (entity_id),
+    CONSTRAINT check_tombstone_entity_type CHECK (entity_type IN ('directory', 'file')),
+    FOREIGN KEY (project_id) REFERENCES projects (project_id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_tombstone_revision ON tree_tombstones (project_id, revision);
+
+-- Content-addressed blobs and delta-encoded versions
+CREATE TABLE IF NOT EXISTS blobs (
+    digest VARCHAR(64) NOT NULL,
+    size_in_bytes BIGINT NOT NULL,
+    ref_count INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    released_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (digest),
+    CONSTRAINT check_blob_ref_count CHECK (ref_count >= 0)
+);
+CREATE INDEX IF NOT EXISTS idx_blob_unreferenced ON blobs (ref_count, released_at);
+
+ALTER TABLE files ADD COLUMN IF NOT EXISTS content_digest VARCHAR(64);
+ALTER TABLE files ADD COLUMN IF NOT EXISTS last_version_number INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE file_versions ADD COLUMN IF NOT EXISTS content_digest VARCHAR(64);
+ALTER TABLE file_versions ADD COLUMN IF NOT EXISTS storage_digest VARCHAR(64) REFERENCES blobs (digest);
+ALTER TABLE file_versions ADD COLUMN IF NOT EXISTS chain_length INTEGER NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_file_version_storage ON file_versions (storage_digest);
+CREATE INDEX IF NOT EXISTS idx_file_version_parent ON file_versions (parent_version_id);
+
+-- Server-numbered appends continue after the highest existing version
+UPDATE files SET last_version_number = latest.version_number
+FROM (SELECT file_id, MAX(version_number) AS version_number FROM file_versions GROUP BY file_id) AS latest
+WHERE files.file_id = latest.file_id AND files.last_version_number < latest.version_number;
+
+-- Read state, unread counters and per-user sequence numbers for notifications
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS is_read BOOLEAN NOT NULL DEFAULT false;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS read_at TIMESTAMP WITH TIME ZONE;
+ALTER TABLE notifications ADD COLUMN IF NOT EXISTS seq BIGINT;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS unread_notifications INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE users ADD COLUMN IF NOT EXISTS notification_seq BIGINT NOT NULL DEFAULT 0;
+CREATE INDEX IF NOT EXISTS idx_notification_user_read ON notifications (user_id, is_read);
+CREATE INDEX IF NOT EXISTS idx_notification_user_seq ON notifications (user_id, seq);
+
+UPDATE notifications SET seq = numbered.seq
+FROM (
+    SELECT notification_id,
+           ROW_NUMBER() OVER (PARTITION BY user_id ORDER BY created_at, notification_id) AS seq
+    FROM notifications
+) AS numbered
+WHERE notifications.notification_id = numbered.notification_id AND notifications.seq IS NULL;
+
+UPDATE users SET
+    notification_seq = COALESCE((SELECT MAX(seq) FROM notifications WHERE notifications.user_id = users.user_id), 0),
+    unread_notifications = (
+        SELECT COUNT(*) FROM notifications WHERE notifications.user_id = users.user_id AND NOT notifications.is_read
+    );
+
+COMMIT;
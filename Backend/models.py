@@ -1,8 +1,8 @@
 import uuid
 from datetime import datetime
 from sqlalchemy import (
-    Column, String, Text, Integer, Boolean, DateTime, ForeignKey,
-    func, UniqueConstraint, Index, CheckConstraint
+    Column, String, Text, Integer, BigInteger, Boolean, DateTime, ForeignKey,
+    func, false, UniqueConstraint, Index, CheckConstraint
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -21,6 +21,10 @@ class User(Base):
     status = Column(String(20), default="active")
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     last_login_at = Column(DateTime(timezone=True))
+    # Kept in step with notifications.is_read by every notification write, for badge lookups
+    unread_notifications = Column(Integer, nullable=False, default=0, server_default="0")
+    # Last sequence number handed to this user's notifications; streams resume from it
+    notification_seq = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     # Relationships
     owned_projects = relationship("Project", back_populates="owner", cascade="all, delete-orphan")
@@ -49,6 +53,8 @@ class Project(Base):
     is_active = Column(Boolean, default=True)
     # FIXED: Use lambda for JSONB default to avoid serialization issues
     project_settings = Column(JSONVariant, default=lambda: {})
+    # Bumped by every directory/file write so clients can sync the tree incrementally
+    tree_revision = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     # Relationships
     owner = relationship("User", back_populates="owned_projects")
@@ -147,6 +153,7 @@ class Directory(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     modified_at = Column(DateTime(timezone=True), onupdate=func.now())
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")
 
     # Relationships
     project = relationship("Project", back_populates="directories")
@@ -158,6 +165,7 @@ class Directory(Base):
         Index("idx_directory_project", "project_id"),
         Index("idx_directory_parent", "parent_directory_id"),
         Index("idx_directory_path", "materialized_path"),
+        Index("idx_directory_revision", "project_id", "revision"),
     )
 
 # File Types Model
@@ -196,6 +204,12 @@ class File(Base):
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
     last_modified_by = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
     storage_link = Column(Text)
+    revision = Column(BigInteger, nullable=False, default=0, server_default="0")
+    # Highest version_number handed out; appending a version increments it.
+    # migrations/0001_tree_sync_blobs_notifications.sql sets it for files that already had versions
+    last_version_number = Column(Integer, nullable=False, default=0, server_default="0")
+    # SHA-256 of the latest version's content
+    content_digest = Column(String(64))
 
     # Relationships
     project = relationship("Project", back_populates="files")
@@ -209,6 +223,38 @@ class File(Base):
         UniqueConstraint("directory_id", "file_name", name="uq_file_name_in_directory"),
         Index("idx_file_project", "project_id"),
         Index("idx_file_directory", "directory_id"),
+        Index("idx_file_revision", "project_id", "revision"),
+    )
+
+# Tree Tombstones Model
+class TreeTombstone(Base):
+    __tablename__ = "tree_tombstones"
+
+    entity_id = Column(UUID(as_uuid=True), primary_key=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.project_id", ondelete="CASCADE"), nullable=False)
+    entity_type = Column(String(20), nullable=False)
+    revision = Column(BigInteger, nullable=False)
+    deleted_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        CheckConstraint("entity_type IN ('directory', 'file')", name="check_tombstone_entity_type"),
+        Index("idx_tombstone_revision", "project_id", "revision"),
+    )
+
+# Content-addressed blobs referenced by file versions
+class Blob(Base):
+    __tablename__ = "blobs"
+
+    digest = Column(String(64), primary_key=True)  # SHA-256, lowercase hex
+    size_in_bytes = Column(BigInteger, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # When ref_count last dropped to zero (or the upload time if never referenced)
+    released_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        CheckConstraint("ref_count >= 0", name="check_blob_ref_count"),
+        Index("idx_blob_unreferenced", "ref_count", "released_at"),
     )
 
 # File Versions Model
@@ -223,6 +269,12 @@ class FileVersion(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     created_by = Column(UUID(as_uuid=True), ForeignKey("users.user_id"), nullable=False)
     parent_version_id = Column(UUID(as_uuid=True), ForeignKey("file_versions.version_id"))
+    # SHA-256 of the full content
+    content_digest = Column(String(64))
+    # The blob actually stored: the full content, or a delta against parent_version_id
+    storage_digest = Column(String(64), ForeignKey("blobs.digest"))
+    # Deltas to apply on top of the nearest keyframe; 0 for a keyframe
+    chain_length = Column(Integer, nullable=False, default=0)
 
     # Relationships
     file = relationship("File", back_populates="versions")
@@ -232,6 +284,8 @@ class FileVersion(Base):
     __table_args__ = (
         UniqueConstraint("file_id", "version_number", name="uq_version_per_file"),
         Index("idx_file_version", "file_id", "version_number"),
+        Index("idx_file_version_storage", "storage_digest"),
+        Index("idx_file_version_parent", "parent_version_id"),
     )
 
 # Execution Environments Model
@@ -290,6 +344,9 @@ class Notification(Base):
     notification_type = Column(String(50), nullable=False)
     title = Column(String(255), nullable=False)
     message = Column(Text)
+    is_read = Column(Boolean, nullable=False, default=False, server_default=false())
+    read_at = Column(DateTime(timezone=True))
+    seq = Column(BigInteger)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
     # Relationships
@@ -299,6 +356,8 @@ class Notification(Base):
     __table_args__ = (
         CheckConstraint("notification_type IN ('invitation', 'file_change', 'member_added', 'deployment', 'mention')", 
                        name="check_notification_type"),
+        Index("idx_notification_user_read", "user_id", "is_read"),
+        Index("idx_notification_user_seq", "user_id", "seq"),
     )
 
 # WebSocket Connections Model
@@ -0,0 +1,150 @@
+"""Who is connected, kept in memory.
+
+Heartbeats only touch the registry. Every PRESENCE_FLUSH_INTERVAL seconds the
+background task writes last_ping/is_active for the connections that changed
+since the previous flush in one executemany UPDATE, so a client pinging every
+few seconds costs one row write per interval rather than one commit per ping.
+
+Connections silent for longer than PRESENCE_TIMEOUT are reaped: dropped from
+the registry, marked inactive and closed. The same flush also deactivates rows
+whose last_ping went stale on any worker, which cleans up after a worker that
+died without closing its sockets.
+
+"Who is online" is answered from this worker's registry, so with several
+workers it covers the sockets connected to the worker that answers.
+"""
+import os
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+from uuid import UUID
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+
+logger = logging.getLogger(__name__)
+
+PRESENCE_FLUSH_INTERVAL = float(os.getenv("PRESENCE_FLUSH_INTERVAL", "10"))
+# Seconds without a heartbeat before a connection counts as gone
+PRESENCE_TIMEOUT = float(os.getenv("PRESENCE_TIMEOUT", "60"))
+
+
+class PresenceEntry:
+    def __init__(self, connection_id: UUID, user_id: UUID):
+        self.connection_id = connection_id
+        self.user_id = user_id
+        self.projects: Set[UUID] = set()
+        self.last_seen = time.monotonic()
+        self.last_ping = datetime.now(timezone.utc)
+
+
+class PresenceRegistry:
+    def __init__(self, timeout: float = PRESENCE_TIMEOUT):
+        self.timeout = timeout
+        self._entries: Dict[UUID, PresenceEntry] = {}
+        # connection_id -> row values waiting for the next flush; later writes replace earlier ones
+        self._pending: Dict[UUID, Dict] = {}
+        self.heartbeats = 0
+        self.flushed_rows = 0
+        self.reaped = 0
+
+    def register(self, connection_id: UUID, user_id: UUID) -> None:
+        entry = PresenceEntry(connection_id, user_id)
+        self._entries[connection_id] = entry
+        self._mark(entry, is_active=True)
+
+    def unregister(self, connection_id: UUID) -> None:
+        entry = self._entries.pop(connection_id, None)
+        if entry is not None:
+            self._mark(entry, is_active=False)
+
+    def heartbeat(self, connection_id: UUID) -> None:
+        entry = self._entries.get(connection_id)
+        if entry is None:
+            return
+        self.heartbeats += 1
+        entry.last_seen = time.monotonic()
+        entry.last_ping = datetime.now(timezone.utc)
+        self._mark(entry, is_active=True)
+
+    def join(self, connection_id: UUID, project_id: UUID) -> None:
+        entry = self._entries.get(connection_id)
+        if entry is not None:
+            entry.projects.add(project_id)
+
+    def leave(self, connection_id: UUID, project_id: UUID) -> None:
+        entry = self._entries.get(connection_id)
+        if entry is not None:
+            entry.projects.discard(project_id)
+
+    def online_users(self, project_id: UUID) -> List[UUID]:
+        return sorted({entry.user_id for entry in self._entries.values() if project_id in entry.projects}, key=str)
+
+    def is_online(self, user_id: UUID) -> bool:
+        return any(entry.user_id == user_id for entry in self._entries.values())
+
+    def _mark(self, entry: PresenceEntry, is_active: bool) -> None:
+        self._pending[entry.connection_id] = {
+            "connection_id": entry.connection_id,
+            "last_ping": entry.last_ping,
+            "is_active": is_active,
+        }
+
+    def reap(self, now: Optional[float] = None) -> List[UUID]:
+        """Unregister connections silent for longer than the timeout and return their ids"""
+        deadline = (time.monotonic() if now is None else now) - self.timeout
+        stale = [connection_id for connection_id, entry in self._entries.items() if entry.last_seen < deadline]
+        for connection_id in stale:
+            self.unregister(connection_id)
+        self.reaped += len(stale)
+        return stale
+
+    async def flush(self, db: AsyncSession) -> int:
+        """Write pending presence changes and deactivate rows gone stale on any worker"""
+        rows, self._pending = list(self._pending.values()), {}
+        try:
+            await crud.crud_websocket_connection.record_presence(
+                db, rows=rows, stale_before=datetime.now(timezone.utc) - timedelta(seconds=self.timeout)
+            )
+        except Exception:
+            # Keep the changes for the next attempt unless newer ones replaced them
+            for row in rows:
+                self._pending.setdefault(row["connection_id"], row)
+            raise
+        self.flushed_rows += len(rows)
+        return len(rows)
+
+    async def run(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        on_stale: Callable[[UUID], Awaitable[None]],
+        interval: float = PRESENCE_FLUSH_INTERVAL
+    ) -> None:
+        """Reap and flush every interval until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                for connection_id in self.reap():
+                    await on_stale(connection_id)
+                async with session_factory() as db:
+                    await self.flush(db)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Presence flush failed")
+
+    def stats(self) -> Dict:
+        return {
+            "connections": len(self._entries),
+            "users": len({entry.user_id for entry in self._entries.values()}),
+            "pending_rows": len(self._pending),
+            "heartbeats": self.heartbeats,
+            "flushed_rows": self.flushed_rows,
+            "reaped": self.reaped,
+        }
+
+
+presence = PresenceRegistry()
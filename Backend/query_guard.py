@@ -0,0 +1,149 @@
+"""N+1 detection and per-request query budgets, for development and tests.
+
+Statements are grouped by their normalized SQL (literals and bind-parameter lists
+collapsed), so the same lookup issued for every item of a list shows up as one
+statement repeated many times. A request is flagged when one statement repeats more
+than QUERY_REPEAT_LIMIT times, or when its route runs more statements than declared
+with @query_budget. QUERY_GUARD_MODE decides what happens:
+
+- "off" (default): nothing is tracked
+- "warn": flagged requests are logged with their most repeated statements
+- "raise": the statement that goes over fails with QueryBudgetExceeded, so the
+  request returns 500 and the test that made it fails
+
+Tests can also bound a block of code directly with expect_queries.
+"""
+import os
+import re
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, Optional, Tuple
+
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from metrics import on_query, route_label
+
+logger = logging.getLogger(__name__)
+
+QUERY_GUARD_MODE = os.getenv("QUERY_GUARD_MODE", "off")
+# Times one normalized statement may run per request before it counts as N+1
+QUERY_REPEAT_LIMIT = int(os.getenv("QUERY_REPEAT_LIMIT", "10"))
+
+_PLACEHOLDER = r"(?:\?|\$\d+|%\(\w+\)s|:\w+|__\[POSTCOMPILE_\w+\])"
+_IN_LIST = re.compile(rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})*\s*\)")
+_LITERAL = re.compile(r"'(?:[^']|'')*'|(?<![\w$])\d+(?:\.\d+)?\b")
+_SPACE = re.compile(r"\s+")
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised when a request or block runs more statements than it is allowed"""
+
+
+def normalize(statement: str) -> str:
+    statement = _LITERAL.sub("?", statement)
+    statement = _IN_LIST.sub("(...)", statement)
+    return _SPACE.sub(" ", statement).strip()
+
+
+def query_budget(max_queries: int) -> Callable:
+    """Declare the most statements a route may run per request; apply below the route decorator"""
+    def decorate(endpoint: Callable) -> Callable:
+        endpoint.query_budget = max_queries
+        return endpoint
+    return decorate
+
+
+class QueryLog:
+    """Statements run within one request or expect_queries block"""
+
+    def __init__(
+        self,
+        label: str,
+        max_queries: Optional[int] = None,
+        max_repeats: Optional[int] = QUERY_REPEAT_LIMIT,
+        raise_on_violation: bool = False,
+        scope: Optional[Scope] = None
+    ):
+        self.label = label
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.raise_on_violation = raise_on_violation
+        self.scope = scope
+        self.statements: Counter = Counter()
+        self.total = 0
+        self.violations = []
+
+    @property
+    def budget(self) -> Optional[int]:
+        # A request's route is only known once it has been matched
+        if self.max_queries is None and self.scope is not None:
+            return getattr(self.scope.get("endpoint"), "query_budget", None)
+        return self.max_queries
+
+    def record(self, statement: str) -> None:
+        normalized = normalize(statement)
+        self.statements[normalized] += 1
+        self.total += 1
+        budget = self.budget
+        if budget is not None and self.total == budget + 1:
+            self._violation(f"{self.label} ran more than its budget of {budget} queries")
+        if self.max_repeats is not None and self.statements[normalized] == self.max_repeats + 1:
+            self._violation(f"{self.label} repeated a statement more than {self.max_repeats} times: {normalized}")
+
+    def _violation(self, message: str) -> None:
+        self.violations.append(message)
+        if self.raise_on_violation:
+            raise QueryBudgetExceeded(f"{message}\n{self.report()}")
+
+    def report(self, top: int = 5) -> str:
+        lines = [f"{self.total} queries"]
+        lines += [f"{count:>5} x {statement}" for statement, count in self.statements.most_common(top)]
+        return "\n".join(lines)
+
+
+_active_logs: ContextVar[Tuple[QueryLog, ...]] = ContextVar("query_logs", default=())
+
+
+@contextmanager
+def _activate(log: QueryLog) -> Iterator[QueryLog]:
+    token = _active_logs.set(_active_logs.get() + (log,))
+    try:
+        yield log
+    finally:
+        _active_logs.reset(token)
+
+
+@on_query
+def _record_statement(conn, statement, parameters, executemany, seconds):
+    for log in _active_logs.get():
+        log.record(statement)
+
+
+@contextmanager
+def expect_queries(max_queries: Optional[int] = None, max_repeats: Optional[int] = QUERY_REPEAT_LIMIT) -> Iterator[QueryLog]:
+    """Fail with QueryBudgetExceeded if the block runs more statements than allowed"""
+    with _activate(QueryLog("block", max_queries, max_repeats)) as log:
+        yield log
+    if log.violations:
+        raise QueryBudgetExceeded(f"{log.violations[0]}\n{log.report()}")
+
+
+class QueryGuardMiddleware:
+    def __init__(self, app: ASGIApp, mode: str = QUERY_GUARD_MODE):
+        self.app = app
+        self.mode = mode
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or self.mode == "off":
+            await self.app(scope, receive, send)
+            return
+        log = QueryLog(f"{scope['method']} {scope['path']}", raise_on_violation=self.mode == "raise", scope=scope)
+        with _activate(log):
+            await self.app(scope, receive, send)
+        if log.violations:
+            logger.warning(
+                "Query budget violation on %s %s: %s\n%s",
+                scope["method"], route_label(scope), "; ".join(log.violations), log.report()
+            )
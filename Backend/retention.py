@@ -0,0 +1,236 @@
+"""Version retention and compaction.
+
+Every autosave adds a version, so old versions are thinned out in the background:
+
+- all versions younger than VERSION_RETENTION_KEEP_ALL_HOURS are kept;
+- up to VERSION_RETENTION_HOURLY_DAYS old, the newest version of each hour is kept;
+- beyond that, the newest version of each day is kept;
+- the newest version of a file is always kept.
+
+The compactor walks the files that have versions past the keep-all window, a batch
+of files at a time, and deletes the rest through CRUDFileVersion.remove_many. That
+re-parents surviving versions onto their nearest surviving ancestor and re-encodes
+deltas whose base went away, so chains stay intact. Only files with two old versions
+in the same period are visited, and only their old versions are loaded.
+
+Blobs left unreferenced, whether by compaction or by deleting versions and files, are
+garbage-collected once their grace period has passed. That runs every BLOB_GC_INTERVAL
+seconds on its own schedule, and after each compaction; the bytes reclaimed are logged
+and reported by stats().
+
+Compaction is off unless VERSION_RETENTION_ENABLED is set. On Postgres each run of
+either job first takes an advisory lock and is skipped if another worker holds it, so
+both can be enabled on every worker.
+"""
+import os
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Hashable, List, Optional, Sequence, Tuple
+from uuid import UUID
+
+from sqlalchemy import case, func, select
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+import storage
+
+logger = logging.getLogger(__name__)
+
+VERSION_RETENTION_ENABLED = os.getenv("VERSION_RETENTION_ENABLED", "false").lower() == "true"
+VERSION_RETENTION_INTERVAL = float(os.getenv("VERSION_RETENTION_INTERVAL", "3600"))
+VERSION_RETENTION_KEEP_ALL_HOURS = float(os.getenv("VERSION_RETENTION_KEEP_ALL_HOURS", "24"))
+VERSION_RETENTION_HOURLY_DAYS = float(os.getenv("VERSION_RETENTION_HOURLY_DAYS", "30"))
+# Files whose versions are pruned per transaction
+VERSION_RETENTION_BATCH_SIZE = int(os.getenv("VERSION_RETENTION_BATCH_SIZE", "200"))
+# Postgres advisory lock held for the length of a run
+VERSION_RETENTION_LOCK_KEY = int(os.getenv("VERSION_RETENTION_LOCK_KEY", "7264901"))
+
+
+class RetentionPolicy:
+    def __init__(
+        self,
+        keep_all: timedelta = timedelta(hours=VERSION_RETENTION_KEEP_ALL_HOURS),
+        hourly: timedelta = timedelta(days=VERSION_RETENTION_HOURLY_DAYS)
+    ):
+        self.keep_all = keep_all
+        self.hourly = hourly
+
+    def _bucket(self, created_at: datetime, now: datetime) -> Optional[Hashable]:
+        """The period a version competes in, or None if it is kept regardless"""
+        age = now - created_at
+        if age < self.keep_all:
+            return None
+        if age < self.hourly:
+            return ("hour", created_at.replace(minute=0, second=0, microsecond=0))
+        return ("day", created_at.date())
+
+    def bucket_expression(self, created_at: ColumnElement, dialect: str, now: datetime) -> ColumnElement:
+        """SQL for _bucket of versions past the keep-all window, in UTC"""
+        if dialect == "postgresql":
+            utc = func.timezone("UTC", created_at)
+            hour, day = func.date_trunc("hour", utc), func.date_trunc("day", utc)
+        else:
+            hour, day = func.strftime("%Y-%m-%d %H", created_at), func.date(created_at)
+        return case((created_at > now - self.hourly, hour), else_=day)
+
+    def prunable(self, versions: Sequence[Tuple[UUID, datetime]], now: datetime) -> List[UUID]:
+        """Versions of one file to delete, given (version_id, created_at) newest first"""
+        seen = set()
+        pruned = []
+        for index, (version_id, created_at) in enumerate(versions):
+            if created_at.tzinfo is None:
+                created_at = created_at.replace(tzinfo=timezone.utc)
+            bucket = self._bucket(created_at, now)
+            if index == 0 or bucket is None or bucket not in seen:
+                seen.add(bucket)
+                continue
+            pruned.append(version_id)
+        return pruned
+
+
+class VersionCompactor:
+    def __init__(
+        self,
+        policy: Optional[RetentionPolicy] = None,
+        batch_size: int = VERSION_RETENTION_BATCH_SIZE,
+        grace_seconds: int = storage.BLOB_GC_GRACE_SECONDS
+    ):
+        self.policy = policy or RetentionPolicy()
+        self.batch_size = batch_size
+        self.grace_seconds = grace_seconds
+        self.runs = 0
+        self.versions_pruned = 0
+        self.blobs_collected = 0
+        self.bytes_reclaimed = 0
+        self.last_run: Optional[Dict[str, Any]] = None
+
+    async def _prune_batch(self, db: AsyncSession, file_ids: List[UUID], now: datetime) -> int:
+        fv = models.FileVersion
+        # Newer versions are all kept, and the newest old one is first in its period
+        result = await db.execute(
+            select(fv.file_id, fv.version_id, fv.created_at)
+            .where(fv.file_id.in_(file_ids), fv.created_at < now - self.policy.keep_all)
+            .order_by(fv.file_id, fv.created_at.desc(), fv.version_number.desc())
+        )
+        versions_by_file: Dict[UUID, List[Tuple[UUID, datetime]]] = {}
+        for file_id, version_id, created_at in result:
+            versions_by_file.setdefault(file_id, []).append((version_id, created_at))
+        pruned = [
+            version_id
+            for versions in versions_by_file.values()
+            for version_id in self.policy.prunable(versions, now)
+        ]
+        if not pruned:
+            return 0
+        return len(await crud.crud_file_version.remove_many(db, ids=pruned))
+
+    async def compact(self, db: AsyncSession, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Prune versions outside the policy, then collect the blobs they released"""
+        now = now or datetime.now(timezone.utc)
+        fv = models.FileVersion
+        bucket = self.policy.bucket_expression(fv.created_at, db.get_bind().dialect.name, now)
+        pruned = 0
+        after = None
+        while True:
+            # Files with two old versions in the same period have one to prune
+            query = (
+                select(fv.file_id)
+                .where(fv.created_at < now - self.policy.keep_all)
+                .group_by(fv.file_id, bucket)
+                .having(func.count() > 1)
+                .distinct()
+                .order_by(fv.file_id)
+                .limit(self.batch_size)
+            )
+            if after is not None:
+                query = query.where(fv.file_id > after)
+            file_ids = list((await db.execute(query)).scalars())
+            if not file_ids:
+                break
+            pruned += await self._prune_batch(db, file_ids, now)
+            after = file_ids[-1]
+
+        collected, reclaimed = await self._collect(db)
+        self.runs += 1
+        self.versions_pruned += pruned
+        self.last_run = {
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "versions_pruned": pruned,
+            "blobs_collected": collected,
+            "bytes_reclaimed": reclaimed,
+        }
+        logger.info("Version compaction pruned %d versions and reclaimed %d bytes in %d blobs", pruned, reclaimed, collected)
+        return self.last_run
+
+    async def _collect(self, db: AsyncSession) -> Tuple[int, int]:
+        collected = reclaimed = 0
+        while True:
+            count, size = await crud.crud_blob.collect_garbage(db, grace_seconds=self.grace_seconds)
+            collected += count
+            reclaimed += size
+            if count == 0:
+                break
+        self.blobs_collected += collected
+        self.bytes_reclaimed += reclaimed
+        return collected, reclaimed
+
+    async def collect_garbage(self, db: AsyncSession) -> Dict[str, Any]:
+        """Delete every unreferenced blob past its grace period"""
+        collected, reclaimed = await self._collect(db)
+        if collected:
+            logger.info("Blob garbage collection reclaimed %d bytes in %d blobs", reclaimed, collected)
+        return {"blobs_collected": collected, "bytes_reclaimed": reclaimed}
+
+    async def _try_lock(self, db: AsyncSession) -> bool:
+        """Take the advisory lock for the rest of db's transaction; False if another worker has it"""
+        if db.get_bind().dialect.name != "postgresql":
+            return True
+        return await db.scalar(select(func.pg_try_advisory_xact_lock(VERSION_RETENTION_LOCK_KEY)))
+
+    async def _every(
+        self,
+        session_factory: Callable[[], AsyncSession],
+        interval: float,
+        job: Callable[[AsyncSession], Any],
+        name: str
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                # Jobs commit per batch, so the lock lives in a transaction of its own
+                async with session_factory() as lock, session_factory() as db:
+                    if await self._try_lock(lock):
+                        await job(db)
+                    else:
+                        logger.info("%s skipped: another worker is running it", name)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("%s failed", name)
+
+    async def run(self, session_factory: Callable[[], AsyncSession], interval: float = VERSION_RETENTION_INTERVAL) -> None:
+        """Compact every interval until cancelled"""
+        await self._every(session_factory, interval, self.compact, "Version compaction")
+
+    async def run_garbage_collection(
+        self, session_factory: Callable[[], AsyncSession], interval: float = storage.BLOB_GC_INTERVAL
+    ) -> None:
+        """Collect unreferenced blobs every interval until cancelled"""
+        await self._every(session_factory, interval, self.collect_garbage, "Blob garbage collection")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": VERSION_RETENTION_ENABLED,
+            "gc_interval_seconds": storage.BLOB_GC_INTERVAL,
+            "runs": self.runs,
+            "versions_pruned": self.versions_pruned,
+            "blobs_collected": self.blobs_collected,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "last_run": self.last_run,
+        }
+
+
+compactor = VersionCompactor()
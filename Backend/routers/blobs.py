@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+import schema as schemas
+import crud
+import storage
+import transfers
+from db import get_db
+
+router = APIRouter(prefix="/blobs", tags=["blobs"])
+
+def _check_digest(digest: str) -> str:
+    digest = digest.lower()
+    if not storage.is_digest(digest):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid SHA-256 digest"
+        )
+    return digest
+
+@router.post("/", response_model=schemas.Blob, status_code=status.HTTP_201_CREATED)
+async def upload_blob(
+    request: Request,
+    response: Response,
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream the request body into storage under its SHA-256 digest.
+    
+    Content that is already stored is kept once (200 instead of 201). The blob is
+    unreferenced until a file version points at it with content_digest.
+    """
+    blob, created = await transfers.receive_blob(request, db)
+    if not created:
+        response.status_code = status.HTTP_200_OK
+    return blob
+
+@router.head("/{digest}")
+async def check_blob(
+    digest: str,
+    db: AsyncSession = Depends(get_db)
+):
+    """200 if the content is stored, so clients can skip uploading it"""
+    blob = await crud.crud_blob.get(db, _check_digest(digest))
+    if not blob:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Blob not found"
+        )
+    return Response(headers={"Content-Length": str(blob.size_in_bytes), "ETag": f'"{blob.digest}"', "Accept-Ranges": "bytes"})
+
+@router.get("/{digest}")
+async def read_blob(
+    digest: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    digest = _check_digest(digest)
+    blob = await crud.crud_blob.get(db, digest)
+    if not blob:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Blob not found"
+        )
+    return await transfers.content_response(
+        request,
+        digest=digest,
+        size=blob.size_in_bytes,
+        key=storage.blob_key(digest),
+        # Content never changes under a digest
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
@@ -1,9 +1,10 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 import schema as schemas
 import crud
+import validation
 from db import get_db
 
 router = APIRouter(prefix="/directories", tags=["directories"])
@@ -13,31 +14,13 @@ async def create_directory(
     directory_in: schemas.DirectoryCreate,
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify project exists
-    project = await crud.crud_project.get(db, id=directory_in.project_id)
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
-    
-    # Verify user exists
-    user = await crud.crud_user.get(db, id=directory_in.created_by)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Check if user is a member of the project
-    member = await crud.crud_project_member.get_by_project_and_user(
-        db, project_id=directory_in.project_id, user_id=directory_in.created_by
+    # Verify project, user and membership in one query
+    await validation.validate_references(
+        db,
+        validation.exists(crud.crud_project, directory_in.project_id, "Project not found"),
+        validation.exists(crud.crud_user, directory_in.created_by, "User not found"),
+        validation.is_member(directory_in.project_id, directory_in.created_by),
     )
-    if not member:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User is not a member of this project"
-        )
     
     return await crud.crud_directory.create(db, obj_in=directory_in)
 
@@ -45,6 +28,9 @@ async def create_directory(
 async def read_directories(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     project_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
@@ -52,15 +38,134 @@ async def read_directories(
     if project_id:
         filters["project_id"] = project_id
     
-    directories = await crud.crud_directory.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_directory.count(db, **filters)
+    directories, total = await crud.crud_directory.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.Directory](
         items=directories,
         total=total,
         page=skip // limit + 1,
         size=len(directories),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_directory.next_cursor(directories, limit)
+    )
+
+@router.post("/bulk", response_model=schemas.BulkResponse[schemas.Directory])
+async def create_directories_bulk(
+    directories_in: List[schemas.DirectoryCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Create many directories in one transaction, reporting invalid items individually.
+    
+    Parents must already exist, so deep trees are imported one level per request.
+    """
+    validation.check_batch_size(directories_in)
+    
+    projects = await crud.crud_project.existing_ids(db, (d.project_id for d in directories_in))
+    users = await crud.crud_user.existing_ids(db, (d.created_by for d in directories_in))
+    parents = await crud.crud_directory.existing_ids(db, (d.parent_directory_id for d in directories_in))
+    members = await validation.member_pairs(db, ((d.project_id, d.created_by) for d in directories_in))
+    
+    valid_directories, errors = [], []
+    for index, directory_in in enumerate(directories_in):
+        failure = validation.first_failure(
+            (directory_in.project_id in projects, status.HTTP_404_NOT_FOUND, "Project not found"),
+            (directory_in.created_by in users, status.HTTP_404_NOT_FOUND, "User not found"),
+            (not directory_in.parent_directory_id or directory_in.parent_directory_id in parents, status.HTTP_404_NOT_FOUND, "Parent directory not found"),
+            ((directory_in.project_id, directory_in.created_by) in members, status.HTTP_403_FORBIDDEN, "User is not a member of this project"),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        valid_directories.append(directory_in)
+    
+    directories = await crud.crud_directory.create_many(db, objs_in=valid_directories)
+    return schemas.BulkResponse[schemas.Directory](items=directories, errors=errors)
+
+def _closes_loop(directory_id: UUID, parent_id: Optional[UUID], moves: Dict[UUID, Optional[UUID]], current) -> bool:
+    """Whether parent_id would end up inside directory_id's subtree, given the moves already accepted in the batch"""
+    node, seen = parent_id, set()
+    while node is not None and node not in seen:
+        if node == directory_id:
+            return True
+        seen.add(node)
+        if node in moves:
+            node = moves[node]
+            continue
+        # Unmoved directories keep their ancestors; climb to the nearest one that matters
+        path = current[node].materialized_path if node in current else None
+        ancestors = [UUID(part) for part in (path or "").strip("/").split("/")[:-1]]
+        node = next((a for a in reversed(ancestors) if a == directory_id or a in moves), None)
+    return False
+
+@router.put("/bulk", response_model=schemas.BulkResponse[schemas.Directory])
+async def update_directories_bulk(
+    directories_update: List[schemas.DirectoryBulkUpdate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Update many directories in one transaction, reporting invalid items individually"""
+    validation.check_batch_size(directories_update)
+    
+    current = await crud.crud_directory.get_many(
+        db, ids=[directory_id for d in directories_update for directory_id in (d.directory_id, d.parent_directory_id) if directory_id]
+    )
+    
+    # Checked against the tree as it will be after the moves accepted so far, so a batch cannot build a loop
+    rows, errors, moves = [], [], {}
+    for index, directory_update in enumerate(directories_update):
+        directory = current.get(directory_update.directory_id)
+        parent = current.get(directory_update.parent_directory_id)
+        failure = validation.first_failure(
+            (directory is not None, status.HTTP_404_NOT_FOUND, "Directory not found"),
+            (not directory_update.parent_directory_id or (parent is not None and directory is not None and parent.project_id == directory.project_id), status.HTTP_404_NOT_FOUND, "Parent directory not found"),
+            (
+                parent is None or directory is None
+                or not _closes_loop(directory.directory_id, parent.directory_id, moves, current),
+                status.HTTP_400_BAD_REQUEST, "Cannot move a directory into its own subtree"
+            ),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        if "parent_directory_id" in directory_update.model_fields_set:
+            moves[directory_update.directory_id] = directory_update.parent_directory_id
+        rows.append(directory_update.model_dump(exclude_unset=True) | {"directory_id": directory_update.directory_id})
+    
+    directories = await crud.crud_directory.update_many(db, objs_in=rows)
+    return schemas.BulkResponse[schemas.Directory](items=directories, errors=errors)
+
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResponse)
+async def delete_directories_bulk(
+    delete_in: schemas.BulkDeleteRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete many directories and their files in one transaction.
+    
+    A directory whose subdirectories are not deleted along with it is rejected.
+    """
+    validation.check_batch_size(delete_in.ids)
+    
+    requested = set(delete_in.ids)
+    blocked = await crud.crud_directory.parents_with_children_outside(db, ids=requested)
+    
+    deleted = set(await crud.crud_directory.remove_many(db, ids=list(requested - blocked)))
+    errors = []
+    for index, directory_id in enumerate(delete_in.ids):
+        if directory_id in blocked:
+            errors.append(schemas.BulkItemError(
+                index=index, status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Directory has subdirectories that are not being deleted"
+            ))
+        elif directory_id not in deleted:
+            errors.append(schemas.BulkItemError(
+                index=index, status_code=status.HTTP_404_NOT_FOUND, detail="Directory not found"
+            ))
+    return schemas.BulkDeleteResponse(
+        deleted=[directory_id for directory_id in dict.fromkeys(delete_in.ids) if directory_id in deleted],
+        errors=errors
     )
 
 @router.get("/{directory_id}", response_model=schemas.Directory)
@@ -89,13 +194,18 @@ async def update_directory(
             detail="Directory not found"
         )
     
-    # If project_id is being updated, verify the new project exists
-    if directory_update.project_id:
-        project = await crud.crud_project.get(db, id=directory_update.project_id)
-        if not project:
+    # If the directory is being moved, verify the new parent is in the same project and outside its subtree
+    if directory_update.parent_directory_id:
+        parent = await crud.crud_directory.get(db, id=directory_update.parent_directory_id)
+        if not parent or parent.project_id != directory.project_id:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
+                detail="Parent directory not found"
+            )
+        if directory.materialized_path and (parent.materialized_path or "").startswith(directory.materialized_path):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot move a directory into its own subtree"
             )
     
     return await crud.crud_directory.update(db, db_obj=directory, obj_in=directory_update)
@@ -105,9 +215,55 @@ async def delete_directory(
     directory_id: UUID,
     db: AsyncSession = Depends(get_db)
 ):
-    directory = await crud.crud_directory.remove(db, id=directory_id)
+    """Delete a directory with all of its subdirectories and files"""
+    directory = await crud.crud_directory.get(db, id=directory_id)
+    if not directory:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Directory not found"
+        )
+    
+    if directory.materialized_path:
+        await crud.crud_directory.remove_subtree(db, db_obj=directory)
+    else:
+        await crud.crud_directory.remove(db, id=directory_id)
+
+@router.get("/{directory_id}/subtree", response_model=schemas.DirectorySubtree)
+async def read_directory_subtree(
+    directory_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get every descendant directory and file of a directory"""
+    directory = await crud.crud_directory.get(db, id=directory_id)
     if not directory:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Directory not found"
-        ) 
\ No newline at end of file
+        )
+    if not directory.materialized_path:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Directory paths have not been built for this project"
+        )
+    
+    directories, files = await crud.crud_directory.get_subtree(db, db_obj=directory)
+    return schemas.DirectorySubtree(
+        directory=directory,
+        directories=[d for d in directories if d.directory_id != directory_id],
+        files=files
+    )
+
+@router.post("/rebuild-paths", response_model=dict)
+async def rebuild_directory_paths(
+    project_id: UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """Recompute materialized paths for a project, e.g. for directories created before paths were maintained"""
+    project = await crud.crud_project.get(db, id=project_id)
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    
+    return {"updated": await crud.crud_directory.rebuild_paths(db, project_id=project_id)}
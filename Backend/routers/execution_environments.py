@@ -27,6 +27,9 @@ async def create_execution_environment(
 async def read_execution_environments(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     language: Optional[str] = None,
     is_active: Optional[bool] = None,
     db: AsyncSession = Depends(get_db)
@@ -37,15 +40,19 @@ async def read_execution_environments(
     if is_active is not None:
         filters["is_active"] = is_active
     
-    environments = await crud.crud_execution_environment.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_execution_environment.count(db, **filters)
+    environments, total = await crud.crud_execution_environment.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.ExecutionEnvironment](
         items=environments,
         total=total,
         page=skip // limit + 1,
         size=len(environments),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_execution_environment.next_cursor(environments, limit)
     )
 
 @router.get("/{environment_id}", response_model=schemas.ExecutionEnvironment)
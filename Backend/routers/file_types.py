@@ -27,17 +27,24 @@ async def create_file_type(
 async def read_file_types(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
-    file_types = await crud.crud_file_type.get_multi(db, skip=skip, limit=limit)
-    total = await crud.crud_file_type.count(db)
+    file_types, total = await crud.crud_file_type.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total
+    )
     
     return schemas.PaginatedResponse[schemas.FileType](
         items=file_types,
         total=total,
         page=skip // limit + 1,
         size=len(file_types),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_file_type.next_cursor(file_types, limit)
     )
 
 @router.get("/{file_type_id}", response_model=schemas.FileType)
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
 import schema as schemas
 import crud
+import transfers
+import validation
 from db import get_db
 
 router = APIRouter(prefix="/file-versions", tags=["file-versions"])
@@ -13,31 +15,17 @@ async def create_file_version(
     version_in: schemas.FileVersionCreate,
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify file exists
-    file = await crud.crud_file.get(db, id=version_in.file_id)
-    if not file:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File not found"
-        )
-    
-    # Verify creator exists
-    creator = await crud.crud_user.get(db, id=version_in.created_by)
-    if not creator:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Creator not found"
-        )
-    
-    # Check if user is a member of the project
-    member = await crud.crud_project_member.get_by_project_and_user(
-        db, project_id=file.project_id, user_id=version_in.created_by
-    )
-    if not member:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User is not a member of this project"
-        )
+    # Verify file, creator, membership of the file's project, any blob and parent in one query
+    checks = [
+        validation.exists(crud.crud_file, version_in.file_id, "File not found"),
+        validation.exists(crud.crud_user, version_in.created_by, "Creator not found"),
+        validation.is_member(validation.project_of_file(version_in.file_id), version_in.created_by),
+    ]
+    if version_in.content_digest:
+        checks.append(validation.exists(crud.crud_blob, version_in.content_digest, "Blob not found"))
+    if version_in.parent_version_id:
+        checks.append(validation.exists(crud.crud_file_version, version_in.parent_version_id, "Parent version not found"))
+    await validation.validate_references(db, *checks)
     
     return await crud.crud_file_version.create(db, obj_in=version_in)
 
@@ -45,6 +33,9 @@ async def create_file_version(
 async def read_file_versions(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     file_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
@@ -52,15 +43,19 @@ async def read_file_versions(
     if file_id:
         filters["file_id"] = file_id
     
-    versions = await crud.crud_file_version.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_file_version.count(db, **filters)
+    versions, total = await crud.crud_file_version.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.FileVersion](
         items=versions,
         total=total,
         page=skip // limit + 1,
         size=len(versions),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_file_version.next_cursor(versions, limit)
     )
 
 @router.get("/{version_id}", response_model=schemas.FileVersion)
@@ -76,6 +71,20 @@ async def read_file_version(
         )
     return version
 
+@router.get("/{version_id}/content")
+async def read_file_version_content(
+    version_id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    version = await crud.crud_file_version.get(db, id=version_id)
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File version not found"
+        )
+    return await transfers.version_response(request, db, version)
+
 @router.put("/{version_id}", response_model=schemas.FileVersion)
 async def update_file_version(
     version_id: UUID,
@@ -89,6 +98,14 @@ async def update_file_version(
             detail="File version not found"
         )
     
+    # Stored content is served with its own size as Content-Length; it cannot be edited separately
+    fixed = version_update.model_fields_set & {"size_in_bytes", "version_link"}
+    if version.content_digest and fixed:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Cannot change {', '.join(sorted(fixed))} of a version with stored content"
+        )
+    
     # If file_id is being updated, verify the new file exists
     if version_update.file_id:
         file = await crud.crud_file.get(db, id=version_update.file_id)
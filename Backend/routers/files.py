@@ -1,68 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from uuid import UUID
 import schema as schemas
 import crud
+import transfers
+import validation
 from db import get_db
+from query_guard import query_budget
 
 router = APIRouter(prefix="/files", tags=["files"])
 
 @router.post("/", response_model=schemas.File, status_code=status.HTTP_201_CREATED)
+@query_budget(5)
 async def create_file(
     file_in: schemas.FileCreate,
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify project exists
-    project = await crud.crud_project.get(db, id=file_in.project_id)
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
-    
-    # Verify directory exists
-    directory = await crud.crud_directory.get(db, id=file_in.directory_id)
-    if not directory:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Directory not found"
-        )
-    
-    # Verify file type exists
-    file_type = await crud.crud_file_type.get(db, id=file_in.file_type_id)
-    if not file_type:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="File type not found"
-        )
-    
-    # Verify creator exists
-    creator = await crud.crud_user.get(db, id=file_in.created_by)
-    if not creator:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Creator not found"
-        )
-    
-    # Verify last modifier exists
+    # Verify project, directory, file type, creator, last modifier and membership in one query
+    checks = [
+        validation.exists(crud.crud_project, file_in.project_id, "Project not found"),
+        validation.exists(crud.crud_directory, file_in.directory_id, "Directory not found"),
+        validation.exists(crud.crud_file_type, file_in.file_type_id, "File type not found"),
+        validation.exists(crud.crud_user, file_in.created_by, "Creator not found"),
+    ]
     if file_in.last_modified_by:
-        modifier = await crud.crud_user.get(db, id=file_in.last_modified_by)
-        if not modifier:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Last modifier not found"
-            )
-    
-    # Check if user is a member of the project
-    member = await crud.crud_project_member.get_by_project_and_user(
-        db, project_id=file_in.project_id, user_id=file_in.created_by
-    )
-    if not member:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="User is not a member of this project"
-        )
+        checks.append(validation.exists(crud.crud_user, file_in.last_modified_by, "Last modifier not found"))
+    checks.append(validation.is_member(file_in.project_id, file_in.created_by))
+    await validation.validate_references(db, *checks)
     
     return await crud.crud_file.create(db, obj_in=file_in)
 
@@ -70,6 +35,9 @@ async def create_file(
 async def read_files(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     project_id: Optional[UUID] = None,
     directory_id: Optional[UUID] = None,
     file_type_id: Optional[UUID] = None,
@@ -83,15 +51,121 @@ async def read_files(
     if file_type_id:
         filters["file_type_id"] = file_type_id
     
-    files = await crud.crud_file.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_file.count(db, **filters)
+    files, total = await crud.crud_file.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.File](
         items=files,
         total=total,
         page=skip // limit + 1,
         size=len(files),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_file.next_cursor(files, limit)
+    )
+
+@router.post("/bulk", response_model=schemas.BulkResponse[schemas.File])
+async def create_files_bulk(
+    files_in: List[schemas.FileCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Create many files in one transaction, reporting invalid items individually"""
+    validation.check_batch_size(files_in)
+    
+    # Resolve every reference in the batch with one query per table
+    projects = await crud.crud_project.existing_ids(db, (f.project_id for f in files_in))
+    directories = await crud.crud_directory.existing_ids(db, (f.directory_id for f in files_in))
+    file_types = await crud.crud_file_type.existing_ids(db, (f.file_type_id for f in files_in))
+    users = await crud.crud_user.existing_ids(
+        db, [user_id for f in files_in for user_id in (f.created_by, f.last_modified_by)]
+    )
+    members = await validation.member_pairs(db, ((f.project_id, f.created_by) for f in files_in))
+    taken_names = await validation.existing_file_names(db, ((f.directory_id, f.file_name) for f in files_in))
+    
+    valid_files, errors = [], []
+    for index, file_in in enumerate(files_in):
+        name_key = (file_in.directory_id, file_in.file_name)
+        failure = validation.first_failure(
+            (file_in.project_id in projects, status.HTTP_404_NOT_FOUND, "Project not found"),
+            (file_in.directory_id in directories, status.HTTP_404_NOT_FOUND, "Directory not found"),
+            (file_in.file_type_id in file_types, status.HTTP_404_NOT_FOUND, "File type not found"),
+            (file_in.created_by in users, status.HTTP_404_NOT_FOUND, "Creator not found"),
+            (not file_in.last_modified_by or file_in.last_modified_by in users, status.HTTP_404_NOT_FOUND, "Last modifier not found"),
+            ((file_in.project_id, file_in.created_by) in members, status.HTTP_403_FORBIDDEN, "User is not a member of this project"),
+            (name_key not in taken_names, status.HTTP_400_BAD_REQUEST, "File name already exists in this directory"),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        # Later items in the same batch may not reuse this name either
+        taken_names.add(name_key)
+        valid_files.append(file_in)
+    
+    files = await crud.crud_file.create_many(db, objs_in=valid_files)
+    return schemas.BulkResponse[schemas.File](items=files, errors=errors)
+
+@router.put("/bulk", response_model=schemas.BulkResponse[schemas.File])
+async def update_files_bulk(
+    files_update: List[schemas.FileBulkUpdate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Update many files in one transaction, reporting invalid items individually"""
+    validation.check_batch_size(files_update)
+    
+    current = await crud.crud_file.get_many(db, ids=(f.file_id for f in files_update))
+    directories = await crud.crud_directory.existing_ids(db, (f.directory_id for f in files_update))
+    file_types = await crud.crud_file_type.existing_ids(db, (f.file_type_id for f in files_update))
+    users = await crud.crud_user.existing_ids(db, (f.last_modified_by for f in files_update))
+    
+    # Only renamed or moved files can collide with an existing name
+    target_names = {}
+    for file_update in files_update:
+        file = current.get(file_update.file_id)
+        if file:
+            target = (file_update.directory_id or file.directory_id, file_update.file_name or file.file_name)
+            if target != (file.directory_id, file.file_name):
+                target_names[file_update.file_id] = target
+    taken_names = await validation.existing_file_names(db, target_names.values())
+    
+    rows, errors = [], []
+    for index, file_update in enumerate(files_update):
+        target = target_names.get(file_update.file_id)
+        failure = validation.first_failure(
+            (file_update.file_id in current, status.HTTP_404_NOT_FOUND, "File not found"),
+            (not file_update.directory_id or file_update.directory_id in directories, status.HTTP_404_NOT_FOUND, "Directory not found"),
+            (not file_update.file_type_id or file_update.file_type_id in file_types, status.HTTP_404_NOT_FOUND, "File type not found"),
+            (not file_update.last_modified_by or file_update.last_modified_by in users, status.HTTP_404_NOT_FOUND, "User not found"),
+            (target is None or target not in taken_names, status.HTTP_400_BAD_REQUEST, "File name already exists in this directory"),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        if target is not None:
+            taken_names.add(target)
+        rows.append(file_update.model_dump(exclude_unset=True) | {"file_id": file_update.file_id})
+    
+    files = await crud.crud_file.update_many(db, objs_in=rows)
+    return schemas.BulkResponse[schemas.File](items=files, errors=errors)
+
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResponse)
+async def delete_files_bulk(
+    delete_in: schemas.BulkDeleteRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Delete many files in one statement"""
+    validation.check_batch_size(delete_in.ids)
+    
+    deleted = set(await crud.crud_file.remove_many(db, ids=delete_in.ids))
+    errors = [
+        schemas.BulkItemError(index=index, status_code=status.HTTP_404_NOT_FOUND, detail="File not found")
+        for index, file_id in enumerate(delete_in.ids)
+        if file_id not in deleted
+    ]
+    return schemas.BulkDeleteResponse(
+        deleted=[file_id for file_id in dict.fromkeys(delete_in.ids) if file_id in deleted],
+        errors=errors
     )
 
 @router.get("/{file_id}", response_model=schemas.File)
@@ -107,6 +181,52 @@ async def read_file(
         )
     return file
 
+@router.put("/{file_id}/content", response_model=schemas.FileVersion, status_code=status.HTTP_201_CREATED)
+async def upload_file_content(
+    file_id: UUID,
+    request: Request,
+    created_by: UUID,
+    parent_version_id: Optional[UUID] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream the request body in as the file's next version.
+    
+    The version's size and checksum, and the file's, come from the bytes received. The
+    parent defaults to the latest version, so successive saves are stored as deltas.
+    """
+    # Verify file, uploader, membership and any parent before accepting the body
+    checks = [
+        validation.exists(crud.crud_file, file_id, "File not found"),
+        validation.exists(crud.crud_user, created_by, "User not found"),
+        validation.is_member(validation.project_of_file(file_id), created_by),
+    ]
+    if parent_version_id:
+        checks.append(validation.exists(crud.crud_file_version, parent_version_id, "Parent version not found"))
+    await validation.validate_references(db, *checks)
+    
+    blob, _ = await transfers.receive_blob(request, db)
+    if parent_version_id is None:
+        latest = await crud.crud_file_version.get_latest(db, file_id)
+        parent_version_id = latest.version_id if latest else None
+    return await crud.crud_file_version.create(db, obj_in=schemas.FileVersionCreate(
+        file_id=file_id, content_digest=blob.digest, parent_version_id=parent_version_id, created_by=created_by
+    ))
+
+@router.get("/{file_id}/content")
+async def read_file_content(
+    file_id: UUID,
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
+    """Content of the latest version, streamed; supports Range requests"""
+    version = await crud.crud_file_version.get_latest(db, file_id)
+    if not version:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File content not found"
+        )
+    return await transfers.version_response(request, db, version)
+
 @router.put("/{file_id}", response_model=schemas.File)
 async def update_file(
     file_id: UUID,
@@ -120,41 +240,15 @@ async def update_file(
             detail="File not found"
         )
     
-    # If project_id is being updated, verify the new project exists
-    if file_update.project_id:
-        project = await crud.crud_project.get(db, id=file_update.project_id)
-        if not project:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Project not found"
-            )
-    
-    # If directory_id is being updated, verify the new directory exists
+    # Verify any re-pointed directory, file type and modifier in one query
+    checks = []
     if file_update.directory_id:
-        directory = await crud.crud_directory.get(db, id=file_update.directory_id)
-        if not directory:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="Directory not found"
-            )
-    
-    # If file_type_id is being updated, verify the new file type exists
+        checks.append(validation.exists(crud.crud_directory, file_update.directory_id, "Directory not found"))
     if file_update.file_type_id:
-        file_type = await crud.crud_file_type.get(db, id=file_update.file_type_id)
-        if not file_type:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="File type not found"
-            )
-    
-    # If last_modified_by is being updated, verify the user exists
+        checks.append(validation.exists(crud.crud_file_type, file_update.file_type_id, "File type not found"))
     if file_update.last_modified_by:
-        user = await crud.crud_user.get(db, id=file_update.last_modified_by)
-        if not user:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="User not found"
-            )
+        checks.append(validation.exists(crud.crud_user, file_update.last_modified_by, "User not found"))
+    await validation.validate_references(db, *checks)
     
     return await crud.crud_file.update(db, db_obj=file, obj_in=file_update)
 
@@ -1,13 +1,74 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Request
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import AsyncIterator, List, Optional
 from uuid import UUID
+import asyncio
+import json
+import logging
+import os
 import schema as schemas
 import crud
+import events
 from db import get_db
 
 router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+logger = logging.getLogger(__name__)
+
+# Seconds between keepalive comments on an idle stream
+STREAM_HEARTBEAT_SECONDS = float(os.getenv("NOTIFICATION_STREAM_HEARTBEAT", "15"))
+# Most notifications replayed per connection; after a full page the stream ends and the
+# client resumes from the last one it got
+STREAM_BACKLOG_LIMIT = int(os.getenv("NOTIFICATION_STREAM_BACKLOG", "1000"))
+
+def _sse(event: str, data: dict, id: Optional[int] = None) -> str:
+    lines = [f"id: {id}"] if id is not None else []
+    lines += [f"event: {event}", f"data: {json.dumps(data, default=str)}"]
+    return "\n".join(lines) + "\n\n"
+
+async def notification_event_stream(
+    request: Request,
+    subscription: events.Subscription,
+    backlog: List[dict],
+    last_seq: int,
+    heartbeat: float = STREAM_HEARTBEAT_SECONDS,
+    backlog_complete: bool = True
+) -> AsyncIterator[str]:
+    """Replay the backlog, then forward live notifications in sequence, skipping any already sent"""
+    try:
+        for notification in backlog:
+            last_seq = notification["seq"]
+            yield _sse("notification", notification, id=last_seq)
+        if not backlog_complete:
+            # More are waiting in the table; the client reconnects with Last-Event-ID for the next page
+            return
+        while True:
+            try:
+                message = await asyncio.wait_for(subscription.get(), timeout=heartbeat)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keepalive\n\n"
+                continue
+            if message is None:
+                # Fell too far behind; the client reconnects with Last-Event-ID and resumes from the table
+                break
+            if message["seq"] <= last_seq:
+                continue
+            if message["seq"] != last_seq + 1:
+                # Concurrent creates can publish out of order, and a failed publish never
+                # arrives; the client reconnects with Last-Event-ID and reads the gap from the table
+                break
+            if message.get("truncated"):
+                # The broker dropped the body to fit NOTIFY; the client reconnects with
+                # Last-Event-ID and reads it from the table
+                break
+            last_seq = message["seq"]
+            yield _sse("notification", message["notification"], id=last_seq)
+    finally:
+        events.hub.unsubscribe(subscription)
+
 @router.post("/", response_model=schemas.Notification, status_code=status.HTTP_201_CREATED)
 async def create_notification(
     notification_in: schemas.NotificationCreate,
@@ -21,12 +82,24 @@ async def create_notification(
             detail="User not found"
         )
     
-    return await crud.crud_notification.create(db, obj_in=notification_in)
+    notification = await crud.crud_notification.create(db, obj_in=notification_in)
+    # Already committed, so a broker failure must not fail the request; streams find the gap and resume
+    try:
+        await events.hub.publish(events.user_channel(notification.user_id), {
+            "seq": notification.seq,
+            "notification": schemas.Notification.model_validate(notification).model_dump(mode="json"),
+        })
+    except Exception:
+        logger.exception("Publishing notification %s failed", notification.notification_id)
+    return notification
 
 @router.get("/", response_model=schemas.PaginatedResponse[schemas.Notification])
 async def read_notifications(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     user_id: Optional[UUID] = None,
     is_read: Optional[bool] = None,
     notification_type: Optional[str] = None,
@@ -40,15 +113,19 @@ async def read_notifications(
     if notification_type:
         filters["notification_type"] = notification_type
     
-    notifications = await crud.crud_notification.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_notification.count(db, **filters)
+    notifications, total = await crud.crud_notification.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.Notification](
         items=notifications,
         total=total,
         page=skip // limit + 1,
         size=len(notifications),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_notification.next_cursor(notifications, limit)
     )
 
 @router.get("/{notification_id}", response_model=schemas.Notification)
@@ -103,17 +180,14 @@ async def mark_notification_read(
             detail="Notification not found"
         )
     
-    return await crud.crud_notification.update(
-        db,
-        db_obj=notification,
-        obj_in=schemas.NotificationUpdate(is_read=True)
-    )
+    return await crud.crud_notification.mark_read(db, db_obj=notification)
 
-@router.put("/user/{user_id}/mark-all-read", response_model=List[schemas.Notification])
+@router.put("/user/{user_id}/mark-all-read", response_model=schemas.MarkAllReadResponse)
 async def mark_all_notifications_read(
     user_id: UUID,
     db: AsyncSession = Depends(get_db)
 ):
+    """Mark every unread notification of a user read in one statement, returning only their ids"""
     # Verify user exists
     user = await crud.crud_user.get(db, id=user_id)
     if not user:
@@ -122,21 +196,66 @@ async def mark_all_notifications_read(
             detail="User not found"
         )
     
-    # Get all unread notifications for the user
-    notifications = await crud.crud_notification.get_multi(
-        db,
-        user_id=user_id,
-        is_read=False
-    )
+    notification_ids = await crud.crud_notification.mark_all_read(db, user_id=user_id)
+    return schemas.MarkAllReadResponse(updated=len(notification_ids), notification_ids=notification_ids)
+
+@router.get("/user/{user_id}/unread-count", response_model=schemas.UnreadCount)
+async def read_unread_count(
+    user_id: UUID,
+    recount: bool = False,
+    db: AsyncSession = Depends(get_db)
+):
+    """Get a user's unread notification count from its maintained counter.
+    
+    Pass recount=true to rebuild the counter from the notifications table.
+    """
+    if recount:
+        unread = await crud.crud_notification.recount_unread(db, user_id=user_id)
+    else:
+        unread = await crud.crud_notification.get_unread_count(db, user_id=user_id)
+    if unread is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+    return schemas.UnreadCount(user_id=user_id, unread_count=unread)
+
+@router.get("/user/{user_id}/stream")
+async def stream_notifications(
+    user_id: UUID,
+    request: Request,
+    last_event_id: Optional[int] = Query(None, ge=0),
+    last_event_id_header: Optional[int] = Header(None, alias="Last-Event-ID"),
+    db: AsyncSession = Depends(get_db)
+):
+    """Stream a user's new notifications as server-sent events.
     
-    # Mark all as read
-    updated_notifications = []
-    for notification in notifications:
-        updated = await crud.crud_notification.update(
-            db,
-            db_obj=notification,
-            obj_in=schemas.NotificationUpdate(is_read=True)
+    Each event id is the notification's per-user sequence number. After a reconnect the
+    browser sends it back as Last-Event-ID (or pass ?last_event_id=), and everything
+    created since is replayed before live delivery continues. A longer backlog is sent
+    a page per connection: the stream ends after a full page and the client resumes.
+    """
+    user = await crud.crud_user.get(db, id=user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
         )
-        updated_notifications.append(updated)
     
-    return updated_notifications 
\ No newline at end of file
+    # Subscribe before reading the backlog so nothing created in between is missed;
+    # duplicates are skipped by sequence number
+    subscription = await events.hub.subscribe(events.user_channel(user_id))
+    last_seq = last_event_id if last_event_id is not None else last_event_id_header
+    backlog, backlog_complete = [], True
+    if last_seq is not None:
+        notifications = await crud.crud_notification.get_since(db, user_id=user_id, seq=last_seq, limit=STREAM_BACKLOG_LIMIT)
+        backlog = [schemas.Notification.model_validate(n).model_dump(mode="json") for n in notifications]
+        backlog_complete = len(notifications) < STREAM_BACKLOG_LIMIT
+    else:
+        last_seq = user.notification_seq
+    
+    return StreamingResponse(
+        notification_event_stream(request, subscription, backlog, last_seq, backlog_complete=backlog_complete),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -6,60 +6,39 @@ from datetime import datetime, timedelta, timezone
 import secrets
 import schema as schemas
 import crud
+import validation
 from db import get_db
+from query_guard import query_budget
 
 router = APIRouter(prefix="/project-invitations", tags=["project-invitations"])
 
+def _is_expired(invitation) -> bool:
+    expires_at = invitation.expires_at
+    # SQLite hands timestamps back without a timezone; they are stored in UTC
+    if expires_at.tzinfo is None:
+        expires_at = expires_at.replace(tzinfo=timezone.utc)
+    return expires_at < datetime.now(timezone.utc)
+
 @router.post("/", response_model=schemas.ProjectInvitation, status_code=status.HTTP_201_CREATED)
 async def create_project_invitation(
     invitation_in: schemas.ProjectInvitationCreate,
     db: AsyncSession = Depends(get_db)
 ):
     """Create a new project invitation"""
-    # Verify project exists
-    project = await crud.crud_project.get(db, id=invitation_in.project_id)
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
-    
-    # Verify role exists
-    role = await crud.crud_role.get(db, id=invitation_in.role_id)
-    if not role:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Role not found"
-        )
-    
-    # Verify inviter exists
-    inviter = await crud.crud_user.get(db, id=invitation_in.invited_by)
-    if not inviter:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Inviter user not found"
-        )
-    
+    # Verify project, role, inviter, membership and pending invitations in one query
+    checks = [
+        validation.exists(crud.crud_project, invitation_in.project_id, "Project not found"),
+        validation.exists(crud.crud_role, invitation_in.role_id, "Role not found"),
+        validation.exists(crud.crud_user, invitation_in.invited_by, "Inviter user not found"),
+    ]
     # Check if user is already a member of the project (if user_id provided)
     if invitation_in.user_id:
-        existing_member = await crud.crud_project_member.get_by_project_and_user(
-            db, project_id=invitation_in.project_id, user_id=invitation_in.user_id
-        )
-        if existing_member:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="User is already a member of this project"
-            )
-    
-    # Check for existing pending invitation to the same email for the same project
-    existing_invitation = await crud.crud_project_invitation.get_by_email_and_project(
-        db, email=invitation_in.email, project_id=invitation_in.project_id
-    )
-    if existing_invitation:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Pending invitation already exists for this email in this project"
-        )
+        checks.append(validation.not_member(invitation_in.project_id, invitation_in.user_id))
+    checks.append(validation.no_pending_invitation(
+        invitation_in.email, invitation_in.project_id,
+        "Pending invitation already exists for this email in this project"
+    ))
+    await validation.validate_references(db, *checks)
     
     return await crud.create_project_invitation(db, invitation_in)
 
@@ -67,6 +46,9 @@ async def create_project_invitation(
 async def read_project_invitations(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     project_id: Optional[UUID] = None,
     email: Optional[str] = None,
     status_filter: Optional[str] = Query(None, alias="status"),
@@ -81,15 +63,19 @@ async def read_project_invitations(
     if status_filter:
         filters["status"] = status_filter
     
-    invitations = await crud.get_multi_project_invitations(db, skip=skip, limit=limit, **filters)
-    total = await crud.count_project_invitations(db, **filters)
+    invitations, total = await crud.get_project_invitations_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.ProjectInvitation](
         items=invitations,
         total=total,
         page=skip // limit + 1,
         size=len(invitations),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_project_invitation.next_cursor(invitations, limit)
     )
 
 @router.get("/by-email/{email}", response_model=List[schemas.ProjectInvitationWithDetails])
@@ -142,7 +128,7 @@ async def read_invitation_by_token(
         )
     
     # Check if invitation has expired
-    if invitation.expires_at < datetime.now(timezone.utc):
+    if _is_expired(invitation):
         # Update status to expired
         await crud.update_project_invitation(
             db, 
@@ -191,6 +177,7 @@ async def update_project_invitation(
     return await crud.update_project_invitation(db, invitation_id, invitation_update)
 
 @router.post("/{invitation_id}/accept", response_model=schemas.ProjectMember)
+@query_budget(8)
 async def accept_project_invitation(
     invitation_id: UUID,
     accept_data: schemas.AcceptInvitationRequest,
@@ -222,7 +209,7 @@ async def accept_project_invitation(
         )
     
     # Check if invitation has expired
-    if invitation.expires_at < datetime.now(timezone.utc):
+    if _is_expired(invitation):
         await crud.update_project_invitation(
             db, 
             invitation_id, 
@@ -4,6 +4,7 @@ from typing import List, Optional
 from uuid import UUID
 import schema as schemas
 import crud
+import validation
 from db import get_db
 
 router = APIRouter(prefix="/project-members", tags=["project-members"])
@@ -13,39 +14,14 @@ async def create_project_member(
     member_in: schemas.ProjectMemberCreate,
     db: AsyncSession = Depends(get_db)
 ):
-    # Verify project exists
-    project = await crud.crud_project.get(db, id=member_in.project_id)
-    if not project:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Project not found"
-        )
-    
-    # Verify user exists
-    user = await crud.crud_user.get(db, id=member_in.user_id)
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-    
-    # Verify role exists
-    role = await crud.crud_role.get(db, id=member_in.role_id)
-    if not role:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Role not found"
-        )
-    
-    # Check if user is already a member of the project
-    existing_member = await crud.crud_project_member.get_by_project_and_user(
-        db, project_id=member_in.project_id, user_id=member_in.user_id
+    # Verify project, user, role and that the user is not already a member in one query
+    await validation.validate_references(
+        db,
+        validation.exists(crud.crud_project, member_in.project_id, "Project not found"),
+        validation.exists(crud.crud_user, member_in.user_id, "User not found"),
+        validation.exists(crud.crud_role, member_in.role_id, "Role not found"),
+        validation.not_member(member_in.project_id, member_in.user_id),
     )
-    if existing_member:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User is already a member of this project"
-        )
     
     return await crud.crud_project_member.create(db, obj_in=member_in)
 
@@ -53,6 +29,9 @@ async def create_project_member(
 async def read_project_members(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     project_id: Optional[UUID] = None,
     user_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
@@ -63,15 +42,94 @@ async def read_project_members(
     if user_id:
         filters["user_id"] = user_id
     
-    members = await crud.crud_project_member.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_project_member.count(db, **filters)
+    members, total = await crud.crud_project_member.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.ProjectMember](
         items=members,
         total=total,
         page=skip // limit + 1,
         size=len(members),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_project_member.next_cursor(members, limit)
+    )
+
+@router.post("/bulk", response_model=schemas.BulkResponse[schemas.ProjectMember])
+async def create_project_members_bulk(
+    members_in: List[schemas.ProjectMemberCreate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Add many project members in one transaction, reporting invalid items individually"""
+    validation.check_batch_size(members_in)
+    
+    projects = await crud.crud_project.existing_ids(db, (m.project_id for m in members_in))
+    users = await crud.crud_user.existing_ids(db, (m.user_id for m in members_in))
+    roles = await crud.crud_role.existing_ids(db, (m.role_id for m in members_in))
+    members = await validation.member_pairs(db, ((m.project_id, m.user_id) for m in members_in))
+    
+    valid_members, errors = [], []
+    for index, member_in in enumerate(members_in):
+        member_key = (member_in.project_id, member_in.user_id)
+        failure = validation.first_failure(
+            (member_in.project_id in projects, status.HTTP_404_NOT_FOUND, "Project not found"),
+            (member_in.user_id in users, status.HTTP_404_NOT_FOUND, "User not found"),
+            (member_in.role_id in roles, status.HTTP_404_NOT_FOUND, "Role not found"),
+            (member_key not in members, status.HTTP_400_BAD_REQUEST, "User is already a member of this project"),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        members.add(member_key)
+        valid_members.append(member_in)
+    
+    created = await crud.crud_project_member.create_many(db, objs_in=valid_members)
+    return schemas.BulkResponse[schemas.ProjectMember](items=created, errors=errors)
+
+@router.put("/bulk", response_model=schemas.BulkResponse[schemas.ProjectMember])
+async def update_project_members_bulk(
+    members_update: List[schemas.ProjectMemberBulkUpdate],
+    db: AsyncSession = Depends(get_db)
+):
+    """Update many project members in one transaction, reporting invalid items individually"""
+    validation.check_batch_size(members_update)
+    
+    existing = await crud.crud_project_member.existing_ids(db, (m.project_member_id for m in members_update))
+    roles = await crud.crud_role.existing_ids(db, (m.role_id for m in members_update))
+    
+    rows, errors = [], []
+    for index, member_update in enumerate(members_update):
+        failure = validation.first_failure(
+            (member_update.project_member_id in existing, status.HTTP_404_NOT_FOUND, "Project member not found"),
+            (not member_update.role_id or member_update.role_id in roles, status.HTTP_404_NOT_FOUND, "Role not found"),
+        )
+        if failure:
+            errors.append(schemas.BulkItemError(index=index, status_code=failure[0], detail=failure[1]))
+            continue
+        rows.append(member_update.model_dump(exclude_unset=True) | {"project_member_id": member_update.project_member_id})
+    
+    members = await crud.crud_project_member.update_many(db, objs_in=rows)
+    return schemas.BulkResponse[schemas.ProjectMember](items=members, errors=errors)
+
+@router.post("/bulk-delete", response_model=schemas.BulkDeleteResponse)
+async def delete_project_members_bulk(
+    delete_in: schemas.BulkDeleteRequest,
+    db: AsyncSession = Depends(get_db)
+):
+    """Remove many project members in one statement"""
+    validation.check_batch_size(delete_in.ids)
+    
+    deleted = set(await crud.crud_project_member.remove_many(db, ids=delete_in.ids))
+    errors = [
+        schemas.BulkItemError(index=index, status_code=status.HTTP_404_NOT_FOUND, detail="Project member not found")
+        for index, member_id in enumerate(delete_in.ids)
+        if member_id not in deleted
+    ]
+    return schemas.BulkDeleteResponse(
+        deleted=[member_id for member_id in dict.fromkeys(delete_in.ids) if member_id in deleted],
+        errors=errors
     )
 
 @router.get("/{member_id}", response_model=schemas.ProjectMember)
@@ -166,11 +224,7 @@ async def get_project_members_with_details(
     # If owner is not in members list, add them with owner role
     if not owner_is_member:
         # Get the "Owner" role
-        owner_role_result = await db.execute(
-            select(crud.crud_role.model)
-            .where(crud.crud_role.model.role_name == "Owner")
-        )
-        owner_role = owner_role_result.scalar_one_or_none()
+        owner_role = await crud.crud_role.get_by_name(db, role_name="Owner")
         
         if owner_role:
             # Create a virtual member object for the owner
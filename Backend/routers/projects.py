@@ -1,6 +1,6 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Header, Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List, Optional
+from typing import Dict, List, Optional
 from uuid import UUID
 import schema as schemas
 import crud
@@ -8,6 +8,43 @@ from db import get_db
 
 router = APIRouter(prefix="/projects", tags=["projects"])
 
+TREE_DIRECTORY_COLUMNS = ["directory_id", "directory_name", "parent_directory_id"]
+TREE_FILE_COLUMNS = ["file_id", "file_name", "directory_id", "file_type_id", "size_in_bytes", "modified_at", "content_digest"]
+
+def _tree_etag(project_id: UUID, revision: int) -> str:
+    return f'"{project_id}:{revision}"'
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+def _nest_tree(directories, files) -> List[schemas.TreeDirectory]:
+    """Assemble flat directory and file rows into nested nodes, in one pass over each"""
+    nodes: Dict[UUID, schemas.TreeDirectory] = {
+        row.directory_id: schemas.TreeDirectory(directory_id=row.directory_id, directory_name=row.directory_name)
+        for row in directories
+    }
+    roots = []
+    for row in directories:
+        parent = nodes.get(row.parent_directory_id)
+        (parent.directories if parent else roots).append(nodes[row.directory_id])
+    for row in files:
+        directory = nodes.get(row.directory_id)
+        if directory:
+            directory.files.append(schemas.TreeFile.model_validate(row))
+    return roots
+
+async def _get_tree_revision(db: AsyncSession, project_id: UUID) -> int:
+    revision = await crud.crud_project.get_tree_revision(db, project_id=project_id)
+    if revision is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found"
+        )
+    return revision
+
 @router.post("/", response_model=schemas.Project, status_code=status.HTTP_201_CREATED)
 async def create_project(
     project_in: schemas.ProjectCreate,
@@ -27,6 +64,9 @@ async def create_project(
 async def read_projects(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     owner_id: Optional[UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
@@ -34,15 +74,19 @@ async def read_projects(
     if owner_id:
         filters["owner_id"] = owner_id
     
-    projects = await crud.crud_project.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_project.count(db, **filters)
+    projects, total = await crud.crud_project.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.Project](
         items=projects,
         total=total,
         page=skip // limit + 1,
         size=len(projects),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_project.next_cursor(projects, limit)
     )
 
 @router.get("/{project_id}", response_model=schemas.Project)
@@ -85,3 +129,67 @@ async def delete_project(
             detail="Project not found"
         )
 
+
+@router.get("/{project_id}/tree", response_model=schemas.ProjectTree)
+async def read_project_tree(
+    project_id: UUID,
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get the whole directory and file tree of a project, nested, with its revision as ETag.
+    
+    A client that sends back the ETag it holds gets 304 until the tree changes.
+    """
+    # Read the revision before the rows: anything written meanwhile is at most re-sent by the next delta
+    revision = await _get_tree_revision(db, project_id)
+    etag = _tree_etag(project_id, revision)
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    directories, _ = await crud.crud_directory.get_changes(db, project_id=project_id, columns=TREE_DIRECTORY_COLUMNS)
+    files, _ = await crud.crud_file.get_changes(db, project_id=project_id, columns=TREE_FILE_COLUMNS)
+    
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "no-cache"
+    return schemas.ProjectTree(project_id=project_id, revision=revision, directories=_nest_tree(directories, files))
+
+@router.get("/{project_id}/tree/changes", response_model=schemas.ProjectTreeDelta)
+async def read_project_tree_changes(
+    project_id: UUID,
+    response: Response,
+    since: int = Query(..., ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get directories and files written or deleted after revision `since`.
+    
+    Changes are flat: apply them to the tree held at `since`, then continue from `revision`.
+    Deleting a directory also deletes everything beneath it.
+    """
+    revision = await _get_tree_revision(db, project_id)
+    etag = _tree_etag(project_id, revision)
+    if since > revision:
+        raise HTTPException(
+            status_code=status.HTTP_410_GONE,
+            detail="Revision is ahead of the project tree; reload the full tree"
+        )
+    if since == revision:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+    
+    directories, deleted_directory_ids = await crud.crud_directory.get_changes(
+        db, project_id=project_id, columns=TREE_DIRECTORY_COLUMNS, since=since
+    )
+    files, deleted_file_ids = await crud.crud_file.get_changes(
+        db, project_id=project_id, columns=TREE_FILE_COLUMNS, since=since
+    )
+    
+    response.headers["ETag"] = etag
+    return schemas.ProjectTreeDelta(
+        project_id=project_id,
+        since=since,
+        revision=revision,
+        directories=[schemas.TreeDirectoryChange.model_validate(row) for row in directories],
+        files=[schemas.TreeFileChange.model_validate(row) for row in files],
+        deleted_directory_ids=deleted_directory_ids,
+        deleted_file_ids=deleted_file_ids
+    )
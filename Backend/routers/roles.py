@@ -27,17 +27,24 @@ async def create_role(
 async def read_roles(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     db: AsyncSession = Depends(get_db)
 ):
-    roles = await crud.crud_role.get_multi(db, skip=skip, limit=limit)
-    total = await crud.crud_role.count(db)
+    roles, total = await crud.crud_role.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total
+    )
     
     return schemas.PaginatedResponse[schemas.Role](
         items=roles,
         total=total,
         page=skip // limit + 1,
         size=len(roles),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_role.next_cursor(roles, limit)
     )
 
 @router.get("/{role_id}", response_model=schemas.Role)
@@ -5,6 +5,7 @@ from uuid import UUID
 import schema as schemas
 import crud
 from db import get_db
+from query_guard import query_budget
 import models
 
 router = APIRouter(prefix="/users", tags=["users"])
@@ -40,6 +41,9 @@ async def create_user(
 async def read_users(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     status_filter: Optional[str] = Query(None, alias="status"),
     db: AsyncSession = Depends(get_db)
 ):
@@ -47,15 +51,19 @@ async def read_users(
     if status_filter:
         filters["status"] = status_filter
     
-    users = await crud.crud_user.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_user.count(db, **filters)
+    users, total = await crud.crud_user.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.User](
         items=users,
         total=total,
         page=skip // limit + 1,
         size=len(users),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_user.next_cursor(users, limit)
     )
 
 # Alias without trailing slash to avoid 307 redirects that some XHR clients won't follow cross-origin
@@ -63,10 +71,16 @@ async def read_users(
 async def read_users_no_trailing_slash(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     status_filter: Optional[str] = Query(None, alias="status"),
     db: AsyncSession = Depends(get_db)
 ):
-    return await read_users(skip=skip, limit=limit, status_filter=status_filter, db=db)
+    return await read_users(
+        skip=skip, limit=limit, cursor=cursor, include_total=include_total,
+        estimate_total=estimate_total, status_filter=status_filter, db=db
+    )
 
 @router.get("/{user_id}", response_model=schemas.User)
 async def read_user(
@@ -112,6 +126,7 @@ async def delete_user(
 
 
 @router.get("/{user_id}/all-projects", response_model=schemas.UserProjectsResponse)
+@query_budget(8)
 async def get_user_all_projects(
     user_id: UUID,
     db: AsyncSession = Depends(get_db)
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Query, WebSocket, WebSocketDisconnect
 from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import suppress
 from typing import List, Optional
 from uuid import UUID
+import asyncio
+import json
 import schema as schemas
 import crud
-from db import get_db
+from connections import manager, ProjectConnection
+from presence import presence
+from db import AsyncSessionLocal, get_db
 
 router = APIRouter(prefix="/websocket-connections", tags=["websocket-connections"])
 
@@ -27,6 +32,9 @@ async def create_websocket_connection(
 async def read_websocket_connections(
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    include_total: bool = True,
+    estimate_total: bool = False,
     user_id: Optional[UUID] = None,
     is_active: Optional[bool] = None,
     connection_type: Optional[str] = None,
@@ -40,17 +48,26 @@ async def read_websocket_connections(
     if connection_type:
         filters["connection_type"] = connection_type
     
-    connections = await crud.crud_websocket_connection.get_multi(db, skip=skip, limit=limit, **filters)
-    total = await crud.crud_websocket_connection.count(db, **filters)
+    connections, total = await crud.crud_websocket_connection.get_page(
+        db, skip=skip, limit=limit, cursor=cursor,
+        include_total=include_total, estimate_total=estimate_total, **filters
+    )
     
     return schemas.PaginatedResponse[schemas.WebSocketConnection](
         items=connections,
         total=total,
         page=skip // limit + 1,
         size=len(connections),
-        pages=(total + limit - 1) // limit
+        pages=(total + limit - 1) // limit if total is not None else None,
+        cursor=cursor,
+        next_cursor=crud.crud_websocket_connection.next_cursor(connections, limit)
     )
 
+@router.get("/presence/{project_id}", response_model=schemas.ProjectPresence)
+async def read_project_presence(project_id: UUID):
+    """Users with a socket subscribed to the project on this worker, read from memory"""
+    return schemas.ProjectPresence(project_id=project_id, user_ids=presence.online_users(project_id))
+
 @router.get("/{connection_id}", response_model=schemas.WebSocketConnection)
 async def read_websocket_connection(
     connection_id: UUID,
@@ -91,58 +108,83 @@ async def delete_websocket_connection(
             detail="WebSocket connection not found"
         )
 
+async def _subscribe(connection: ProjectConnection, project_id: UUID) -> None:
+    # A session per message, so an open socket does not pin a database connection
+    async with AsyncSessionLocal() as db:
+        membership = await crud.crud_project_member.get_membership(db, project_id=project_id, user_id=connection.user_id)
+    if membership is None:
+        await connection.send({"type": "error", "project_id": str(project_id), "detail": "User is not a member of this project"})
+        return
+    await connection.subscribe(project_id)
+    await connection.send({"type": "subscribed", "project_id": str(project_id)})
+
+async def _handle_message(connection: ProjectConnection, text: str) -> None:
+    try:
+        message = json.loads(text)
+        action = message.get("action")
+        project_id = UUID(message["project_id"]) if action in ("subscribe", "unsubscribe") else None
+    except (ValueError, KeyError, TypeError, AttributeError):
+        await connection.send({"type": "error", "detail": "Invalid message"})
+        return
+    
+    # Any message proves the client is alive; presence coalesces these until the next flush
+    presence.heartbeat(connection.id)
+    if action == "subscribe":
+        await _subscribe(connection, project_id)
+    elif action == "unsubscribe":
+        connection.unsubscribe(project_id)
+        await connection.send({"type": "unsubscribed", "project_id": str(project_id)})
+    elif action == "ping":
+        await connection.send({"type": "pong"})
+    else:
+        await connection.send({"type": "error", "detail": f"Unknown action: {action}"})
+
 @router.websocket("/ws/{user_id}")
 async def websocket_endpoint(
     websocket: WebSocket,
     user_id: UUID,
-    db: AsyncSession = Depends(get_db)
+    project_id: List[UUID] = Query([])
 ):
-    # Verify user exists
-    user = await crud.crud_user.get(db, id=user_id)
-    if not user:
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
-        return
-    
-    # Accept the connection
-    await websocket.accept()
+    """Project event stream.
     
-    try:
-        # Create connection record
-        connection = await crud.crud_websocket_connection.create(
+    Client messages are JSON objects: {"action": "subscribe" | "unsubscribe", "project_id": ...}
+    or {"action": "ping"}. Projects may also be subscribed with ?project_id= on connect.
+    Clients must send something (at least a ping) within PRESENCE_TIMEOUT seconds or are closed.
+    Events arrive batched as {"type": "events", "events": [...]}; each names the project and,
+    for tree changes, the new revision to pass to GET /projects/{project_id}/tree/changes.
+    """
+    async with AsyncSessionLocal() as db:
+        user = await crud.crud_user.get(db, id=user_id)
+        if not user:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        record = await crud.crud_websocket_connection.create(
             db,
-            obj_in=schemas.WebSocketConnectionCreate(
-                user_id=user_id,
-                connection_type="websocket",
-                is_active=True
-            )
+            obj_in=schemas.WebSocketConnectionCreate(user_id=user_id, connection_type="editor")
         )
-        
+        record_id = record.connection_id
+    
+    await websocket.accept()
+    connection = manager.connect(websocket, user_id, record_id)
+    sender = None
+    try:
+        for initial_project_id in dict.fromkeys(project_id):
+            await _subscribe(connection, initial_project_id)
+        sender = asyncio.create_task(connection.run_sender())
         while True:
-            # Receive and process messages
-            data = await websocket.receive_text()
-            # Process the message here
-            # You can add your message handling logic
-            
-            # Send response
-            await websocket.send_text(f"Message received: {data}")
-            
+            receive = asyncio.create_task(websocket.receive_text())
+            done, _ = await asyncio.wait({receive, sender}, return_when=asyncio.FIRST_COMPLETED)
+            if receive not in done:
+                # The sender closed a connection that fell too far behind
+                receive.cancel()
+                break
+            await _handle_message(connection, receive.result())
     except WebSocketDisconnect:
-        # Update connection status when disconnected
-        if connection:
-            await crud.crud_websocket_connection.update(
-                db,
-                db_obj=connection,
-                obj_in=schemas.WebSocketConnectionUpdate(is_active=False)
-            )
-    except Exception as e:
-        # Handle any other exceptions
-        if connection:
-            await crud.crud_websocket_connection.update(
-                db,
-                db_obj=connection,
-                obj_in=schemas.WebSocketConnectionUpdate(
-                    is_active=False,
-                    last_error=str(e)
-                )
-            )
-        await websocket.close(code=status.WS_1011_INTERNAL_ERROR) 
\ No newline at end of file
+        pass
+    finally:
+        if sender is not None:
+            sender.cancel()
+            with suppress(asyncio.CancelledError, Exception):
+                await sender
+        # Marked inactive in the table by the next presence flush
+        manager.disconnect(connection)
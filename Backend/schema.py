@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, ConfigDict, field_validator, Field
+from pydantic import BaseModel, EmailStr, ConfigDict, field_validator, model_validator, Field
 from typing import Optional, List, Dict, Any, TypeVar, Generic, Union
 from datetime import datetime
 from uuid import UUID
+import re
 
 # Base schemas
 class BaseSchema(BaseModel):
@@ -112,6 +113,9 @@ class ProjectMember(ProjectMemberBase):
     last_activity: Optional[datetime] = None
     is_active: bool
 
+class ProjectMemberBulkUpdate(ProjectMemberUpdate):
+    project_member_id: UUID
+
 class ProjectMemberWithDetails(ProjectMember):
     user: User
     role: Role
@@ -223,6 +227,49 @@ class File(FileBase):
     last_modified_by: UUID
     created_at: datetime
     modified_at: Optional[datetime] = None
+    content_digest: Optional[str] = None
+
+class DirectorySubtree(BaseSchema):
+    directory: Directory
+    directories: List[Directory]
+    files: List[File]
+
+# Project Tree Schemas
+class TreeFile(BaseSchema):
+    file_id: UUID
+    file_name: str
+    file_type_id: Optional[UUID] = None
+    size_in_bytes: Optional[int] = None
+    modified_at: Optional[datetime] = None
+    content_digest: Optional[str] = None
+
+class TreeDirectory(BaseSchema):
+    directory_id: UUID
+    directory_name: str
+    directories: List["TreeDirectory"] = []
+    files: List[TreeFile] = []
+
+class ProjectTree(BaseSchema):
+    project_id: UUID
+    revision: int
+    directories: List[TreeDirectory]
+
+class TreeDirectoryChange(BaseSchema):
+    directory_id: UUID
+    directory_name: str
+    parent_directory_id: Optional[UUID] = None
+
+class TreeFileChange(TreeFile):
+    directory_id: UUID
+
+class ProjectTreeDelta(BaseSchema):
+    project_id: UUID
+    since: int
+    revision: int
+    directories: List[TreeDirectoryChange]
+    files: List[TreeFileChange]
+    deleted_directory_ids: List[UUID]
+    deleted_file_ids: List[UUID]
 
 # Pagination Schema
 class PaginationParams(BaseSchema):
@@ -231,22 +278,73 @@ class PaginationParams(BaseSchema):
 
 class PaginatedResponse(BaseSchema, Generic[T]):
     items: List[T]
-    total: int
+    total: Optional[int] = None
     page: int
     size: int
-    pages: int
+    pages: Optional[int] = None
+    cursor: Optional[str] = None
+    next_cursor: Optional[str] = None
+
+# Bulk Operation Schemas
+class BulkItemError(BaseSchema):
+    index: int
+    status_code: int
+    detail: str
+
+class BulkResponse(BaseSchema, Generic[T]):
+    items: List[T]
+    errors: List[BulkItemError] = []
+
+class BulkDeleteRequest(BaseSchema):
+    ids: List[UUID]
+
+class BulkDeleteResponse(BaseSchema):
+    deleted: List[UUID]
+    errors: List[BulkItemError] = []
+
+class FileBulkUpdate(FileUpdate):
+    file_id: UUID
+
+class DirectoryBulkUpdate(DirectoryUpdate):
+    directory_id: UUID
+
+# Blob Schemas
+class BlobCreate(BaseSchema):
+    digest: str
+    size_in_bytes: int
+
+class Blob(BlobCreate):
+    ref_count: int
+    created_at: datetime
 
 # File Version Schemas
 class FileVersionBase(BaseSchema):
     file_id: UUID
     version_number: int
-    version_link: str
-    size_in_bytes: int
+    version_link: Optional[str] = None
+    size_in_bytes: Optional[int] = None
     parent_version_id: Optional[UUID] = None
+    content_digest: Optional[str] = None
 
 class FileVersionCreate(FileVersionBase):
+    # Left out, the next number for the file is assigned
+    version_number: Optional[int] = None
     created_by: UUID
 
+    @field_validator('content_digest')
+    @classmethod
+    def normalize_digest(cls, v):
+        if v is not None and not re.fullmatch(r"[0-9a-f]{64}", v.lower()):
+            raise ValueError("content_digest must be a hex SHA-256 digest")
+        return v.lower() if v is not None else v
+
+    @model_validator(mode='after')
+    def require_content(self):
+        # Either point at an uploaded blob, whose size is used, or describe external content
+        if self.content_digest is None and (self.version_link is None or self.size_in_bytes is None):
+            raise ValueError("Provide content_digest, or version_link and size_in_bytes")
+        return self
+
 class FileVersionUpdate(BaseModel):
     file_id: Optional[UUID] = None
     version_number: Optional[int] = None
@@ -256,6 +354,8 @@ class FileVersionUpdate(BaseModel):
 
 class FileVersion(FileVersionBase):
     version_id: UUID
+    size_in_bytes: int
+    chain_length: int = 0
     created_at: datetime
     created_by: UUID
 
@@ -281,11 +381,50 @@ class NotificationUpdate(BaseSchema):
 
 class Notification(NotificationBase):
     notification_id: UUID
+    is_read: bool = False
+    read_at: Optional[datetime] = None
+    seq: Optional[int] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+class MarkAllReadResponse(BaseSchema):
+    updated: int
+    notification_ids: List[UUID]
+
+class UnreadCount(BaseSchema):
+    user_id: UUID
+    unread_count: int
+
+# WebSocket Connection Schemas
+class WebSocketConnectionBase(BaseSchema):
+    user_id: UUID
+    project_id: Optional[UUID] = None
+    connection_type: str = "editor"
+    client_info: Dict[str, Any] = {}
+
+class WebSocketConnectionCreate(WebSocketConnectionBase):
+    websocket_id: Optional[str] = Field(None, description="Auto-generated if not provided")
+    is_active: bool = True
+
+class WebSocketConnectionUpdate(BaseSchema):
+    project_id: Optional[UUID] = None
+    is_active: Optional[bool] = None
+    last_ping: Optional[datetime] = None
+    client_info: Optional[Dict[str, Any]] = None
+
+class WebSocketConnection(WebSocketConnectionBase):
+    connection_id: UUID
+    websocket_id: str
+    connected_at: datetime
+    last_ping: Optional[datetime] = None
+    is_active: bool
+
+class ProjectPresence(BaseSchema):
+    project_id: UUID
+    user_ids: List[UUID]
+
 # Project Invitation Schemas
 class ProjectInvitationBase(BaseSchema):
     project_id: UUID
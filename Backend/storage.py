@@ -0,0 +1,305 @@
+"""Content-addressed blob storage.
+
+File version contents are stored once per SHA-256 digest, under
+blobs/sha256/<first two hex chars>/<digest>, whichever file or project they
+belong to. The blobs table counts the versions pointing at each digest;
+unreferenced blobs are deleted by garbage collection after a grace period, so
+an upload that is about to be referenced is never collected underneath it.
+Collection runs every BLOB_GC_INTERVAL seconds; see retention.py.
+
+A file version either references its full content (a keyframe) or a delta
+against its parent version; see delta.py and CRUDFileVersion.
+
+- "local" keeps objects under BLOB_STORAGE_DIR. It suits development and tests.
+- "s3" talks to any S3-compatible store (MinIO locally, same defaults as the
+  Node SBackend) and needs boto3.
+
+Uploads are streamed: stage_upload hashes the body while writing it to a staging
+object under uploads/, in multipart parts of BLOB_PART_SIZE on S3, and promote then
+moves it under its digest. Reads are streamed in BLOB_CHUNK_SIZE pieces and can start
+at any offset, so neither direction holds a whole file in memory.
+"""
+import os
+import re
+import asyncio
+import hashlib
+from typing import AsyncIterator, Optional, Tuple
+from uuid import uuid4
+
+BLOB_STORAGE_BACKEND = os.getenv("BLOB_STORAGE_BACKEND", "local")
+BLOB_STORAGE_DIR = os.getenv("BLOB_STORAGE_DIR", "blob-data")
+BLOB_STORAGE_BUCKET = os.getenv("BLOB_STORAGE_BUCKET", "projects")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL", "http://localhost:9009")
+S3_ACCESS_KEY = os.getenv("S3_ACCESS_KEY", "minioadmin")
+S3_SECRET_KEY = os.getenv("S3_SECRET_KEY", "minioadmin")
+S3_REGION = os.getenv("S3_REGION", "us-east-1")
+# Unreferenced blobs younger than this are kept, so uploads can be referenced first
+BLOB_GC_GRACE_SECONDS = int(os.getenv("BLOB_GC_GRACE_SECONDS", "3600"))
+# Seconds between garbage collection runs; 0 leaves it to version compaction
+BLOB_GC_INTERVAL = float(os.getenv("BLOB_GC_INTERVAL", "3600"))
+# Bytes read per chunk when streaming content out
+BLOB_CHUNK_SIZE = int(os.getenv("BLOB_CHUNK_SIZE", str(1024 * 1024)))
+# Multipart upload part size; S3 requires at least 5 MiB for all but the last part
+BLOB_PART_SIZE = int(os.getenv("BLOB_PART_SIZE", str(8 * 1024 * 1024)))
+
+# A version is stored whole after this many deltas in a row, bounding reconstruction
+VERSION_KEYFRAME_INTERVAL = int(os.getenv("VERSION_KEYFRAME_INTERVAL", "50"))
+# A delta larger than this fraction of the content is not worth keeping
+VERSION_DELTA_MAX_RATIO = float(os.getenv("VERSION_DELTA_MAX_RATIO", "0.5"))
+# Larger contents are always stored whole; line diffing them would be too slow
+VERSION_DELTA_MAX_BYTES = int(os.getenv("VERSION_DELTA_MAX_BYTES", str(1024 * 1024)))
+VERSION_CACHE_SIZE = int(os.getenv("VERSION_CACHE_SIZE", "256"))
+# Total size of the materialized contents cached per worker
+VERSION_CACHE_TOTAL_BYTES = int(os.getenv("VERSION_CACHE_TOTAL_BYTES", str(32 * 1024 * 1024)))
+VERSION_CACHE_TTL = float(os.getenv("VERSION_CACHE_TTL", "300"))
+# Larger materialized contents are not cached
+VERSION_CACHE_MAX_BYTES = int(os.getenv("VERSION_CACHE_MAX_BYTES", str(1024 * 1024)))
+
+DIGEST_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def is_digest(value: str) -> bool:
+    return bool(DIGEST_PATTERN.match(value))
+
+
+def digest_of(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_key(digest: str) -> str:
+    return f"blobs/sha256/{digest[:2]}/{digest}"
+
+
+class LocalWriter:
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.path = path
+        self.file = open(path, "wb")
+
+    async def write(self, chunk: bytes) -> None:
+        await asyncio.to_thread(self.file.write, chunk)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.file.close)
+
+    async def abort(self) -> None:
+        self.file.close()
+        await asyncio.to_thread(os.remove, self.path)
+
+
+class LocalBlobStore:
+    """Objects as files under a root directory"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def _put(self, key: str, data: bytes) -> None:
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write aside and rename, so readers never see a partial object
+        partial = f"{path}.{os.getpid()}.partial"
+        with open(partial, "wb") as f:
+            f.write(data)
+        os.replace(partial, path)
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _delete(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(os.path.exists, self._path(key))
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self._put, key, data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._delete, key)
+
+    async def open_writer(self, key: str) -> LocalWriter:
+        return await asyncio.to_thread(LocalWriter, self._path(key))
+
+    async def promote(self, staged_key: str, key: str) -> None:
+        """Move a staged object to its final key"""
+        path = self._path(key)
+        await asyncio.to_thread(os.makedirs, os.path.dirname(path), exist_ok=True)
+        await asyncio.to_thread(os.replace, self._path(staged_key), path)
+
+    async def iter_range(self, key: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        f = await asyncio.to_thread(open, self._path(key), "rb")
+        try:
+            await asyncio.to_thread(f.seek, start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = await asyncio.to_thread(
+                    f.read, BLOB_CHUNK_SIZE if remaining is None else min(BLOB_CHUNK_SIZE, remaining)
+                )
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(f.close)
+
+
+class S3Writer:
+    """Buffers up to one part, then switches to a multipart upload"""
+
+    def __init__(self, client, bucket: str, key: str):
+        self.client = client
+        self.bucket = bucket
+        self.key = key
+        self.buffer = bytearray()
+        self.upload_id: Optional[str] = None
+        self.parts = []
+
+    async def _upload_part(self, data: bytes) -> None:
+        if self.upload_id is None:
+            upload = await asyncio.to_thread(self.client.create_multipart_upload, Bucket=self.bucket, Key=self.key)
+            self.upload_id = upload["UploadId"]
+        number = len(self.parts) + 1
+        part = await asyncio.to_thread(
+            self.client.upload_part,
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, PartNumber=number, Body=data
+        )
+        self.parts.append({"PartNumber": number, "ETag": part["ETag"]})
+
+    async def write(self, chunk: bytes) -> None:
+        self.buffer += chunk
+        while len(self.buffer) >= BLOB_PART_SIZE:
+            data = bytes(self.buffer[:BLOB_PART_SIZE])
+            del self.buffer[:BLOB_PART_SIZE]
+            await self._upload_part(data)
+
+    async def close(self) -> None:
+        if self.upload_id is None:
+            await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=self.key, Body=bytes(self.buffer))
+            return
+        if self.buffer:
+            await self._upload_part(bytes(self.buffer))
+        await asyncio.to_thread(
+            self.client.complete_multipart_upload,
+            Bucket=self.bucket, Key=self.key, UploadId=self.upload_id, MultipartUpload={"Parts": self.parts}
+        )
+
+    async def abort(self) -> None:
+        if self.upload_id is not None:
+            await asyncio.to_thread(
+                self.client.abort_multipart_upload, Bucket=self.bucket, Key=self.key, UploadId=self.upload_id
+            )
+
+
+class S3BlobStore:
+    """Objects in one bucket of an S3-compatible store"""
+
+    def __init__(self, bucket: str):
+        try:
+            import boto3
+        except ImportError as exc:
+            raise RuntimeError("BLOB_STORAGE_BACKEND=s3 requires the boto3 package") from exc
+        self.bucket = bucket
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=S3_ENDPOINT_URL,
+            aws_access_key_id=S3_ACCESS_KEY,
+            aws_secret_access_key=S3_SECRET_KEY,
+            region_name=S3_REGION,
+        )
+
+    def _is_missing(self, exc: Exception) -> bool:
+        error = getattr(exc, "response", {}).get("Error", {})
+        return error.get("Code") in ("404", "NoSuchKey", "NotFound")
+
+    def _exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except Exception as exc:
+            if self._is_missing(exc):
+                return False
+            raise
+
+    def _get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        except Exception as exc:
+            if self._is_missing(exc):
+                return None
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await asyncio.to_thread(self._exists, key)
+
+    async def put(self, key: str, data: bytes) -> None:
+        await asyncio.to_thread(self.client.put_object, Bucket=self.bucket, Key=key, Body=data)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._get, key)
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self.client.delete_object, Bucket=self.bucket, Key=key)
+
+    async def open_writer(self, key: str) -> S3Writer:
+        return S3Writer(self.client, self.bucket, key)
+
+    async def promote(self, staged_key: str, key: str) -> None:
+        """Copy a staged object to its final key; the managed copy goes multipart for large objects"""
+        await asyncio.to_thread(self.client.copy, {"Bucket": self.bucket, "Key": staged_key}, self.bucket, key)
+        await self.delete(staged_key)
+
+    async def iter_range(self, key: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        if length == 0:
+            return
+        byte_range = f"bytes={start}-" if length is None else f"bytes={start}-{start + length - 1}"
+        response = await asyncio.to_thread(self.client.get_object, Bucket=self.bucket, Key=key, Range=byte_range)
+        body = response["Body"]
+        try:
+            while True:
+                chunk = await asyncio.to_thread(body.read, BLOB_CHUNK_SIZE)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            body.close()
+
+
+async def stage_upload(store, chunks: AsyncIterator[bytes]) -> Tuple[str, str, int]:
+    """Stream chunks into a staging object, returning (staging key, SHA-256 digest, size)"""
+    key = f"uploads/{uuid4().hex}"
+    hasher = hashlib.sha256()
+    size = 0
+    writer = await store.open_writer(key)
+    try:
+        async for chunk in chunks:
+            hasher.update(chunk)
+            size += len(chunk)
+            await writer.write(chunk)
+        await writer.close()
+    except BaseException:
+        await writer.abort()
+        raise
+    return key, hasher.hexdigest(), size
+
+
+def _blob_store():
+    if BLOB_STORAGE_BACKEND == "s3":
+        return S3BlobStore(BLOB_STORAGE_BUCKET)
+    return LocalBlobStore(BLOB_STORAGE_DIR)
+
+
+blob_store = _blob_store()
@@ -1,9 +1,13 @@
 import os
 import asyncio
+import tempfile
 from typing import AsyncGenerator, Generator
 
 # Set the test database URL before importing any modules that depend on it
 os.environ["DATABASE_URL"] = "sqlite+aiosqlite:///:memory:"
+os.environ["BLOB_STORAGE_DIR"] = tempfile.mkdtemp(prefix="blob-test-")
+# N+1 patterns and routes over their query budget fail the request, and so the test
+os.environ.setdefault("QUERY_GUARD_MODE", "raise")
 
 import pytest
 import pytest_asyncio
@@ -17,6 +21,7 @@ from sqlalchemy.ext.asyncio import (
 
 from main import app
 from db import Base, get_db
+from query_guard import expect_queries as _expect_queries
 
 DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
@@ -56,6 +61,15 @@ async def db() -> AsyncGenerator[AsyncSession, None]:
         await conn.run_sync(Base.metadata.drop_all)
 
 
+@pytest.fixture
+def expect_queries():
+    """
+    Fixture returning a context manager that fails the test when the block runs more
+    queries than allowed: `with expect_queries(5): await client.get(...)`.
+    """
+    return _expect_queries
+
+
 @pytest_asyncio.fixture()
 async def client(db) -> AsyncGenerator[AsyncClient, None]:
     """
@@ -0,0 +1,160 @@
+import pytest
+from httpx import AsyncClient
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update
+import hashlib
+import uuid
+
+import crud
+import models
+import storage
+from tests.conftest import TestingSessionLocal
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def upload_blob(client: AsyncClient, content: bytes):
+    """Helper function to upload content and return the blob."""
+    response = await client.post("/api/v1/blobs/", content=content)
+    assert response.status_code in (200, 201)
+    return response.json()
+
+
+async def create_version(client: AsyncClient, fixtures, file_id: str, digest: str, version_number: int = 1):
+    response = await client.post("/api/v1/file-versions/", json={
+        "file_id": file_id,
+        "version_number": version_number,
+        "content_digest": digest,
+        "created_by": fixtures["user"]["user_id"],
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def ref_count(digest: str) -> int:
+    async with TestingSessionLocal() as db:
+        return (await crud.crud_blob.get(db, digest)).ref_count
+
+
+async def test_upload_blob_is_content_addressed(client: AsyncClient):
+    """Test that uploads are keyed by SHA-256 and identical content is stored once."""
+    content = f"print('{uuid.uuid4()}')\n".encode()
+    digest = hashlib.sha256(content).hexdigest()
+
+    response = await client.post("/api/v1/blobs/", content=content)
+    assert response.status_code == 201
+    assert response.json()["digest"] == digest
+    assert response.json()["size_in_bytes"] == len(content)
+    assert response.json()["ref_count"] == 0
+
+    response = await client.post("/api/v1/blobs/", content=content)
+    assert response.status_code == 200
+
+    response = await client.head(f"/api/v1/blobs/{digest}")
+    assert response.status_code == 200
+    response = await client.get(f"/api/v1/blobs/{digest}")
+    assert response.content == content
+    assert response.headers["etag"] == f'"{digest}"'
+
+    response = await client.head(f"/api/v1/blobs/{hashlib.sha256(b'never uploaded').hexdigest()}")
+    assert response.status_code == 404
+    response = await client.get("/api/v1/blobs/not-a-digest")
+    assert response.status_code == 400
+
+
+async def test_versions_share_and_release_blobs(client: AsyncClient):
+    """Test that versions of different files reference one blob and release it when deleted."""
+    fixtures = await create_file_fixtures(client)
+    files = [(await client.post("/api/v1/files/", json=file_payload(fixtures))).json() for _ in range(2)]
+    content = f"# template {uuid.uuid4()}\n".encode()
+    digest = (await upload_blob(client, content))["digest"]
+
+    first = await create_version(client, fixtures, files[0]["file_id"], digest)
+    second = await create_version(client, fixtures, files[1]["file_id"], digest)
+    assert first["size_in_bytes"] == len(content)
+    assert await ref_count(digest) == 2
+
+    response = await client.get(f"/api/v1/file-versions/{first['version_id']}/content")
+    assert response.status_code == 200
+    assert response.content == content
+
+    await client.delete(f"/api/v1/file-versions/{first['version_id']}")
+    assert await ref_count(digest) == 1
+    # Deleting the file drops the references of its versions too
+    await client.delete(f"/api/v1/files/{files[1]['file_id']}")
+    assert await ref_count(digest) == 0
+    response = await client.get(f"/api/v1/file-versions/{second['version_id']}")
+    assert response.status_code == 404
+
+    async with TestingSessionLocal() as db:
+        # A negative grace period makes every released blob old enough to collect
+        collected, reclaimed = await crud.crud_blob.collect_garbage(db, grace_seconds=-60)
+    assert collected >= 1 and reclaimed >= len(content)
+    response = await client.head(f"/api/v1/blobs/{digest}")
+    assert response.status_code == 404
+
+
+async def test_reupload_restarts_grace_period(client: AsyncClient):
+    """Test that uploading an unreferenced blob again keeps it from being collected."""
+    content = f"# uploaded twice {uuid.uuid4()}\n".encode()
+    digest = (await upload_blob(client, content))["digest"]
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.Blob)
+            .where(models.Blob.digest == digest)
+            .values(released_at=datetime.now(timezone.utc) - timedelta(hours=2))
+        )
+        await db.commit()
+
+    response = await client.post("/api/v1/blobs/", content=content)
+    assert response.status_code == 200
+    async with TestingSessionLocal() as db:
+        await crud.crud_blob.collect_garbage(db, grace_seconds=3600)
+    response = await client.get(f"/api/v1/blobs/{digest}")
+    assert response.status_code == 200
+    assert response.content == content
+
+
+async def test_read_blob_with_missing_object(client: AsyncClient):
+    """Test that a blob whose object is gone from the store is a 404, not a broken stream."""
+    digest = (await upload_blob(client, f"# lost {uuid.uuid4()}\n".encode()))["digest"]
+    await storage.blob_store.delete(storage.blob_key(digest))
+
+    response = await client.get(f"/api/v1/blobs/{digest}")
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Blob not found"
+
+
+async def test_version_with_content_keeps_its_size(client: AsyncClient):
+    """Test that size and link cannot be edited on a version backed by a blob."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    content = f"# sized {uuid.uuid4()}\n".encode()
+    version = await create_version(client, fixtures, file["file_id"], (await upload_blob(client, content))["digest"])
+
+    response = await client.put(f"/api/v1/file-versions/{version['version_id']}", json={"size_in_bytes": 3})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot change size_in_bytes of a version with stored content"
+    response = await client.put(f"/api/v1/file-versions/{version['version_id']}", json={"version_link": "s3://elsewhere"})
+    assert response.status_code == 400
+
+    response = await client.get(f"/api/v1/file-versions/{version['version_id']}/content")
+    assert response.content == content
+
+
+async def test_create_version_requires_content(client: AsyncClient):
+    """Test that a version needs an uploaded blob or an external link with a size."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    version = {"file_id": file["file_id"], "version_number": 1, "created_by": fixtures["user"]["user_id"]}
+
+    response = await client.post("/api/v1/file-versions/", json=version)
+    assert response.status_code == 422
+
+    response = await client.post("/api/v1/file-versions/", json={
+        **version, "content_digest": hashlib.sha256(b"missing").hexdigest()
+    })
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Blob not found"
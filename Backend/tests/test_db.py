@@ -34,4 +34,16 @@ async def test_db_direct_connection():
             assert result.scalar() == 1
             print("Direct database connection successful")
     except Exception as e:
-        pytest.fail(f"Direct database connection failed: {e}") 
\ No newline at end of file
+        pytest.fail(f"Direct database connection failed: {e}") 
+
+
+async def test_db_pool_stats(client: AsyncClient):
+    """
+    Tests that the pool metrics endpoint reports the active profile and counters.
+    """
+    response = await client.get("/health/db-pool")
+    assert response.status_code == 200
+    stats = response.json()
+    assert stats["mode"] == "pgbouncer"
+    for key in ("checkouts", "connects", "timeouts", "wait_seconds_total", "wait_seconds_max", "wait_seconds_avg"):
+        assert key in stats
@@ -0,0 +1,184 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import update
+import uuid
+
+import models
+from tests.conftest import TestingSessionLocal
+from tests.test_blobs import create_version, ref_count, upload_blob
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def create_directory(client: AsyncClient, fixtures, name: str, parent=None):
+    """Helper function to create a directory, optionally under a parent."""
+    response = await client.post("/api/v1/directories/", json={
+        "project_id": fixtures["project"]["project_id"],
+        "directory_name": name,
+        "parent_directory_id": parent["directory_id"] if parent else None,
+        "created_by": fixtures["user"]["user_id"],
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def test_create_directory_maintains_path(client: AsyncClient):
+    """Test that the server assigns materialized paths and depths."""
+    fixtures = await create_file_fixtures(client)
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+    grandchild = await create_directory(client, fixtures, "utils", child)
+
+    assert root["materialized_path"] == f"/{root['directory_id']}/"
+    assert root["depth_level"] == 0
+    assert child["materialized_path"] == f"{root['materialized_path']}{child['directory_id']}/"
+    assert child["depth_level"] == 1
+    assert grandchild["materialized_path"] == f"{child['materialized_path']}{grandchild['directory_id']}/"
+    assert grandchild["depth_level"] == 2
+
+
+async def test_read_directory_subtree(client: AsyncClient):
+    """Test fetching every descendant directory and file at once."""
+    fixtures = await create_file_fixtures(client)
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+    await create_directory(client, fixtures, "utils", child)
+    sibling = await create_directory(client, fixtures, "docs")
+
+    await client.post("/api/v1/files/", json=file_payload(fixtures))
+    await client.post("/api/v1/files/", json=file_payload(fixtures, directory_id=child["directory_id"]))
+    await client.post("/api/v1/files/", json=file_payload(fixtures, directory_id=sibling["directory_id"]))
+
+    response = await client.get(f"/api/v1/directories/{root['directory_id']}/subtree")
+    assert response.status_code == 200
+    subtree = response.json()
+    assert subtree["directory"]["directory_id"] == root["directory_id"]
+    assert {d["directory_name"] for d in subtree["directories"]} == {"lib", "utils"}
+    assert len(subtree["files"]) == 2
+
+
+async def test_move_directory_rewrites_subtree(client: AsyncClient):
+    """Test that moving a directory rewrites the paths of all its descendants."""
+    fixtures = await create_file_fixtures(client)
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+    grandchild = await create_directory(client, fixtures, "utils", child)
+    target = await create_directory(client, fixtures, "vendor")
+
+    response = await client.put(f"/api/v1/directories/{child['directory_id']}", json={
+        "parent_directory_id": target["directory_id"]
+    })
+    assert response.status_code == 200
+    moved = response.json()
+    assert moved["materialized_path"] == f"{target['materialized_path']}{child['directory_id']}/"
+    assert moved["depth_level"] == 1
+
+    response = await client.get(f"/api/v1/directories/{grandchild['directory_id']}")
+    assert response.json()["materialized_path"] == f"{moved['materialized_path']}{grandchild['directory_id']}/"
+    assert response.json()["depth_level"] == 2
+
+
+async def test_move_directory_into_own_subtree(client: AsyncClient):
+    """Test that a directory cannot be moved beneath itself."""
+    fixtures = await create_file_fixtures(client)
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+
+    response = await client.put(f"/api/v1/directories/{root['directory_id']}", json={
+        "parent_directory_id": child["directory_id"]
+    })
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Cannot move a directory into its own subtree"
+
+
+async def test_delete_directory_removes_subtree(client: AsyncClient):
+    """Test that deleting a directory removes its descendants and their files."""
+    fixtures = await create_file_fixtures(client)
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures, directory_id=child["directory_id"]))
+    file_id = response.json()["file_id"]
+
+    response = await client.delete(f"/api/v1/directories/{root['directory_id']}")
+    assert response.status_code == 204
+
+    for path in (
+        f"/api/v1/directories/{root['directory_id']}",
+        f"/api/v1/directories/{child['directory_id']}",
+        f"/api/v1/files/{file_id}",
+    ):
+        response = await client.get(path)
+        assert response.status_code == 404
+
+
+async def test_bulk_update_rejects_loop_within_batch(client: AsyncClient):
+    """Test that moves which only form a loop together are caught per item."""
+    fixtures = await create_file_fixtures(client)
+    first = await create_directory(client, fixtures, "first")
+    second = await create_directory(client, fixtures, "second")
+    nested = await create_directory(client, fixtures, "nested", parent=second)
+
+    response = await client.put("/api/v1/directories/bulk", json=[
+        {"directory_id": first["directory_id"], "parent_directory_id": nested["directory_id"]},
+        {"directory_id": second["directory_id"], "parent_directory_id": first["directory_id"]},
+    ])
+    assert response.status_code == 200
+    assert [item["directory_id"] for item in response.json()["items"]] == [first["directory_id"]]
+    assert response.json()["errors"] == [
+        {"index": 1, "status_code": 400, "detail": "Cannot move a directory into its own subtree"}
+    ]
+
+    response = await client.get(f"/api/v1/directories/{first['directory_id']}")
+    assert response.json()["materialized_path"] == (
+        f"/{second['directory_id']}/{nested['directory_id']}/{first['directory_id']}/"
+    )
+async def test_children_of_directory_without_path_are_rebuilt(client: AsyncClient):
+    """Test that a directory under a parent with no materialized path gets none until paths are rebuilt."""
+    fixtures = await create_file_fixtures(client)
+    legacy = await create_directory(client, fixtures, "legacy")
+    moved = await create_directory(client, fixtures, "moved")
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.Directory)
+            .where(models.Directory.directory_id == uuid.UUID(legacy["directory_id"]))
+            .values(materialized_path=None)
+        )
+        await db.commit()
+
+    child = await create_directory(client, fixtures, "child", legacy)
+    assert child["materialized_path"] is None
+    response = await client.put(f"/api/v1/directories/{moved['directory_id']}", json={
+        "parent_directory_id": legacy["directory_id"],
+    })
+    assert response.status_code == 200
+    assert response.json()["materialized_path"] is None
+
+    response = await client.post("/api/v1/directories/rebuild-paths", params={"project_id": fixtures["project"]["project_id"]})
+    assert response.status_code == 200
+    legacy_path = f"/{legacy['directory_id']}/"
+    for directory in (child, moved):
+        response = await client.get(f"/api/v1/directories/{directory['directory_id']}")
+        assert response.json()["materialized_path"] == f"{legacy_path}{directory['directory_id']}/"
+        assert response.json()["depth_level"] == 1
+
+
+async def test_delete_directory_without_path_releases_blobs(client: AsyncClient):
+    """Test that deleting a directory with no materialized path drops its files' blob references."""
+    fixtures = await create_file_fixtures(client)
+    directory = await create_directory(client, fixtures, "legacy")
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.Directory)
+            .where(models.Directory.directory_id == uuid.UUID(directory["directory_id"]))
+            .values(materialized_path=None)
+        )
+        await db.commit()
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures, directory_id=directory["directory_id"]))).json()
+    digest = (await upload_blob(client, f"# legacy {uuid.uuid4()}\n".encode()))["digest"]
+    await create_version(client, fixtures, file["file_id"], digest)
+
+    response = await client.delete(f"/api/v1/directories/{directory['directory_id']}")
+    assert response.status_code == 204
+    assert await ref_count(digest) == 0
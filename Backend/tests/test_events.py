@@ -0,0 +1,179 @@
+import asyncio
+import pytest
+from httpx import AsyncClient
+import uuid
+
+import events
+from events import EventHub, LocalBroker
+from routers.notifications import notification_event_stream
+from tests.test_files import create_file_fixtures, file_payload
+from tests.test_notifications import create_notification_user, create_notification
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+class ConnectedRequest:
+    """Stands in for a Starlette request whose client never disconnects."""
+
+    async def is_disconnected(self):
+        return False
+
+
+async def test_hub_fans_out_per_channel():
+    """Test that a publish reaches every subscriber of its channel and no other."""
+    hub = EventHub(LocalBroker())
+    first = await hub.subscribe("user:a")
+    second = await hub.subscribe("user:a")
+    other = await hub.subscribe("user:b")
+
+    await hub.publish("user:a", {"seq": 1})
+    assert await first.get() == {"seq": 1}
+    assert await second.get() == {"seq": 1}
+    assert other.queue.empty()
+
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert hub.subscriber_count("user:a") == 0
+    assert hub.stats()["subscribers"] == 1
+
+
+async def test_hub_drops_slow_subscriber():
+    """Test that a full subscriber queue is replaced by the end-of-stream marker."""
+    hub = EventHub(LocalBroker(), queue_size=2)
+    subscription = await hub.subscribe("user:a")
+    for seq in range(3):
+        await hub.publish("user:a", {"seq": seq})
+
+    assert await subscription.get() is None
+    assert hub.subscriber_count() == 0
+    assert hub.stats()["dropped_subscribers"] == 1
+
+
+async def test_create_notification_publishes_to_user_channel(client: AsyncClient):
+    """Test that creating notifications pushes them to the user's channel in sequence."""
+    user = await create_notification_user(client)
+    subscription = await events.hub.subscribe(events.user_channel(user["user_id"]))
+    try:
+        created = [await create_notification(client, user["user_id"], f"Note {i}") for i in range(2)]
+        received = [await subscription.get() for _ in created]
+    finally:
+        events.hub.unsubscribe(subscription)
+
+    assert [m["notification"]["notification_id"] for m in received] == [n["notification_id"] for n in created]
+    assert [m["seq"] for m in received] == [n["seq"] for n in created]
+    assert created[1]["seq"] == created[0]["seq"] + 1
+
+
+async def test_event_stream_replays_backlog_then_live():
+    """Test that the stream sends the backlog, then live messages not already sent."""
+    hub = EventHub(LocalBroker())
+    subscription = await hub.subscribe("user:a")
+    backlog = [{"seq": 3, "title": "three"}, {"seq": 4, "title": "four"}]
+    # Published while the backlog was being read, so it is also in the backlog
+    await hub.publish("user:a", {"seq": 4, "notification": {"seq": 4, "title": "four"}})
+    await hub.publish("user:a", {"seq": 5, "notification": {"seq": 5, "title": "five"}})
+
+    original_hub, events.hub = events.hub, hub
+    try:
+        stream = notification_event_stream(ConnectedRequest(), subscription, backlog, last_seq=2, heartbeat=0.01)
+        chunks = [await stream.__anext__() for _ in range(4)]
+        await stream.aclose()
+    finally:
+        events.hub = original_hub
+
+    assert [chunk.split("\n")[0] for chunk in chunks[:3]] == ["id: 3", "id: 4", "id: 5"]
+    assert '"title": "five"' in chunks[2]
+    assert chunks[3] == ": keepalive\n\n"
+    assert hub.subscriber_count() == 0
+
+
+async def test_event_stream_ends_on_truncated_message():
+    """Test that a message whose body was dropped by the broker ends the stream for a resume."""
+    hub = EventHub(LocalBroker())
+    subscription = await hub.subscribe("user:a")
+    await hub.publish("user:a", {"seq": 3, "notification": {"seq": 3, "title": "three"}})
+    await hub.publish("user:a", {**events._slim({"seq": 4, "notification": {"seq": 4}}), "truncated": True})
+
+    original_hub, events.hub = events.hub, hub
+    try:
+        stream = notification_event_stream(ConnectedRequest(), subscription, [], last_seq=2, heartbeat=0.01)
+        chunks = [chunk async for chunk in stream]
+    finally:
+        events.hub = original_hub
+
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["id: 3"]
+    assert hub.subscriber_count() == 0
+
+
+async def test_event_stream_ends_after_partial_backlog():
+    """Test that a backlog cut off at the page limit ends the stream instead of skipping to live messages."""
+    hub = EventHub(LocalBroker())
+    subscription = await hub.subscribe("user:a")
+    await hub.publish("user:a", {"seq": 9, "notification": {"seq": 9, "title": "nine"}})
+
+    original_hub, events.hub = events.hub, hub
+    try:
+        stream = notification_event_stream(
+            ConnectedRequest(), subscription, [{"seq": 3}, {"seq": 4}], last_seq=2, heartbeat=0.01, backlog_complete=False
+        )
+        chunks = [chunk async for chunk in stream]
+    finally:
+        events.hub = original_hub
+
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["id: 3", "id: 4"]
+    assert hub.subscriber_count() == 0
+
+
+async def test_event_stream_ends_on_sequence_gap():
+    """Test that a live message arriving ahead of a missing one ends the stream for a resume."""
+    hub = EventHub(LocalBroker())
+    subscription = await hub.subscribe("user:a")
+    await hub.publish("user:a", {"seq": 3, "notification": {"seq": 3, "title": "three"}})
+    # Two concurrent creates publish out of order
+    await hub.publish("user:a", {"seq": 5, "notification": {"seq": 5, "title": "five"}})
+    await hub.publish("user:a", {"seq": 4, "notification": {"seq": 4, "title": "four"}})
+
+    original_hub, events.hub = events.hub, hub
+    try:
+        stream = notification_event_stream(ConnectedRequest(), subscription, [], last_seq=2, heartbeat=0.01)
+        chunks = [chunk async for chunk in stream]
+    finally:
+        events.hub = original_hub
+
+    assert [chunk.split("\n")[0] for chunk in chunks] == ["id: 3"]
+    assert hub.subscriber_count() == 0
+
+
+async def test_failed_publish_keeps_committed_write(client: AsyncClient, monkeypatch):
+    """Test that a broker failure after commit is logged instead of failing the request."""
+    fixtures = await create_file_fixtures(client)
+
+    async def broken_publish(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(events, "publish_project_event", broken_publish)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 201
+
+    response = await client.get(f"/api/v1/files/{response.json()['file_id']}")
+    assert response.status_code == 200
+
+
+async def test_failed_notification_publish_keeps_notification(client: AsyncClient, monkeypatch):
+    """Test that a broker failure after the notification is committed still returns 201."""
+    user = await create_notification_user(client)
+
+    async def broken_publish(*args, **kwargs):
+        raise ConnectionError("broker unavailable")
+
+    monkeypatch.setattr(events.hub, "publish", broken_publish)
+    created = await create_notification(client, user["user_id"])
+    response = await client.get(f"/api/v1/notifications/{created['notification_id']}")
+    assert response.status_code == 200
+
+
+async def test_stream_unknown_user(client: AsyncClient):
+    """Test streaming notifications of a user that does not exist."""
+    response = await client.get(f"/api/v1/notifications/user/{uuid.uuid4()}/stream")
+    assert response.status_code == 404
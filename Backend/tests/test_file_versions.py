@@ -0,0 +1,194 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.exc import IntegrityError
+import asyncio
+import sqlite3
+import uuid
+
+import crud
+import storage
+from tests.conftest import TestingSessionLocal
+from tests.test_blobs import upload_blob
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+def source(seed: str, revision: int, lines: int = 200) -> bytes:
+    """A file body where each revision changes one line."""
+    body = [f"line {i}: {seed}\n" for i in range(lines)]
+    body[revision % lines] = f"line {revision % lines}: edited in revision {revision}\n"
+    return "".join(body).encode()
+
+
+async def save(client: AsyncClient, fixtures, file_id: str, content: bytes, version_number: int, parent=None):
+    """Helper function to upload content and create a version of it."""
+    digest = (await upload_blob(client, content))["digest"]
+    response = await client.post("/api/v1/file-versions/", json={
+        "file_id": file_id,
+        "version_number": version_number,
+        "content_digest": digest,
+        "parent_version_id": parent["version_id"] if parent else None,
+        "created_by": fixtures["user"]["user_id"],
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def stored_size(version_id: str) -> int:
+    async with TestingSessionLocal() as db:
+        version = await crud.crud_file_version.get(db, uuid.UUID(version_id))
+        return (await crud.crud_blob.get(db, version.storage_digest)).size_in_bytes
+
+
+async def read_content(client: AsyncClient, version) -> bytes:
+    # Drop cached contents so the chain is replayed from storage
+    crud.crud_file_version.contents.clear()
+    response = await client.get(f"/api/v1/file-versions/{version['version_id']}/content")
+    assert response.status_code == 200
+    return response.content
+
+
+async def test_versions_are_stored_as_deltas(client: AsyncClient, monkeypatch):
+    """Test that child versions are stored as small deltas with periodic keyframes."""
+    monkeypatch.setattr(storage, "VERSION_KEYFRAME_INTERVAL", 3)
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+
+    versions, parent = [], None
+    for revision in range(1, 5):
+        parent = await save(client, fixtures, file["file_id"], source(seed, revision), revision, parent)
+        versions.append(parent)
+
+    assert [version["chain_length"] for version in versions] == [0, 1, 2, 0]
+    assert versions[1]["size_in_bytes"] == len(source(seed, 2))
+    assert await stored_size(versions[2]["version_id"]) * 10 < len(source(seed, 3))
+    for revision, version in enumerate(versions, start=1):
+        assert await read_content(client, version) == source(seed, revision)
+
+
+async def test_repeated_lines_diff_quickly(client: AsyncClient):
+    """Test that content whose lines keep repeating is diffed in bounded time."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    lines = [f"    value = compute(row, {i % 50})  # repeated every 50 lines\n" for i in range(10_000)]
+    base = "".join(lines).encode()
+    lines[5_000] = "    value = None\n"
+    target = "".join(lines).encode()
+
+    first = await save(client, fixtures, file["file_id"], base, 1)
+    second = await asyncio.wait_for(save(client, fixtures, file["file_id"], target, 2, first), timeout=10)
+    assert second["chain_length"] == 1
+    assert await stored_size(second["version_id"]) < 1_000
+    assert await read_content(client, second) == target
+
+
+async def test_deleting_a_base_version_keeps_its_children(client: AsyncClient):
+    """Test that deltas built on a deleted version are re-encoded against its parent."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    first = await save(client, fixtures, file["file_id"], source(seed, 1), 1)
+    second = await save(client, fixtures, file["file_id"], source(seed, 2), 2, first)
+    third = await save(client, fixtures, file["file_id"], source(seed, 3), 3, second)
+    assert third["chain_length"] == 2
+
+    response = await client.delete(f"/api/v1/file-versions/{second['version_id']}")
+    assert response.status_code == 204
+
+    response = await client.get(f"/api/v1/file-versions/{third['version_id']}")
+    assert response.json()["chain_length"] == 1
+    assert response.json()["parent_version_id"] == first["version_id"]
+    assert await stored_size(third["version_id"]) * 10 < len(source(seed, 3))
+    assert await read_content(client, third) == source(seed, 3)
+
+
+async def test_cached_contents_are_bounded_by_total_size(client: AsyncClient, monkeypatch):
+    """Test that the contents cache evicts old versions to stay within its byte budget."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    contents = crud.crud_file_version.contents
+    contents.clear()
+    monkeypatch.setattr(contents, "maxbytes", 2 * len(source(seed, 1)))
+
+    versions, parent = [], None
+    for revision in range(1, 6):
+        parent = await save(client, fixtures, file["file_id"], source(seed, revision), revision, parent)
+        versions.append(parent)
+        response = await client.get(f"/api/v1/file-versions/{parent['version_id']}/content")
+        assert response.content == source(seed, revision)
+        assert contents.bytes <= contents.maxbytes
+
+    assert contents.stats()["size"] == 2
+    assert await read_content(client, versions[0]) == source(seed, 1)
+
+
+async def test_create_version_with_unknown_parent(client: AsyncClient):
+    """Test that the parent version must exist."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    digest = (await upload_blob(client, source(seed, 1)))["digest"]
+
+    response = await client.post("/api/v1/file-versions/", json={
+        "file_id": file["file_id"],
+        "version_number": 1,
+        "content_digest": digest,
+        "parent_version_id": str(uuid.uuid4()),
+        "created_by": fixtures["user"]["user_id"],
+    })
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Parent version not found"
+
+
+async def test_only_unique_violations_are_version_conflicts():
+    """Test that foreign key failures are not reported as a taken version number."""
+    unique = sqlite3.IntegrityError("UNIQUE constraint failed: file_versions.file_id, file_versions.version_number")
+    foreign_key = sqlite3.IntegrityError("FOREIGN KEY constraint failed")
+    assert crud.is_unique_violation(IntegrityError("INSERT", {}, unique))
+    assert not crud.is_unique_violation(IntegrityError("INSERT", {}, foreign_key))
+
+
+async def test_append_assigns_version_numbers(client: AsyncClient):
+    """Test that versions without a number are numbered by the server and update the file."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+
+    async def append(revision: int, **extra):
+        digest = (await upload_blob(client, source(seed, revision, lines=revision)))["digest"]
+        return await client.post("/api/v1/file-versions/", json={
+            "file_id": file["file_id"],
+            "content_digest": digest,
+            "created_by": fixtures["user"]["user_id"],
+            **extra,
+        })
+
+    responses = await asyncio.gather(*(append(revision) for revision in range(1, 6)))
+    assert sorted(response.json()["version_number"] for response in responses) == [1, 2, 3, 4, 5]
+
+    latest = next(response.json() for response in responses if response.json()["version_number"] == 5)
+    response = await client.get(f"/api/v1/files/{file['file_id']}")
+    assert response.json()["size_in_bytes"] == latest["size_in_bytes"]
+    assert response.json()["modified_at"] is not None
+
+    # An explicit number is kept and later appends continue after it
+    response = await append(10, version_number=10)
+    assert response.json()["version_number"] == 10
+    response = await append(11)
+    assert response.json()["version_number"] == 11
+    response = await append(12, version_number=3)
+    assert response.status_code == 409
+
+    # Filling a gap below the latest leaves the file describing version 11
+    latest = (await client.get(f"/api/v1/files/{file['file_id']}")).json()
+    response = await append(7, version_number=7)
+    assert response.status_code == 201
+    response = await client.get(f"/api/v1/files/{file['file_id']}")
+    assert response.json()["size_in_bytes"] == latest["size_in_bytes"]
+    assert response.json()["content_digest"] == latest["content_digest"]
+    response = await append(13)
+    assert response.json()["version_number"] == 12
@@ -0,0 +1,331 @@
+import pytest
+from httpx import AsyncClient
+import hashlib
+import uuid
+
+import crud
+import storage
+from cache import membership_cache
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def create_file_fixtures(client: AsyncClient):
+    """Helper function to create a user, project, membership, directory and file type."""
+    suffix = uuid.uuid4().hex[:12]
+
+    response = await client.post("/api/v1/users/", json={
+        "username": f"fileuser_{suffix}",
+        "email": f"fileuser_{suffix}@example.com",
+        "password": "password123",
+    })
+    assert response.status_code == 201
+    user = response.json()
+
+    response = await client.post("/api/v1/projects/", json={
+        "project_name": f"File Project {suffix}",
+        "owner_id": user["user_id"],
+    })
+    assert response.status_code == 201
+    project = response.json()
+
+    response = await client.post("/api/v1/roles/", json={
+        "role_name": f"editor_{suffix}",
+        "permissions": {"read": True, "write": True},
+    })
+    assert response.status_code == 201
+    role = response.json()
+
+    response = await client.post("/api/v1/project-members/", json={
+        "project_id": project["project_id"],
+        "user_id": user["user_id"],
+        "role_id": role["role_id"],
+    })
+    assert response.status_code == 201
+
+    response = await client.post("/api/v1/directories/", json={
+        "project_id": project["project_id"],
+        "directory_name": "src",
+        "created_by": user["user_id"],
+    })
+    assert response.status_code == 201
+    directory = response.json()
+
+    response = await client.post("/api/v1/file-types/", json={
+        "type_name": f"python_{suffix}",
+        "extension": ".py",
+        "mime_type": "text/x-python",
+    })
+    assert response.status_code == 201
+    file_type = response.json()
+
+    return {
+        "user": user,
+        "project": project,
+        "role": role,
+        "directory": directory,
+        "file_type": file_type,
+    }
+
+
+def file_payload(fixtures, **overrides):
+    payload = {
+        "project_id": fixtures["project"]["project_id"],
+        "directory_id": fixtures["directory"]["directory_id"],
+        "file_type_id": fixtures["file_type"]["file_type_id"],
+        "file_name": f"main_{uuid.uuid4().hex[:8]}.py",
+        "created_by": fixtures["user"]["user_id"],
+        "last_modified_by": fixtures["user"]["user_id"],
+    }
+    payload.update(overrides)
+    return payload
+
+
+async def test_create_file_success(client: AsyncClient):
+    """Test creating a file when every reference is valid."""
+    fixtures = await create_file_fixtures(client)
+    payload = file_payload(fixtures)
+
+    response = await client.post("/api/v1/files/", json=payload)
+    assert response.status_code == 201
+    created_file = response.json()
+    assert created_file["file_name"] == payload["file_name"]
+    assert created_file["project_id"] == payload["project_id"]
+    assert "file_id" in created_file
+
+
+async def test_create_file_missing_references(client: AsyncClient):
+    """Test that each missing reference reports its own 404 message."""
+    fixtures = await create_file_fixtures(client)
+    missing = str(uuid.uuid4())
+
+    cases = [
+        ({"project_id": missing}, "Project not found"),
+        ({"directory_id": missing}, "Directory not found"),
+        ({"file_type_id": missing}, "File type not found"),
+        ({"created_by": missing}, "Creator not found"),
+        ({"last_modified_by": missing}, "Last modifier not found"),
+    ]
+    for overrides, detail in cases:
+        response = await client.post("/api/v1/files/", json=file_payload(fixtures, **overrides))
+        assert response.status_code == 404
+        assert response.json()["detail"] == detail
+
+
+async def test_create_file_reports_first_failure(client: AsyncClient):
+    """Test that the earliest failing check wins when several references are invalid."""
+    fixtures = await create_file_fixtures(client)
+    missing = str(uuid.uuid4())
+
+    response = await client.post("/api/v1/files/", json=file_payload(
+        fixtures, directory_id=missing, created_by=missing
+    ))
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Directory not found"
+
+
+async def test_create_file_non_member(client: AsyncClient):
+    """Test that a user outside the project cannot create files in it."""
+    fixtures = await create_file_fixtures(client)
+    outsider = (await create_file_fixtures(client))["user"]
+
+    response = await client.post("/api/v1/files/", json=file_payload(
+        fixtures, created_by=outsider["user_id"], last_modified_by=outsider["user_id"]
+    ))
+    assert response.status_code == 403
+    assert response.json()["detail"] == "User is not a member of this project"
+
+
+async def test_create_file_version_checks_file_project_membership(client: AsyncClient):
+    """Test that version creation checks membership of the file's project."""
+    fixtures = await create_file_fixtures(client)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 201
+    file_id = response.json()["file_id"]
+
+    version = {
+        "file_id": file_id,
+        "version_number": 1,
+        "version_link": "versions/1",
+        "size_in_bytes": 10,
+        "created_by": fixtures["user"]["user_id"],
+    }
+    response = await client.post("/api/v1/file-versions/", json=version)
+    assert response.status_code == 201
+
+    outsider = (await create_file_fixtures(client))["user"]
+    response = await client.post("/api/v1/file-versions/", json={
+        **version, "version_number": 2, "created_by": outsider["user_id"]
+    })
+    assert response.status_code == 403
+    assert response.json()["detail"] == "User is not a member of this project"
+
+    response = await client.post("/api/v1/file-versions/", json={**version, "file_id": str(uuid.uuid4())})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "File not found"
+
+
+async def test_bulk_create_files_reports_item_errors(client: AsyncClient):
+    """Test that valid files are created in bulk while invalid ones are reported."""
+    fixtures = await create_file_fixtures(client)
+    duplicate = file_payload(fixtures)
+
+    response = await client.post("/api/v1/files/bulk", json=[
+        file_payload(fixtures),
+        file_payload(fixtures, directory_id=str(uuid.uuid4())),
+        duplicate,
+        duplicate,
+        file_payload(fixtures),
+    ])
+    assert response.status_code == 200
+    result = response.json()
+
+    assert len(result["items"]) == 3
+    assert result["errors"] == [
+        {"index": 1, "status_code": 404, "detail": "Directory not found"},
+        {"index": 3, "status_code": 400, "detail": "File name already exists in this directory"},
+    ]
+
+    response = await client.get(f"/api/v1/files/?project_id={fixtures['project']['project_id']}")
+    assert response.json()["total"] == 3
+
+
+async def test_bulk_update_and_delete_files(client: AsyncClient):
+    """Test renaming and deleting files in bulk."""
+    fixtures = await create_file_fixtures(client)
+    response = await client.post("/api/v1/files/bulk", json=[file_payload(fixtures) for _ in range(3)])
+    files = response.json()["items"]
+    missing = str(uuid.uuid4())
+
+    response = await client.put("/api/v1/files/bulk", json=[
+        {"file_id": files[0]["file_id"], "file_name": "renamed.py"},
+        {"file_id": files[1]["file_id"], "file_name": "renamed.py"},
+        {"file_id": missing, "file_name": "ghost.py"},
+    ])
+    assert response.status_code == 200
+    result = response.json()
+    assert [f["file_name"] for f in result["items"]] == ["renamed.py"]
+    assert [(e["index"], e["status_code"]) for e in result["errors"]] == [(1, 400), (2, 404)]
+
+    response = await client.post("/api/v1/files/bulk-delete", json={
+        "ids": [files[0]["file_id"], files[2]["file_id"], missing]
+    })
+    assert response.status_code == 200
+    result = response.json()
+    assert result["deleted"] == [files[0]["file_id"], files[2]["file_id"]]
+    assert result["errors"] == [{"index": 2, "status_code": 404, "detail": "File not found"}]
+
+    response = await client.get(f"/api/v1/files/{files[1]['file_id']}")
+    assert response.status_code == 200
+
+
+async def test_bulk_delete_directories_requires_whole_subtree(client: AsyncClient):
+    """Test that a directory cannot be bulk deleted without its subdirectories."""
+    fixtures = await create_file_fixtures(client)
+    parent = fixtures["directory"]
+    response = await client.post("/api/v1/directories/bulk", json=[{
+        "project_id": fixtures["project"]["project_id"],
+        "directory_name": "child",
+        "parent_directory_id": parent["directory_id"],
+        "created_by": fixtures["user"]["user_id"],
+    }])
+    assert response.status_code == 200
+    child = response.json()["items"][0]
+
+    response = await client.post("/api/v1/directories/bulk-delete", json={"ids": [parent["directory_id"]]})
+    assert response.json()["deleted"] == []
+    assert response.json()["errors"][0]["status_code"] == 400
+
+    response = await client.post("/api/v1/directories/bulk-delete", json={
+        "ids": [parent["directory_id"], child["directory_id"]]
+    })
+    assert set(response.json()["deleted"]) == {parent["directory_id"], child["directory_id"]}
+    assert response.json()["errors"] == []
+
+
+async def test_membership_check_is_cached_and_evicted(client: AsyncClient):
+    """Test that repeated writes reuse the cached membership and removing the member evicts it."""
+    fixtures = await create_file_fixtures(client)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 201
+
+    before = (await client.get("/health/cache")).json()["project_members"]
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 201
+    after = (await client.get("/health/cache")).json()["project_members"]
+    assert after["hits"] == before["hits"] + 1
+
+    response = await client.get("/api/v1/project-members/", params={
+        "project_id": fixtures["project"]["project_id"], "user_id": fixtures["user"]["user_id"]
+    })
+    member_id = response.json()["items"][0]["project_member_id"]
+    response = await client.delete(f"/api/v1/project-members/{member_id}")
+    assert response.status_code == 204
+
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 403
+
+
+async def test_membership_evicted_during_check_is_not_cached(client: AsyncClient, monkeypatch):
+    """Test that a membership read before the member was removed is not put back in the cache."""
+    fixtures = await create_file_fixtures(client)
+    project_id, user_id = uuid.UUID(fixtures["project"]["project_id"]), uuid.UUID(fixtures["user"]["user_id"])
+    await membership_cache.delete(project_id, user_id)
+    get_role = crud.crud_role.get
+
+    async def get_role_while_member_is_removed(db, id):
+        # The removal commits and evicts after the membership row was read
+        await membership_cache.delete(project_id, user_id)
+        return await get_role(db, id)
+
+    monkeypatch.setattr(crud.crud_role, "get", get_role_while_member_is_removed)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+    assert response.status_code == 201
+    assert await membership_cache.get(project_id, user_id) is None
+
+
+async def test_stream_file_content(client: AsyncClient, monkeypatch):
+    """Test that content streams in as versions and streams out whole or by range."""
+    # Small chunks so both directions take several reads and writes
+    monkeypatch.setattr(storage, "BLOB_CHUNK_SIZE", 64)
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    url = f"/api/v1/files/{file['file_id']}/content"
+    params = {"created_by": fixtures["user"]["user_id"]}
+    lines = [f"{i}: {uuid.uuid4()}\n" for i in range(100)]
+
+    async def body(content: bytes):
+        for start in range(0, len(content), 100):
+            yield content[start:start + 100]
+
+    first = "".join(lines).encode()
+    response = await client.put(url, params=params, content=body(first))
+    assert response.status_code == 201
+    assert response.json()["version_number"] == 1
+    lines[50] = "edited\n"
+    second = "".join(lines).encode()
+    response = await client.put(url, params=params, content=body(second))
+    version = response.json()
+    assert version["version_number"] == 2
+    assert version["parent_version_id"] is not None
+    assert version["chain_length"] == 1
+
+    file = (await client.get(f"/api/v1/files/{file['file_id']}")).json()
+    assert file["size_in_bytes"] == len(second)
+    assert file["content_digest"] == hashlib.sha256(second).hexdigest()
+
+    response = await client.get(url)
+    assert response.content == second
+    assert response.headers["accept-ranges"] == "bytes"
+    response = await client.get(url, headers={"Range": "bytes=10-19"})
+    assert response.status_code == 206
+    assert response.content == second[10:20]
+    assert response.headers["content-range"] == f"bytes 10-19/{len(second)}"
+
+    # Keyframes stream straight from the store
+    response = await client.get(f"/api/v1/file-versions/{version['parent_version_id']}/content", headers={"Range": "bytes=-30"})
+    assert response.status_code == 206
+    assert response.content == first[-30:]
+    response = await client.get(url, headers={"Range": f"bytes={len(second)}-"})
+    assert response.status_code == 416
@@ -0,0 +1,56 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy.exc import DBAPIError
+import re
+
+from tests.conftest import engine
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+def sample(body: str, name: str, default=None, **labels) -> float:
+    """Value of one sample in a Prometheus text exposition."""
+    wanted = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    match = re.search(rf"^{name}{{{re.escape(wanted)}}} (\S+)$", body, re.MULTILINE)
+    if not match and default is not None:
+        return default
+    assert match, f"{name}{{{wanted}}} not exported"
+    return float(match.group(1))
+
+
+async def test_metrics_per_route(client: AsyncClient):
+    """Test that requests are recorded under their route template with their database queries."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    route = {"method": "GET", "route": "/api/v1/files/{file_id}"}
+    before = (await client.get("/metrics")).text
+    count_before = sample(before, "http_request_duration_seconds_count", default=0, **route)
+
+    response = await client.get(f"/api/v1/files/{file['file_id']}")
+    assert response.status_code == 200
+    assert re.match(r'app;dur=[\d.]+, db;dur=[\d.]+;desc="[1-9]\d* queries"', response.headers["server-timing"])
+    assert "x-process-time" not in response.headers
+
+    response = await client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    assert sample(body, "http_request_duration_seconds_count", **route) == count_before + 1
+    assert sample(body, "http_request_db_queries_sum", **route) >= count_before + 1
+    assert sample(body, "http_requests_total", **route, status="200") >= 1
+    assert sample(body, "http_response_size_bytes_bucket", **route, le="+Inf") == count_before + 1
+
+    await client.get(f"/api/v1/no-such-route/{file['file_id']}")
+    body = (await client.get("/metrics")).text
+    assert file["file_id"] not in body
+    assert sample(body, "http_requests_total", method="GET", route="unmatched", status="404") >= 1
+
+
+async def test_failed_statement_drops_its_timer():
+    """Test that a statement that fails does not leave its start time on the connection."""
+    async with engine.connect() as conn:
+        await conn.exec_driver_sql("SELECT 1")
+        with pytest.raises(DBAPIError):
+            await conn.exec_driver_sql("SELECT * FROM no_such_table")
+        assert conn.info["query_start_time"] == []
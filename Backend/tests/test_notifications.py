@@ -0,0 +1,106 @@
+import pytest
+from httpx import AsyncClient
+import uuid
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def create_notification_user(client: AsyncClient):
+    """Helper function to create a user to receive notifications."""
+    suffix = uuid.uuid4().hex[:12]
+    response = await client.post("/api/v1/users/", json={
+        "username": f"notified_{suffix}",
+        "email": f"notified_{suffix}@example.com",
+        "password": "password123",
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def create_notification(client: AsyncClient, user_id: str, title: str = "Mentioned"):
+    response = await client.post("/api/v1/notifications/", json={
+        "user_id": user_id,
+        "notification_type": "mention",
+        "title": title,
+    })
+    assert response.status_code == 201
+    return response.json()
+
+
+async def test_mark_notification_read(client: AsyncClient):
+    """Test marking a single notification read."""
+    user = await create_notification_user(client)
+    notification = await create_notification(client, user["user_id"])
+    assert notification["is_read"] is False
+    assert notification["read_at"] is None
+
+    response = await client.put(f"/api/v1/notifications/{notification['notification_id']}/mark-read")
+    assert response.status_code == 200
+    assert response.json()["is_read"] is True
+    assert response.json()["read_at"] is not None
+
+
+async def test_mark_all_notifications_read(client: AsyncClient):
+    """Test that mark-all-read updates only the user's unread notifications and reports their ids."""
+    user = await create_notification_user(client)
+    other = await create_notification_user(client)
+    notifications = [await create_notification(client, user["user_id"], f"Note {i}") for i in range(3)]
+    await create_notification(client, other["user_id"])
+    await client.put(f"/api/v1/notifications/{notifications[0]['notification_id']}/mark-read")
+
+    response = await client.put(f"/api/v1/notifications/user/{user['user_id']}/mark-all-read")
+    assert response.status_code == 200
+    result = response.json()
+    assert result["updated"] == 2
+    assert set(result["notification_ids"]) == {n["notification_id"] for n in notifications[1:]}
+
+    response = await client.get("/api/v1/notifications/", params={"user_id": user["user_id"], "is_read": False})
+    assert response.json()["total"] == 0
+    response = await client.get("/api/v1/notifications/", params={"user_id": other["user_id"], "is_read": False})
+    assert response.json()["total"] == 1
+
+    response = await client.put(f"/api/v1/notifications/user/{user['user_id']}/mark-all-read")
+    assert response.json() == {"updated": 0, "notification_ids": []}
+
+
+async def test_mark_all_notifications_read_unknown_user(client: AsyncClient):
+    """Test mark-all-read for a user that does not exist."""
+    response = await client.put(f"/api/v1/notifications/user/{uuid.uuid4()}/mark-all-read")
+    assert response.status_code == 404
+
+
+async def test_unread_count_follows_notification_writes(client: AsyncClient):
+    """Test that the unread counter tracks creates, reads, unreads and deletes."""
+    user = await create_notification_user(client)
+    url = f"/api/v1/notifications/user/{user['user_id']}/unread-count"
+
+    response = await client.get(url)
+    assert response.status_code == 200
+    assert response.json() == {"user_id": user["user_id"], "unread_count": 0}
+
+    notifications = [await create_notification(client, user["user_id"]) for _ in range(3)]
+    assert (await client.get(url)).json()["unread_count"] == 3
+
+    first, second, third = (n["notification_id"] for n in notifications)
+    await client.put(f"/api/v1/notifications/{first}/mark-read")
+    await client.put(f"/api/v1/notifications/{first}/mark-read")
+    assert (await client.get(url)).json()["unread_count"] == 2
+
+    await client.put(f"/api/v1/notifications/{first}", json={"is_read": False})
+    assert (await client.get(url)).json()["unread_count"] == 3
+
+    await client.delete(f"/api/v1/notifications/{second}")
+    assert (await client.get(url)).json()["unread_count"] == 2
+
+    await client.put(f"/api/v1/notifications/user/{user['user_id']}/mark-all-read")
+    assert (await client.get(url)).json()["unread_count"] == 0
+
+    response = await client.get(url, params={"recount": True})
+    assert response.json()["unread_count"] == 0
+
+
+async def test_unread_count_unknown_user(client: AsyncClient):
+    """Test the unread count of a user that does not exist."""
+    response = await client.get(f"/api/v1/notifications/user/{uuid.uuid4()}/unread-count")
+    assert response.status_code == 404
@@ -0,0 +1,98 @@
+import pytest
+from httpx import AsyncClient
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import connections
+from events import EventHub, LocalBroker
+from presence import PresenceRegistry
+from tests.conftest import TestingSessionLocal
+from tests.test_notifications import create_notification_user
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def create_connection_record(client: AsyncClient, user_id: str):
+    """Helper function to create a websocket_connections row."""
+    response = await client.post("/api/v1/websocket-connections/", json={"user_id": user_id})
+    assert response.status_code == 201
+    return response.json()
+
+
+async def flush(registry: PresenceRegistry) -> int:
+    async with TestingSessionLocal() as db:
+        return await registry.flush(db)
+
+
+async def test_heartbeats_are_coalesced_into_one_row_write(client: AsyncClient):
+    """Test that many heartbeats become one UPDATE per flush and disconnects are written as inactive."""
+    user = await create_notification_user(client)
+    record = await create_connection_record(client, user["user_id"])
+    assert record["last_ping"] is None
+    connection_id = uuid.UUID(record["connection_id"])
+    registry = PresenceRegistry()
+
+    registry.register(connection_id, uuid.UUID(user["user_id"]))
+    for _ in range(5):
+        registry.heartbeat(connection_id)
+    assert await flush(registry) == 1
+    assert await flush(registry) == 0
+
+    response = await client.get(f"/api/v1/websocket-connections/{connection_id}")
+    assert response.json()["last_ping"] is not None
+    assert response.json()["is_active"] is True
+
+    registry.unregister(connection_id)
+    assert await flush(registry) == 1
+    response = await client.get(f"/api/v1/websocket-connections/{connection_id}")
+    assert response.json()["is_active"] is False
+    assert registry.stats()["heartbeats"] == 5
+
+
+async def test_flush_deactivates_stale_rows(client: AsyncClient):
+    """Test that rows whose last ping is older than the timeout are deactivated, whichever worker owned them."""
+    user = await create_notification_user(client)
+    stale = await create_connection_record(client, user["user_id"])
+    fresh = await create_connection_record(client, user["user_id"])
+    long_ago = (datetime.now(timezone.utc) - timedelta(hours=1)).isoformat()
+    await client.put(f"/api/v1/websocket-connections/{stale['connection_id']}", json={"last_ping": long_ago})
+    await client.put(f"/api/v1/websocket-connections/{fresh['connection_id']}", json={"last_ping": datetime.now(timezone.utc).isoformat()})
+
+    await flush(PresenceRegistry(timeout=60))
+
+    response = await client.get(f"/api/v1/websocket-connections/{stale['connection_id']}")
+    assert response.json()["is_active"] is False
+    response = await client.get(f"/api/v1/websocket-connections/{fresh['connection_id']}")
+    assert response.json()["is_active"] is True
+
+
+async def test_reap_drops_silent_connections():
+    """Test that connections without a heartbeat within the timeout are reaped."""
+    registry = PresenceRegistry(timeout=30)
+    project_id, quiet, chatty = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    for connection_id in (quiet, chatty):
+        registry.register(connection_id, connection_id)
+        registry.join(connection_id, project_id)
+
+    registry._entries[quiet].last_seen -= 60
+    assert registry.reap(now=time.monotonic()) == [quiet]
+    assert registry.online_users(project_id) == [chatty]
+    assert registry._pending[quiet]["is_active"] is False
+
+
+async def test_read_project_presence(client: AsyncClient):
+    """Test that the presence endpoint lists users subscribed to a project on this worker."""
+    manager = connections.ConnectionManager(EventHub(LocalBroker()))
+    project_id, user_id = uuid.uuid4(), uuid.uuid4()
+    connection = manager.connect(object(), user_id)
+    await connection.subscribe(project_id)
+    try:
+        response = await client.get(f"/api/v1/websocket-connections/presence/{project_id}")
+        assert response.status_code == 200
+        assert response.json() == {"project_id": str(project_id), "user_ids": [str(user_id)]}
+    finally:
+        manager.disconnect(connection)
+    response = await client.get(f"/api/v1/websocket-connections/presence/{project_id}")
+    assert response.json()["user_ids"] == []
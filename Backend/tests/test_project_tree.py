@@ -0,0 +1,82 @@
+import pytest
+from httpx import AsyncClient
+import uuid
+
+from tests.test_files import create_file_fixtures, file_payload
+from tests.test_directories import create_directory
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_read_project_tree_nested_with_etag(client: AsyncClient):
+    """Test that the tree endpoint nests directories and files and honours If-None-Match."""
+    fixtures = await create_file_fixtures(client)
+    project_id = fixtures["project"]["project_id"]
+    root = fixtures["directory"]
+    child = await create_directory(client, fixtures, "lib", root)
+    response = await client.post("/api/v1/files/", json=file_payload(fixtures, directory_id=child["directory_id"]))
+    file_id = response.json()["file_id"]
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree")
+    assert response.status_code == 200
+    tree = response.json()
+    etag = response.headers["etag"]
+    assert etag == f'"{project_id}:{tree["revision"]}"'
+
+    [src] = tree["directories"]
+    assert src["directory_id"] == root["directory_id"]
+    [lib] = src["directories"]
+    assert lib["directory_name"] == "lib"
+    assert [f["file_id"] for f in lib["files"]] == [file_id]
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+    await create_directory(client, fixtures, "docs")
+    response = await client.get(f"/api/v1/projects/{project_id}/tree", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+
+
+async def test_read_project_tree_changes(client: AsyncClient):
+    """Test that a delta carries only rows written or deleted after the given revision."""
+    fixtures = await create_file_fixtures(client)
+    project_id = fixtures["project"]["project_id"]
+    child = await create_directory(client, fixtures, "lib", fixtures["directory"])
+    response = await client.post("/api/v1/files/bulk", json=[file_payload(fixtures) for _ in range(2)])
+    kept, removed = response.json()["items"]
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree")
+    since = response.json()["revision"]
+
+    await client.put(f"/api/v1/files/{kept['file_id']}", json={"file_name": "renamed.py"})
+    await client.delete(f"/api/v1/files/{removed['file_id']}")
+    await client.delete(f"/api/v1/directories/{child['directory_id']}")
+    added = await create_directory(client, fixtures, "docs")
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree/changes", params={"since": since})
+    assert response.status_code == 200
+    delta = response.json()
+    assert delta["since"] == since
+    assert delta["revision"] == since + 4
+    assert [d["directory_id"] for d in delta["directories"]] == [added["directory_id"]]
+    assert [(f["file_id"], f["file_name"]) for f in delta["files"]] == [(kept["file_id"], "renamed.py")]
+    assert delta["deleted_file_ids"] == [removed["file_id"]]
+    assert delta["deleted_directory_ids"] == [child["directory_id"]]
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree/changes", params={"since": delta["revision"]})
+    assert response.status_code == 304
+
+    response = await client.get(f"/api/v1/projects/{project_id}/tree/changes", params={"since": delta["revision"] + 1})
+    assert response.status_code == 410
+
+
+async def test_read_tree_of_nonexistent_project(client: AsyncClient):
+    """Test that the tree endpoints report a missing project."""
+    missing = uuid.uuid4()
+    response = await client.get(f"/api/v1/projects/{missing}/tree")
+    assert response.status_code == 404
+    response = await client.get(f"/api/v1/projects/{missing}/tree/changes", params={"since": 0})
+    assert response.status_code == 404
@@ -0,0 +1,71 @@
+import pytest
+from httpx import AsyncClient
+from datetime import datetime, timedelta, timezone
+import uuid
+
+from query_guard import QueryBudgetExceeded, normalize
+from routers.files import create_file
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_normalize_collapses_literals_and_lists():
+    """Test that the same lookup with different ids normalizes to one statement."""
+    assert normalize("SELECT * FROM files WHERE file_id IN (?, ?, ?) AND size_in_bytes > 10") == (
+        "SELECT * FROM files WHERE file_id IN (...) AND size_in_bytes > ?"
+    )
+    assert normalize("SELECT * FROM users WHERE email = 'a@b.c'") == normalize("SELECT * FROM users  WHERE email = 'x'")
+
+
+async def test_expect_queries_catches_n_plus_one(client: AsyncClient, expect_queries):
+    """Test that fetching a list item by item is flagged while one listing call is not."""
+    fixtures = await create_file_fixtures(client)
+    files = [(await client.post("/api/v1/files/", json=file_payload(fixtures))).json() for _ in range(4)]
+
+    with pytest.raises(QueryBudgetExceeded, match="repeated a statement more than 3 times"):
+        with expect_queries(max_repeats=3):
+            for file in files:
+                await client.get(f"/api/v1/files/{file['file_id']}")
+
+    with expect_queries(max_queries=3) as log:
+        response = await client.get("/api/v1/files/", params={"project_id": fixtures["project"]["project_id"]})
+    assert response.status_code == 200
+    assert log.total <= 3
+
+
+async def test_route_over_budget_fails(client: AsyncClient, monkeypatch):
+    """Test that a route running more queries than its declared budget fails in raise mode."""
+    fixtures = await create_file_fixtures(client)
+    monkeypatch.setattr(create_file, "query_budget", 1)
+    with pytest.raises(QueryBudgetExceeded, match="budget of 1 queries"):
+        await client.post("/api/v1/files/", json=file_payload(fixtures))
+
+
+async def test_invitation_accept_and_project_listing_within_budget(client: AsyncClient, expect_queries):
+    """Test that accepting an invitation and listing a user's projects run a bounded number of queries."""
+    fixtures = await create_file_fixtures(client)
+    suffix = uuid.uuid4().hex[:8]
+    invitee = (await client.post("/api/v1/users/", json={
+        "username": f"invitee_{suffix}",
+        "email": f"invitee_{suffix}@example.com",
+        "password": "password123"
+    })).json()
+    invitation = (await client.post("/api/v1/project-invitations/", json={
+        "project_id": fixtures["project"]["project_id"],
+        "email": invitee["email"],
+        "role_id": fixtures["role"]["role_id"],
+        "invited_by": fixtures["user"]["user_id"],
+        "expires_at": (datetime.now(timezone.utc) + timedelta(days=1)).isoformat()
+    })).json()
+
+    with expect_queries(max_queries=8):
+        response = await client.post(
+            f"/api/v1/project-invitations/{invitation['invitation_id']}/accept", json={"user_id": invitee["user_id"]}
+        )
+    assert response.status_code == 200
+
+    with expect_queries(max_queries=8):
+        response = await client.get(f"/api/v1/users/{invitee['user_id']}/all-projects")
+    assert response.status_code == 200
@@ -0,0 +1,120 @@
+import pytest
+from httpx import AsyncClient
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update
+import uuid
+
+import models
+from retention import RetentionPolicy, VersionCompactor
+from tests.conftest import TestingSessionLocal
+from tests.test_blobs import upload_blob
+from tests.test_file_versions import read_content, save, source
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_policy_keeps_one_version_per_period():
+    """Test that the newest version of each hour, then of each day, is kept."""
+    now = datetime(2026, 3, 1, 12, 0, tzinfo=timezone.utc)
+    versions = [(uuid.uuid4(), created_at) for created_at in (
+        now - timedelta(minutes=5),
+        now - timedelta(minutes=30),
+        now - timedelta(days=2, minutes=10),
+        now - timedelta(days=2, minutes=20),
+        now - timedelta(days=60, hours=1),
+        now - timedelta(days=60, hours=2),
+    )]
+    assert RetentionPolicy().prunable(versions, now) == [versions[3][0], versions[5][0]]
+    # The newest version survives even when it is old
+    assert RetentionPolicy().prunable(versions[4:], now) == [versions[5][0]]
+
+
+async def test_compaction_prunes_old_versions_and_keeps_chains(client: AsyncClient):
+    """Test that compaction deletes superseded versions and the survivors still read back."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    versions, parent = [], None
+    for revision in range(1, 6):
+        parent = await save(client, fixtures, file["file_id"], source(seed, revision), revision, parent)
+        versions.append(parent)
+
+    now = datetime.now(timezone.utc)
+    hour = (now - timedelta(days=3)).replace(minute=0, second=0, microsecond=0)
+    day = (now - timedelta(days=60)).replace(hour=9, minute=0, second=0, microsecond=0)
+    created = [day, day + timedelta(hours=1), hour + timedelta(minutes=10), hour + timedelta(minutes=50), now]
+    async with TestingSessionLocal() as db:
+        for version, created_at in zip(versions, created):
+            await db.execute(
+                update(models.FileVersion)
+                .where(models.FileVersion.version_id == uuid.UUID(version["version_id"]))
+                .values(created_at=created_at)
+            )
+        await db.commit()
+
+    async with TestingSessionLocal() as db:
+        report = await VersionCompactor(grace_seconds=-60).compact(db)
+    assert report["versions_pruned"] == 2
+    assert report["bytes_reclaimed"] > 0
+
+    response = await client.get("/api/v1/file-versions/", params={"file_id": file["file_id"]})
+    remaining = {version["version_number"]: version for version in response.json()["items"]}
+    assert sorted(remaining) == [2, 4, 5]
+    assert remaining[2]["parent_version_id"] is None
+    assert remaining[4]["parent_version_id"] == versions[1]["version_id"]
+    for revision, version in remaining.items():
+        assert await read_content(client, version) == source(seed, revision)
+
+
+async def test_compaction_only_visits_files_with_prunable_versions(client: AsyncClient, monkeypatch):
+    """Test that files whose old versions are all in different periods are not loaded."""
+    fixtures = await create_file_fixtures(client)
+    seed = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+    files = {}
+    for name, created in (
+        ("spread", [now - timedelta(days=60), now - timedelta(days=50), now]),
+        ("crowded", [now - timedelta(days=60, hours=2), now - timedelta(days=60, hours=1), now]),
+    ):
+        file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+        files[name] = uuid.UUID(file["file_id"])
+        parent = None
+        async with TestingSessionLocal() as db:
+            for revision, created_at in enumerate(created, start=1):
+                parent = await save(client, fixtures, file["file_id"], source(seed, revision), revision, parent)
+                await db.execute(
+                    update(models.FileVersion)
+                    .where(models.FileVersion.version_id == uuid.UUID(parent["version_id"]))
+                    .values(created_at=created_at)
+                )
+            await db.commit()
+
+    compactor = VersionCompactor()
+    visited = []
+    prune_batch = compactor._prune_batch
+
+    async def record(db, file_ids, now):
+        visited.extend(file_ids)
+        return await prune_batch(db, file_ids, now)
+
+    monkeypatch.setattr(compactor, "_prune_batch", record)
+    async with TestingSessionLocal() as db:
+        report = await compactor.compact(db, now)
+    assert files["crowded"] in visited
+    assert files["spread"] not in visited
+    assert report["versions_pruned"] >= 1
+
+
+async def test_garbage_collection_runs_without_compaction(client: AsyncClient):
+    """Test that unreferenced blobs are collected by the garbage collection job alone."""
+    blob = await upload_blob(client, f"orphan {uuid.uuid4()}".encode())
+    compactor = VersionCompactor(grace_seconds=-60)
+    async with TestingSessionLocal() as db:
+        report = await compactor.collect_garbage(db)
+    assert report["blobs_collected"] >= 1
+    assert compactor.stats()["runs"] == 0
+
+    response = await client.get(f"/api/v1/blobs/{blob['digest']}")
+    assert response.status_code == 404
@@ -191,4 +191,24 @@ async def test_create_role_invalid_permissions(client: AsyncClient):
         "description": "Test role",
         "permissions": "invalid_permissions"  # Should be dict, not string
     })
-    assert response.status_code == 422  # Validation error 
\ No newline at end of file
+    assert response.status_code == 422  # Validation error 
+
+async def test_role_lookups_are_cached_until_written(client: AsyncClient):
+    """Test that repeated role reads hit the cache and an update invalidates it."""
+    response, _ = await create_test_role(client, f"cached_{uuid.uuid4().hex[:8]}")
+    role_id = response.json()["role_id"]
+
+    await client.get(f"/api/v1/roles/{role_id}")
+    before = (await client.get("/health/cache")).json()["roles"]
+    response = await client.get(f"/api/v1/roles/{role_id}")
+    assert response.status_code == 200
+    after = (await client.get("/health/cache")).json()["roles"]
+    assert after["hits"] == before["hits"] + 1
+    assert after["misses"] == before["misses"]
+
+    response = await client.put(f"/api/v1/roles/{role_id}", json={"description": "Updated"})
+    assert response.status_code == 200
+    assert (await client.get("/health/cache")).json()["roles"]["invalidations"] > after["invalidations"]
+
+    response = await client.get(f"/api/v1/roles/{role_id}")
+    assert response.json()["description"] == "Updated"
@@ -0,0 +1,36 @@
+import pytest
+from httpx import AsyncClient
+
+from logging_utils import parameter_shape, slow_query_log
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+async def test_parameter_shape_hides_values():
+    """Test that parameters are recorded by type only."""
+    assert parameter_shape(("secret", 3, None)) == ["str", "int", "NoneType"]
+    assert parameter_shape({"email": "a@b.c"}) == {"email": "str"}
+    assert parameter_shape([("a", 1), ("b", 2)], executemany=True) == {"rows": 2, "row": ["str", "int"]}
+
+
+async def test_slow_queries_recorded_with_route_and_plan(client: AsyncClient, monkeypatch):
+    """Test that statements over the threshold are logged with their route and a sampled plan."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 0)
+    monkeypatch.setattr(slow_query_log, "explain_sample_rate", 1.0)
+    slow_query_log.records.clear()
+
+    response = await client.get(f"/api/v1/files/{file['file_id']}")
+    assert response.status_code == 200
+    await slow_query_log.drain()
+    monkeypatch.setattr(slow_query_log, "threshold_ms", 60_000)
+
+    body = (await client.get("/health/slow-queries", params={"limit": 5})).json()
+    query = next(q for q in body["queries"] if q["statement"].lstrip().upper().startswith("SELECT"))
+    assert query["method"] == "GET"
+    assert query["route"] == "/api/v1/files/{file_id}"
+    assert file["file_id"].replace("-", "") not in str(query["parameters"])
+    assert "SCAN" in query["explain"] or "SEARCH" in query["explain"]
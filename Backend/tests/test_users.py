@@ -3,6 +3,9 @@ from httpx import AsyncClient
 import uuid
 import time
 
+from tests.test_blobs import create_version, ref_count, upload_blob
+from tests.test_files import create_file_fixtures, file_payload
+
 # Mark all tests in this module as asyncio
 pytestmark = pytest.mark.asyncio
 
@@ -137,6 +140,68 @@ async def test_get_users_list_with_pagination(client: AsyncClient):
     assert response_data["total"] >= 5
 
 
+async def test_get_users_list_with_cursor(client: AsyncClient):
+    """Test walking the users list with keyset cursors."""
+    for i in range(5):
+        response, _ = await create_test_user(client, f"cursor_{i}")
+        assert response.status_code == 201
+    
+    # First page in offset mode hands out a cursor for the next page
+    response = await client.get("/api/v1/users/?limit=2")
+    assert response.status_code == 200
+    page = response.json()
+    seen = [user["user_id"] for user in page["items"]]
+    assert page["next_cursor"] is not None
+    
+    # Follow cursors until the listing is exhausted
+    while page["next_cursor"]:
+        response = await client.get(f"/api/v1/users/?limit=2&cursor={page['next_cursor']}")
+        assert response.status_code == 200
+        page = response.json()
+        seen.extend(user["user_id"] for user in page["items"])
+    
+    assert len(seen) == len(set(seen))  # No row is returned twice
+    assert len(seen) == page["total"]
+
+
+async def test_get_users_list_invalid_cursor(client: AsyncClient):
+    """Test that a malformed cursor is rejected."""
+    response = await client.get("/api/v1/users/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert "Invalid cursor" in response.json()["detail"]
+
+
+async def test_get_users_list_total_modes(client: AsyncClient):
+    """Test the exact, omitted and past-the-end totals of the users list."""
+    for i in range(3):
+        response, _ = await create_test_user(client, f"totals_{i}")
+        assert response.status_code == 201
+    
+    response = await client.get("/api/v1/users/?limit=1")
+    assert response.status_code == 200
+    total = response.json()["total"]
+    assert total >= 3
+    assert response.json()["pages"] == total
+    
+    # Skipping the total leaves total and pages empty
+    response = await client.get("/api/v1/users/?limit=1&include_total=false")
+    assert response.status_code == 200
+    assert response.json()["total"] is None
+    assert response.json()["pages"] is None
+    assert len(response.json()["items"]) == 1
+    
+    # A page past the end still reports the total
+    response = await client.get(f"/api/v1/users/?skip={total + 10}&limit=5")
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+    assert response.json()["total"] == total
+    
+    # Estimates fall back to an exact count outside Postgres
+    response = await client.get("/api/v1/users/?limit=1&estimate_total=true")
+    assert response.status_code == 200
+    assert response.json()["total"] == total
+
+
 async def test_update_user(client: AsyncClient):
     """Test updating a user."""
     # Create a user first
@@ -187,6 +252,19 @@ async def test_delete_user(client: AsyncClient):
     assert response.status_code == 404
 
 
+async def test_delete_user_releases_blobs_of_owned_projects(client: AsyncClient):
+    """Test that deleting a user drops the blob references held by their projects' versions."""
+    fixtures = await create_file_fixtures(client)
+    file = (await client.post("/api/v1/files/", json=file_payload(fixtures))).json()
+    digest = (await upload_blob(client, f"# owned {uuid.uuid4()}\n".encode()))["digest"]
+    await create_version(client, fixtures, file["file_id"], digest)
+    assert await ref_count(digest) == 1
+
+    response = await client.delete(f"/api/v1/users/{fixtures['user']['user_id']}")
+    assert response.status_code == 204
+    assert await ref_count(digest) == 0
+
+
 async def test_delete_user_not_found(client: AsyncClient):
     """Test deleting a non-existent user."""
     non_existent_id = str(uuid.uuid4())
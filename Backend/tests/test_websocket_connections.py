@@ -0,0 +1,161 @@
+import asyncio
+import json
+import pytest
+from httpx import AsyncClient
+import uuid
+
+import connections
+import events
+from events import EventHub, LocalBroker
+from routers import websocket_connections
+from tests.conftest import TestingSessionLocal
+from tests.test_files import create_file_fixtures, file_payload
+
+# Mark all tests in this module as asyncio
+pytestmark = pytest.mark.asyncio
+
+
+class RecordingWebSocket:
+    """Stands in for a Starlette WebSocket, recording what is sent to it."""
+
+    def __init__(self):
+        self.sent = []
+        self.close_code = None
+
+    async def send_json(self, message):
+        self.sent.append(message)
+
+    async def close(self, code=1000, reason=None):
+        self.close_code = code
+
+
+async def drain(subscription):
+    messages = []
+    while not subscription.queue.empty():
+        messages.append(subscription.queue.get_nowait())
+    return messages
+
+
+async def member_id(client: AsyncClient, project_id: str) -> str:
+    response = await client.get("/api/v1/project-members/", params={"project_id": project_id})
+    [member] = response.json()["items"]
+    return member["project_member_id"]
+
+
+async def events_on(hub, project_id, message):
+    await hub.publish(events.project_channel(project_id), {"project_id": str(project_id), **message})
+
+
+async def test_tree_and_member_writes_publish_project_events(client: AsyncClient):
+    """Test that committed file, directory and member writes are announced on the project channel."""
+    fixtures = await create_file_fixtures(client)
+    project_id = fixtures["project"]["project_id"]
+    subscription = await events.hub.subscribe(events.project_channel(project_id))
+    try:
+        response = await client.post("/api/v1/files/", json=file_payload(fixtures))
+        file = response.json()
+        await client.delete(f"/api/v1/files/{file['file_id']}")
+        response = await client.post("/api/v1/files/bulk", json=[file_payload(fixtures) for _ in range(2)])
+        bulk_ids = [f["file_id"] for f in response.json()["items"]]
+        await client.delete(f"/api/v1/directories/{fixtures['directory']['directory_id']}")
+        await client.delete(f"/api/v1/project-members/{(await member_id(client, project_id))}")
+        messages = await drain(subscription)
+    finally:
+        events.hub.unsubscribe(subscription)
+
+    assert [m["type"] for m in messages] == [
+        "file.created", "file.deleted", "file.created", "directory.deleted", "member.deleted"
+    ]
+    assert messages[0]["ids"] == messages[1]["ids"] == [file["file_id"]]
+    assert sorted(messages[2]["ids"]) == sorted(bulk_ids)
+    revisions = [m["revision"] for m in messages[:4]]
+    assert revisions == sorted(revisions) and len(set(revisions)) == 4
+    assert messages[4]["user_ids"] == [fixtures["user"]["user_id"]]
+
+
+async def test_connection_batches_events_into_one_frame(monkeypatch):
+    """Test that events arriving together are sent as one frame."""
+    monkeypatch.setattr(connections, "WS_BATCH_WINDOW", 0)
+    hub = EventHub(LocalBroker())
+    manager = connections.ConnectionManager(hub)
+    websocket = RecordingWebSocket()
+    connection = manager.connect(websocket, uuid.uuid4())
+    project_id = uuid.uuid4()
+    await connection.subscribe(project_id)
+
+    for index in range(3):
+        await events_on(hub, project_id, {"type": "file.created", "ids": [str(index)]})
+    await events_on(hub, uuid.uuid4(), {"type": "file.created", "ids": ["elsewhere"]})
+
+    sender = asyncio.create_task(connection.run_sender())
+    await asyncio.sleep(0.01)
+    sender.cancel()
+
+    [frame] = websocket.sent
+    assert frame["type"] == "events"
+    assert [event["ids"] for event in frame["events"]] == [["0"], ["1"], ["2"]]
+    assert manager.stats()["events_sent"] == 3
+
+    manager.disconnect(connection)
+    assert hub.subscriber_count() == 0
+    assert manager.stats()["connections"] == 0
+
+
+async def test_connection_closes_when_client_falls_behind(monkeypatch):
+    """Test that a full send queue closes the socket with 1013 so the client resyncs."""
+    monkeypatch.setattr(connections, "WS_SEND_QUEUE_SIZE", 2)
+    hub = EventHub(LocalBroker())
+    websocket = RecordingWebSocket()
+    connection = connections.ConnectionManager(hub).connect(websocket, uuid.uuid4())
+    project_id = uuid.uuid4()
+    await connection.subscribe(project_id)
+
+    for index in range(3):
+        await events_on(hub, project_id, {"type": "file.updated", "ids": [str(index)]})
+    await connection.run_sender()
+
+    assert websocket.sent == []
+    assert websocket.close_code == 1013
+
+
+async def test_connection_stops_forwarding_after_removal(monkeypatch):
+    """Test that a user removed from a project receives nothing of it after their removal."""
+    monkeypatch.setattr(connections, "WS_BATCH_WINDOW", 0)
+    hub = EventHub(LocalBroker())
+    user_id = uuid.uuid4()
+    websocket = RecordingWebSocket()
+    connection = connections.ConnectionManager(hub).connect(websocket, user_id)
+    project_id = uuid.uuid4()
+    await connection.subscribe(project_id)
+
+    await events_on(hub, project_id, {"type": "file.created", "ids": ["before"]})
+    await events_on(hub, project_id, {"type": "member.deleted", "user_ids": [str(user_id)]})
+    await events_on(hub, project_id, {"type": "file.created", "ids": ["after"]})
+    sender = asyncio.create_task(connection.run_sender())
+    await asyncio.sleep(0.01)
+    sender.cancel()
+
+    [frame] = websocket.sent
+    assert [event["type"] for event in frame["events"]] == ["file.created", "member.deleted"]
+    assert frame["events"][0]["ids"] == ["before"]
+    assert connection.projects == set()
+    assert hub.subscriber_count() == 0
+
+
+async def test_subscribe_requires_membership(client: AsyncClient, monkeypatch):
+    """Test that a socket may only subscribe to projects its user is a member of."""
+    monkeypatch.setattr(websocket_connections, "AsyncSessionLocal", TestingSessionLocal)
+    manager = connections.ConnectionManager(EventHub(LocalBroker()))
+    fixtures = await create_file_fixtures(client)
+    project_id = fixtures["project"]["project_id"]
+    websocket = RecordingWebSocket()
+
+    outsider = manager.connect(websocket, uuid.uuid4())
+    await websocket_connections._handle_message(outsider, json.dumps({"action": "subscribe", "project_id": project_id}))
+    member = manager.connect(websocket, uuid.UUID(fixtures["user"]["user_id"]))
+    await websocket_connections._handle_message(member, json.dumps({"action": "subscribe", "project_id": project_id}))
+    await websocket_connections._handle_message(member, "not json")
+
+    assert [message["type"] for message in websocket.sent] == ["error", "subscribed", "error"]
+    assert outsider.projects == set()
+    assert member.projects == {uuid.UUID(project_id)}
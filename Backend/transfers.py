@@ -0,0 +1,111 @@
+"""Streaming content between clients and the blob store.
+
+Request bodies are hashed while they stream into the store, so size_in_bytes and the
+SHA-256 checksum always describe the bytes that actually arrived. Responses stream
+from the store and honour a single "Range: bytes=..." request; other range forms are
+answered with the whole content, which RFC 9110 allows.
+"""
+import re
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, Response, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import models
+import storage
+
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """(first, last) byte positions, inclusive, for a single range; None to serve everything"""
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if first == "":
+        suffix = int(last)
+        first, last = (max(size - suffix, 0), size - 1) if suffix else (size, size)
+    else:
+        first = int(first)
+        if last and int(last) < first:
+            return None
+        last = min(int(last), size - 1) if last else size - 1
+    if first >= size:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return first, last
+
+
+async def receive_blob(request: Request, db: AsyncSession) -> Tuple[models.Blob, bool]:
+    """Store the request body under its digest and return (blob, whether it was new)"""
+    staged_key, digest, size = await storage.stage_upload(storage.blob_store, request.stream())
+    key = storage.blob_key(digest)
+    # Held until the row is committed, so garbage collection cannot delete the object in between
+    await crud.crud_blob.lock(db, digest)
+    blob = await crud.crud_blob.get(db, digest)
+    if blob and await storage.blob_store.exists(key):
+        # Restart the grace period, so the version this was uploaded for has time to reference it
+        blob = await crud.crud_blob.touch(db, digest)
+        await storage.blob_store.delete(staged_key)
+        return blob, False
+    # Object first, then row: a row always means the content is readable
+    await storage.blob_store.promote(staged_key, key)
+    return await crud.crud_blob.register(db, digest=digest, size_in_bytes=size), True
+
+
+async def content_response(
+    request: Request,
+    *,
+    digest: str,
+    size: int,
+    key: Optional[str] = None,
+    data: Optional[bytes] = None,
+    headers: Optional[Dict[str, str]] = None
+) -> Response:
+    """Serve content, or the requested range of it, streamed from key or sliced from data"""
+    byte_range = parse_range(request.headers.get("range"), size)
+    first, last = byte_range or (0, size - 1)
+    headers = {
+        **(headers or {}),
+        "ETag": f'"{digest}"',
+        "Accept-Ranges": "bytes",
+        "Content-Length": str(last - first + 1),
+    }
+    status_code = status.HTTP_200_OK
+    if byte_range:
+        status_code = status.HTTP_206_PARTIAL_CONTENT
+        headers["Content-Range"] = f"bytes {first}-{last}/{size}"
+    if data is not None:
+        return Response(
+            content=data[first:last + 1], status_code=status_code, headers=headers, media_type="application/octet-stream"
+        )
+    # Headers go out before the first chunk is read, so a missing object has to be caught here
+    if not await storage.blob_store.exists(key):
+        raise crud.MissingBlobError("Blob not found")
+    return StreamingResponse(
+        storage.blob_store.iter_range(key, first, last - first + 1),
+        status_code=status_code,
+        headers=headers,
+        media_type="application/octet-stream"
+    )
+
+
+async def version_response(request: Request, db: AsyncSession, version: models.FileVersion) -> Response:
+    """Content of a file version; keyframes stream from the store, deltas are materialized first"""
+    if version.content_digest and not version.chain_length:
+        return await content_response(
+            request, digest=version.content_digest, size=version.size_in_bytes, key=storage.blob_key(version.storage_digest)
+        )
+    data = await crud.crud_file_version.materialize(db, version)
+    if data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File version content not found"
+        )
+    return await content_response(request, digest=version.content_digest, size=len(data), data=data)
@@ -0,0 +1,180 @@
+"""Batched reference validation for write routes.
+
+Write routes used to look up every referenced row one query at a time before
+inserting. Each lookup is expressed here as an EXISTS clause, all of them are
+evaluated in a single SELECT, and the first failing check (in the order given)
+raises the same HTTPException the sequential lookups did.
+"""
+from fastapi import HTTPException, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Optional, Iterable, Tuple, Set
+from uuid import UUID
+import models
+from crud import BULK_CHUNK_SIZE, CRUDCachedBase, crud_project_member
+from cache import membership_cache
+
+# Upper bound on items accepted by one bulk request
+MAX_BULK_ITEMS = 10000
+
+
+class ReferenceCheck:
+    def __init__(
+        self,
+        clause,
+        detail: str,
+        status_code: int = status.HTTP_404_NOT_FOUND,
+        must_exist: bool = True,
+        found: bool = False,
+        membership: Optional[Tuple[UUID, UUID]] = None
+    ):
+        # Without a clause the check is already resolved to found: False when the
+        # referenced id is missing, True when a cache already knows the row exists
+        self.clause = clause
+        self.detail = detail
+        self.status_code = status_code
+        self.must_exist = must_exist
+        self.found = found
+        # (project_id, user_id) when the check can be answered by the membership cache
+        self.membership = membership
+
+
+def exists(crud_obj, id: Optional[UUID], detail: str) -> ReferenceCheck:
+    """404 unless the row with this primary key exists"""
+    if isinstance(crud_obj, CRUDCachedBase) and crud_obj.is_cached(id):
+        return ReferenceCheck(None, detail, found=True)
+    return ReferenceCheck(crud_obj.exists_clause(id) if id is not None else None, detail)
+
+
+def _membership_clause(project_id, user_id):
+    return (
+        select(models.ProjectMember.project_member_id)
+        .where(models.ProjectMember.project_id == project_id)
+        .where(models.ProjectMember.user_id == user_id)
+        .exists()
+    )
+
+
+def is_member(project_id, user_id: UUID, detail: str = "User is not a member of this project") -> ReferenceCheck:
+    """403 unless user_id is a member of the project.
+    
+    The clause yields the member's role_id, so a successful check can fill the membership cache.
+    project_id may be a subquery (see project_of_file), in which case the cache is not used.
+    """
+    clause = (
+        select(models.ProjectMember.role_id)
+        .where(models.ProjectMember.project_id == project_id)
+        .where(models.ProjectMember.user_id == user_id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    membership = (project_id, user_id) if isinstance(project_id, UUID) and user_id is not None else None
+    return ReferenceCheck(clause, detail, status.HTTP_403_FORBIDDEN, membership=membership)
+
+
+def not_member(project_id, user_id: UUID, detail: str = "User is already a member of this project") -> ReferenceCheck:
+    """400 if user_id is already a member of the project"""
+    return ReferenceCheck(_membership_clause(project_id, user_id), detail, status.HTTP_400_BAD_REQUEST, must_exist=False)
+
+
+def no_pending_invitation(email: str, project_id: UUID, detail: str) -> ReferenceCheck:
+    """400 if a pending invitation for this email already exists in the project"""
+    clause = (
+        select(models.ProjectInvitation.invitation_id)
+        .where(models.ProjectInvitation.email == email)
+        .where(models.ProjectInvitation.project_id == project_id)
+        .where(models.ProjectInvitation.status == "pending")
+        .exists()
+    )
+    return ReferenceCheck(clause, detail, status.HTTP_400_BAD_REQUEST, must_exist=False)
+
+
+def project_of_file(file_id: UUID):
+    """Scalar subquery for a file's project, so membership can be checked without loading the file"""
+    return select(models.File.project_id).where(models.File.file_id == file_id).scalar_subquery()
+
+
+async def validate_references(db: AsyncSession, *checks: ReferenceCheck) -> None:
+    """Evaluate all checks in one round trip and raise for the first one that fails"""
+    # Cached memberships are answered without a clause; when every check is cached there is no query at all
+    cached, generations = set(), {}
+    for i, check in enumerate(checks):
+        if not check.membership:
+            continue
+        if await membership_cache.get(*check.membership) is not None:
+            cached.add(i)
+        else:
+            # Taken before the query, so a removal committed meanwhile keeps the result out of the cache
+            generations[i] = await membership_cache.generation(check.membership[0])
+    
+    clauses = [
+        check.clause.label(f"check_{i}")
+        for i, check in enumerate(checks)
+        if check.clause is not None and i not in cached
+    ]
+    row = (await db.execute(select(*clauses))).one() if clauses else None
+    
+    for i, check in enumerate(checks):
+        if i in cached:
+            found = True
+        elif check.clause is not None:
+            found = bool(row._mapping[f"check_{i}"])
+        else:
+            found = check.found
+        if found != check.must_exist:
+            raise HTTPException(status_code=check.status_code, detail=check.detail)
+    
+    for i, generation in generations.items():
+        await crud_project_member.cache_membership(
+            db, project_id=checks[i].membership[0], user_id=checks[i].membership[1],
+            role_id=row._mapping[f"check_{i}"], generation=generation
+        )
+
+
+# Set-based helpers for bulk routes: each resolves a whole batch of references in
+# one query per chunk, and the route then reports failures per item.
+
+def check_batch_size(items: list) -> None:
+    if len(items) > MAX_BULK_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Bulk requests are limited to {MAX_BULK_ITEMS} items"
+        )
+
+
+async def member_pairs(db: AsyncSession, pairs: Iterable[Tuple[UUID, UUID]]) -> Set[Tuple[UUID, UUID]]:
+    """Return which (project_id, user_id) pairs are project memberships"""
+    wanted = list(set(pairs))
+    found = set()
+    for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+        chunk = wanted[start:start + BULK_CHUNK_SIZE]
+        result = await db.execute(
+            select(models.ProjectMember.project_id, models.ProjectMember.user_id)
+            .where(models.ProjectMember.project_id.in_({project_id for project_id, _ in chunk}))
+            .where(models.ProjectMember.user_id.in_({user_id for _, user_id in chunk}))
+        )
+        found.update((row.project_id, row.user_id) for row in result)
+    return found & set(wanted)
+
+
+async def existing_file_names(db: AsyncSession, pairs: Iterable[Tuple[UUID, str]]) -> Set[Tuple[UUID, str]]:
+    """Return which (directory_id, file_name) pairs are already taken"""
+    wanted = list(set(pairs))
+    found = set()
+    for start in range(0, len(wanted), BULK_CHUNK_SIZE):
+        chunk = wanted[start:start + BULK_CHUNK_SIZE]
+        result = await db.execute(
+            select(models.File.directory_id, models.File.file_name)
+            .where(models.File.directory_id.in_({directory_id for directory_id, _ in chunk}))
+            .where(models.File.file_name.in_({file_name for _, file_name in chunk}))
+        )
+        found.update((row.directory_id, row.file_name) for row in result)
+    return found & set(wanted)
+
+
+def first_failure(*checks: Tuple[bool, int, str]) -> Optional[Tuple[int, str]]:
+    """Given (ok, status_code, detail) triples in check order, return the first failing one"""
+    for ok, status_code, detail in checks:
+        if not ok:
+            return status_code, detail
+    return None